@@ -0,0 +1,223 @@
+"""
+Generate a farm of local git repos for benchmarking gita.
+
+Each repo has its own bare upstream repo reached by a file path, so that
+fetching and cloning stay on the local disk. The repos cycle through the
+`KINDS` of state that `gita ll` displays, and every `large_every`-th repo has
+`LARGE_FACTOR` times the files.
+
+One template is built with git per kind and size, and the repos are copies of
+the templates with their remote URL rewritten, which is much faster than
+building each repo with git. Worktrees cannot be copied, so they are added
+with git after their main repo is copied.
+
+Usage:
+
+    python benchmarks/farm.py <root> <number of repos> [--files N] [--untracked N]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+KINDS = (
+    "clean",
+    "dirty",
+    "staged",
+    "untracked",
+    "stashed",
+    "ahead",
+    "behind",
+    "diverged",
+    "no_remote",
+    "worktree",
+    "bare",
+)
+LARGE_FACTOR = 20
+
+_GIT_ENV = {
+    **os.environ,
+    "GIT_AUTHOR_NAME": "gita",
+    "GIT_AUTHOR_EMAIL": "gita@example.com",
+    "GIT_COMMITTER_NAME": "gita",
+    "GIT_COMMITTER_EMAIL": "gita@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+_GIT_CONFIG = [
+    "-c",
+    "init.defaultBranch=main",
+    "-c",
+    "commit.gpgSign=false",
+    "-c",
+    "core.hooksPath=/dev/null",
+]
+
+
+def git(*args: str, cwd: Path):
+    subprocess.run(
+        ["git"] + _GIT_CONFIG + list(args),
+        cwd=cwd,
+        env=_GIT_ENV,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+
+
+def _commit(repo: Path, fname: str, content: str):
+    (repo / fname).write_text(content)
+    git("add", fname, cwd=repo)
+    git("commit", "-q", "-m", f"update {fname}", cwd=repo)
+
+
+def make_template(root: Path, kind: str, files: int) -> Path:
+    """
+    Build the template of `kind` with `files` tracked files under `root`.
+    Return its directory, which holds the `repo` and its `upstream.git`.
+    """
+    base = root / f"{kind}-{files}"
+    repo = base / "repo"
+    upstream = base / "upstream.git"
+    repo.mkdir(parents=True)
+    git("init", "-q", cwd=repo)
+    for i in range(files):
+        d = repo / f"d{i % 10}"
+        d.mkdir(exist_ok=True)
+        (d / f"f{i}.txt").write_text(f"line {i}\n" * 10)
+    git("add", ".", cwd=repo)
+    git("commit", "-q", "-m", "initial", cwd=repo)
+    _commit(repo, "README", "farm\n")
+    if kind != "no_remote":
+        git("clone", "-q", "--bare", str(repo), str(upstream), cwd=base)
+        git("remote", "add", "origin", str(upstream), cwd=repo)
+        git("fetch", "-q", "origin", cwd=repo)
+        git("branch", "-q", "-u", "origin/main", cwd=repo)
+    if kind in ("behind", "diverged"):
+        other = base / "other"
+        git("clone", "-q", str(upstream), str(other), cwd=base)
+        _commit(other, "upstream.txt", "upstream\n")
+        git("push", "-q", "origin", "main", cwd=other)
+        shutil.rmtree(other)
+        git("fetch", "-q", "origin", cwd=repo)
+    if kind in ("ahead", "diverged"):
+        _commit(repo, "local.txt", "local\n")
+    if kind == "dirty":
+        (repo / "README").write_text("changed\n")
+    elif kind == "staged":
+        (repo / "README").write_text("staged\n")
+        git("add", "README", cwd=repo)
+    elif kind == "untracked":
+        (repo / "d0" / "new.txt").write_text("new\n")
+    elif kind == "stashed":
+        (repo / "README").write_text("stashed\n")
+        git("stash", "-q", cwd=repo)
+    elif kind == "bare":
+        shutil.rmtree(repo)
+        shutil.copytree(upstream, repo, symlinks=True)
+        git("remote", "set-url", "origin", str(upstream), cwd=repo)
+    return base
+
+
+def _copy(
+    template: Path, dest: Path, name: str, upstreams: Path, kind: str, untracked: int
+):
+    """
+    Copy the repo of `template` to `dest` with its own upstream, and add
+    `untracked` untracked files
+    """
+    upstream = template / "upstream.git"
+    shutil.copytree(template / "repo", dest, symlinks=True)
+    if upstream.is_dir():
+        own = upstreams / f"{name}.git"
+        shutil.copytree(upstream, own, symlinks=True)
+        config = dest / ("config" if kind == "bare" else ".git/config")
+        config.write_text(config.read_text().replace(str(upstream), str(own)))
+    if kind == "bare":
+        return
+    # The copies have new stat data, which `git status` would otherwise
+    # compare by content on every run since gita doesn't write the index
+    git("update-index", "-q", "--refresh", cwd=dest)
+    add_untracked(dest, untracked)
+    if kind == "worktree":
+        git("worktree", "add", "-q", str(dest.parent / name[: -len("-main")]), cwd=dest)
+
+
+def add_untracked(repo: Path, n: int):
+    """
+    Add `n` untracked files to `repo`, half of them next to the tracked files
+    and half in untracked folders, like build output
+    """
+    for i in range(n):
+        if i % 2:
+            d = repo / "build" / f"out{i % 20}"
+        else:
+            d = repo / f"d{i % 10}"
+        d.mkdir(parents=True, exist_ok=True)
+        (d / f"untracked{i}.tmp").write_text("")
+
+
+def create(
+    root: Path, n: int, files: int = 20, large_every: int = 10, untracked: int = 0
+) -> Dict:
+    """
+    Create `n` repos under `root`/repos/<kind>/, with their upstreams in
+    `root`/upstreams, and `untracked` untracked files in each worktree.
+    Return the paths of the repos by kind.
+    """
+    root = Path(root).resolve()
+    templates = root / "templates"
+    upstreams = root / "upstreams"
+    upstreams.mkdir(parents=True)
+    sizes = (files, files * LARGE_FACTOR)
+    with ThreadPoolExecutor() as pool:
+        built = {
+            (kind, size): pool.submit(make_template, templates, kind, size)
+            for kind in KINDS
+            for size in sizes
+        }
+        built = {k: f.result() for k, f in built.items()}
+
+        paths: Dict[str, List[str]] = {kind: [] for kind in KINDS}
+        copies = []
+        for i in range(n):
+            kind = KINDS[i % len(KINDS)]
+            large = large_every and (i + 1) % large_every == 0
+            name = f"{kind}-{i:05d}"
+            if kind == "worktree":
+                # the worktree takes the name, and its main repo is a sibling
+                paths[kind].append(str(root / "repos" / kind / name))
+                name += "-main"
+            dest = root / "repos" / kind / name
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            paths[kind].append(str(dest))
+            template = built[kind, sizes[bool(large)]]
+            copies.append(
+                pool.submit(_copy, template, dest, name, upstreams, kind, untracked)
+            )
+        for f in copies:
+            f.result()
+    shutil.rmtree(templates)
+    return paths
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="create a farm of git repos")
+    p.add_argument("root", help="directory to create, must not exist")
+    p.add_argument("n", type=int, help="number of repos")
+    p.add_argument("--files", type=int, default=20, help="files per repo")
+    p.add_argument("--untracked", type=int, default=0, help="untracked files per repo")
+    args = p.parse_args(argv)
+    if os.path.exists(args.root):
+        sys.exit(f"{args.root} exists")
+    paths = create(Path(args.root), args.n, args.files, untracked=args.untracked)
+    for kind, kind_paths in paths.items():
+        print(f"{kind}: {len(kind_paths)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Measure the memory of the in-memory registry, see `gita/model.py`, against
+the nested `dict`s that gita used before:
+
+    python benchmarks/memory.py --repos 50000
+"""
+
+import argparse
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from gita.model import Group, Repo  # noqa: E402
+
+
+def measure(build: Callable[[], object]) -> int:
+    """
+    Return the bytes allocated by `build` that are alive at its end
+    """
+    tracemalloc.start()
+    try:
+        built = build()  # noqa: F841
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(description="measure the registry memory")
+    p.add_argument("--repos", type=int, default=50000)
+    p.add_argument("--group-size", type=int, default=500)
+    args = p.parse_args(argv)
+    # the names and paths are shared, like they are after parsing
+    rows = [(f"/src/org/repo{i}", f"repo{i}") for i in range(args.repos)]
+    names = [name for _, name in rows]
+    groups = range(0, args.repos, args.group_size)
+
+    def dict_repos():
+        return {name: {"path": path, "type": "", "flags": []} for path, name in rows}
+
+    def dict_groups():
+        return {
+            f"g{i}": {"repos": names[i : i + args.group_size], "path": ""}
+            for i in groups
+        }
+
+    def record_repos():
+        return {name: Repo(path) for path, name in rows}
+
+    def record_groups():
+        return {f"g{i}": Group(names[i : i + args.group_size], "") for i in groups}
+
+    print(f"{args.repos} repos in groups of {args.group_size}")
+    print(f"{'':<8} {'dicts':>10} {'records':>10}")
+    for kind, before, after in (
+        ("repos", dict_repos, record_repos),
+        ("groups", dict_groups, record_groups),
+    ):
+        before, after = measure(before), measure(after)
+        print(
+            f"{kind:<8} {before / 2**20:>6.1f} MiB {after / 2**20:>6.1f} MiB "
+            f"({after / before:.0%})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Time gita commands on synthetic repo farms, see `farm.py`.
+
+Each command is run as `python -m gita` from this source tree, with
+`GITA_PROJECT_HOME` pointing at a throwaway config directory, so that the
+numbers include the start-up time and never touch the user's repos. The
+results are written as JSON, which can be compared across commits:
+
+    python benchmarks/run.py --sizes 10 100 -o before.json
+    (change gita)
+    python benchmarks/run.py --sizes 10 100 -o after.json
+    python benchmarks/run.py --compare before.json after.json
+
+The untracked file policies are compared on repos with many untracked files:
+
+    python benchmarks/run.py --untracked 5000 --commands ll "ll untracked=off"
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import farm
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_VERSION = 1
+SIZES = (10, 100, 1000)
+COMMANDS = ("add -r", "ll", "ll -g", "fetch", "freeze", "clone --from-file")
+# `gita ll` with the untracked file policy of all repos set, see `--untracked`
+UNTRACKED_COMMANDS = ("ll untracked=off",)
+
+
+def gita(args: List[str], config: Path, cwd: Path, stdout=subprocess.DEVNULL) -> float:
+    """
+    Run gita with `args`, and return the wall time in seconds
+    """
+    env = {**os.environ, "GITA_PROJECT_HOME": str(config), "PYTHONPATH": str(ROOT)}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "gita"] + args,
+        cwd=cwd,
+        env=env,
+        stdout=stdout,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"gita {' '.join(args)} failed: {result.stderr}")
+    return seconds
+
+
+def register(root: Path, paths: Dict[str, List[str]], config: Path):
+    """
+    Register the farm repos in `config`, with a group per kind
+    """
+    shutil.rmtree(config, ignore_errors=True)
+    gita(["add", "-r", str(root / "repos")], config, root)
+    if paths["bare"]:
+        gita(["add", "-b"] + paths["bare"], config, root)
+    for kind, kind_paths in paths.items():
+        names = [os.path.basename(p) for p in kind_paths]
+        if names:
+            gita(["group", "add"] + names + ["-n", kind], config, root)
+
+
+def bench_size(
+    n: int,
+    files: int,
+    repeat: int,
+    commands: List[str],
+    workdir: Path,
+    untracked: int = 0,
+) -> List[Dict]:
+    """
+    Return the timings of `commands` on a farm of `n` repos
+    """
+    root = workdir / f"farm-{n}"
+    print(f"creating {n} repos in {root}", file=sys.stderr)
+    paths = farm.create(root, n, files, untracked=untracked)
+    config = root / "config"
+    register(root, paths, config)
+    frozen = root / "frozen.csv"
+    with open(frozen, "w") as f:
+        gita(["freeze"], config, root, stdout=f)
+
+    def add_r(i):
+        add_config = root / f"add-config-{i}"
+        return gita(["add", "-r", str(root / "repos")], add_config, root)
+
+    def clone(i):
+        dest = root / f"clones-{i}"
+        dest.mkdir()
+        clone_config = root / f"clone-config-{i}"
+        return gita(["clone", "-f", str(frozen), "-C", str(dest)], clone_config, root)
+
+    def ll_untracked(policy):
+        policy_config = root / f"config-{policy}"
+        if not policy_config.exists():
+            shutil.copytree(config, policy_config)
+            names = [os.path.basename(p) for p in chain(*paths.values())]
+            gita(["flags", "untracked", policy] + names, policy_config, root)
+        return gita(["ll"], policy_config, root)
+
+    runs = {
+        "add -r": add_r,
+        "ll": lambda i: gita(["ll"], config, root),
+        "ll -g": lambda i: gita(["ll", "-g"], config, root),
+        "fetch": lambda i: gita(["fetch"], config, root),
+        "freeze": lambda i: gita(["freeze"], config, root),
+        "clone --from-file": clone,
+        "ll untracked=off": lambda i: ll_untracked("off"),
+    }
+    results = []
+    for command in commands:
+        if command.startswith("ll"):  # warm up the status cache
+            runs[command](-1)
+        times = [runs[command](i) for i in range(repeat)]
+        results.append(
+            {
+                "size": n,
+                "command": command,
+                "times": times,
+                "min": min(times),
+                "median": statistics.median(times),
+            }
+        )
+        print(f"{n:>6} {command:<18} {_ms(min(times)):>10}", file=sys.stderr)
+    shutil.rmtree(root)
+    return results
+
+
+def get_metadata(files: int, repeat: int, untracked: int = 0) -> Dict:
+    def output(cmd):
+        result = subprocess.run(
+            cmd, cwd=ROOT, stdout=subprocess.PIPE, universal_newlines=True
+        )
+        return result.stdout.strip()
+
+    return {
+        "version": RESULTS_VERSION,
+        "commit": output(["git", "rev-parse", "HEAD"]),
+        "dirty": bool(output(["git", "status", "--porcelain", "--untracked-files=no"])),
+        "git": output(["git", "--version"]),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "files": files,
+        "untracked": untracked,
+        "repeat": repeat,
+    }
+
+
+def compare(base: Dict, new: Dict):
+    """
+    Print the median times of `base` and `new` side by side
+    """
+    for name, results in (("base", base), ("new", new)):
+        meta = results["metadata"]
+        print(f"{name}: {meta['commit'][:10]}{'+' * meta['dirty']} {meta['date']}")
+    old = {(r["size"], r["command"]): r["median"] for r in base["results"]}
+    print(f"{'size':>6} {'command':<18} {'base':>10} {'new':>10} {'ratio':>7}")
+    for r in new["results"]:
+        key = r["size"], r["command"]
+        if key in old:
+            ratio = f"{r['median'] / old[key]:.2f}"
+            print(
+                f"{r['size']:>6} {r['command']:<18} {_ms(old[key]):>10} "
+                f"{_ms(r['median']):>10} {ratio:>7}"
+            )
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms"
+
+
+def main(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(description="benchmark gita on repo farms")
+    p.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    p.add_argument("--files", type=int, default=20, help="files per repo")
+    p.add_argument("--repeat", type=int, default=3, help="runs per command")
+    p.add_argument(
+        "--commands",
+        nargs="+",
+        choices=COMMANDS + UNTRACKED_COMMANDS,
+        default=COMMANDS,
+    )
+    p.add_argument(
+        "--untracked",
+        type=int,
+        default=0,
+        help="untracked files per repo, to compare the untracked file policies "
+        f"with {', '.join(repr(c) for c in UNTRACKED_COMMANDS)}",
+    )
+    p.add_argument("--workdir", help="where the farms are created")
+    p.add_argument("-o", "--output", help="JSON file for the results")
+    p.add_argument(
+        "--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two results"
+    )
+    args = p.parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            compare(json.load(f), json.load(g))
+        return
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        results = []
+        for n in args.sizes:
+            results += bench_size(
+                n, args.files, args.repeat, args.commands, Path(workdir), args.untracked
+            )
+    content = {
+        "metadata": get_metadata(args.files, args.repeat, args.untracked),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(content, f, indent=2)
+    else:
+        json.dump(content, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
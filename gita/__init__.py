@@ -10,4 +10,9 @@ def get_version() -> str:
         return version("gita")
 
 
-__version__ = get_version()
+def __getattr__(name: str):
+    # `__version__` is looked up on access, since importlib.metadata is slow
+    # to import
+    if name == "__version__":
+        return get_version()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -16,17 +16,18 @@ https://github.com/nosarthur/gita/blob/master/.gita-completion.bash
 
 import argparse
 import csv
-import glob
 import os
 import subprocess
 import sys
+import time
 from functools import partial
-from itertools import chain
 from pathlib import Path
+from typing import Dict, List, Optional
 
-import argcomplete
-
-from . import common, get_version, info, io, utils
+# The modules of the less common sub-commands, e.g., `daemon`, `discover`,
+# `display`, `doctor`, `profiling`, `registry_db` and `watch`, are imported
+# by their handlers, to not slow down the start of the others.
+from . import cache, common, completion, get_version, gitdir, info, io, registry, utils
 
 
 def _group_name(name: str, exclude_old_names=True) -> str:
@@ -61,12 +62,17 @@ def f_add(args: argparse.Namespace):
     paths = args.paths
     dry_run = args.dry_run
     groups = utils.get_groups()
-    if args.recursive or args.auto_group:
-        paths = (
-            p.rstrip(os.path.sep)
-            for p in chain.from_iterable(
-                glob.glob(os.path.join(p, "**/"), recursive=True) for p in args.paths
-            )
+    walked = args.recursive or args.auto_group
+    if walked:
+        from . import discover
+
+        paths = discover.walk_repos(
+            args.paths,
+            args.max_depth,
+            args.exclude or (),
+            args.nested,
+            exclude_submodule=args.skip_submodule,
+            hidden=args.hidden,
         )
     new_repos = utils.add_repos(
         repos,
@@ -74,6 +80,7 @@ def f_add(args: argparse.Namespace):
         include_bare=args.bare,
         exclude_submodule=args.skip_submodule,
         dry_run=dry_run,
+        validated=walked,
     )
     if dry_run:
         return
@@ -110,11 +117,20 @@ def f_flags(args: argparse.Namespace):
         for r, prop in repos.items():
             if prop["flags"]:
                 print(f"{r}: {prop['flags']}")
+            if prop.get("untracked"):
+                print(f"{r}: untracked {prop['untracked']}")
     elif cmd == "set":
         # when in memory, flags are List[str], when on disk, they are space
         # delimited str
         repos[args.repo]["flags"] = args.flags
         utils.write_to_repo_file(repos, "w")
+    elif cmd == "untracked":
+        for r in args.repo:
+            if args.policy == "full":  # the default
+                repos[r].pop("untracked", None)
+            else:
+                repos[r]["untracked"] = args.policy
+        utils.write_to_repo_file(repos, "w")
 
 
 def f_color(args: argparse.Namespace):
@@ -158,6 +174,7 @@ def f_info(args: argparse.Namespace):
         csv_config = common.get_config_fname("layout.csv")
         print(f"Settings are in {csv_config}")
         defaults = {
+            "ahead_behind": 0,
             "branch": 19,
             "symbols": 5,
             "branch_name": 27,
@@ -259,22 +276,32 @@ def f_freeze(args):
         group_repos = utils.get_groups()[group_name]["repos"]
         repos = {k: repos[k] for k in group_repos if k in repos}
     seen = {""}
+    # whether the global or system config rewrites URLs, see `_has_url_rewrites`
+    rewrites = None
     # print(repos)
     for name, prop in repos.items():
         path = prop["path"]
-        url = ""
-        # FIXME: capture_output is new in 3.7. Maybe drop support for 3.6
-        cp = subprocess.run(
-            ["git", "remote", "-v"],
-            cwd=path,
-            universal_newlines=True,
-            capture_output=True,
-        )
-        lines = cp.stdout.split("\n")
-        if cp.returncode == 0 and len(lines) > 0:
-            parts = lines[0].split()
-            if len(parts) > 1:
-                url = parts[1]
+        git_dir = gitdir.find(path)
+        url = git_dir and gitdir.get_remote_url(git_dir)
+        if url:
+            if rewrites is None:
+                rewrites = _has_url_rewrites(path)
+            if rewrites:
+                url = None
+        if url is None:
+            url = ""
+            # FIXME: capture_output is new in 3.7. Maybe drop support for 3.6
+            cp = subprocess.run(
+                ["git", "remote", "-v"],
+                cwd=path,
+                universal_newlines=True,
+                capture_output=True,
+            )
+            lines = cp.stdout.split("\n")
+            if cp.returncode == 0 and len(lines) > 0:
+                parts = lines[0].split()
+                if len(parts) > 1:
+                    url = parts[1]
         if url not in seen:
             seen.add(url)
             # TODO: add another field to distinguish regular repo or worktree or submodule
@@ -291,35 +318,107 @@ def f_freeze(args):
             print(f",{gname},{g['path']},{group_repos}")
 
 
+def _has_url_rewrites(path: str) -> bool:
+    """
+    Return True if the git config seen from `path` has `url.<base>.insteadOf`
+    or `url.<base>.pushInsteadOf` rewrites. `gitdir.get_remote_url` only
+    sees the ones in the repo config, not the global or system ones.
+    """
+    cp = subprocess.run(
+        ["git", "config", "--get-regexp", r"^url\."],
+        cwd=path,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return cp.returncode == 0
+
+
 def f_ll(args: argparse.Namespace):
     """
     Display details of all repos
     """
-    repos = utils.get_repos()
-    ctx = utils.get_context()
-    if args.group is None and ctx:
-        args.group = ctx.stem
-    group_repos = None
-    if args.group:  # only display repos in this group
-        group_repos = utils.get_groups()[args.group]["repos"]
-        repos = {k: repos[k] for k in group_repos if k in repos}
-    if args.g:  # display by group
-        if group_repos:
-            print(f"{args.group}:")
-            for line in utils.describe(repos, no_colors=args.no_colors):
-                print("  ", line)
+    structured = args.format != "text"
+    if structured and args.watch:
+        print("--watch only works with the text format", file=sys.stderr)
+        sys.exit(2)
+    local_only = (args.watch, args.progressive, args.jobs, args.no_cache, structured)
+    local_only += (args.profile,)
+    if not any(local_only + (args.timeout, args.budget)):
+        from . import daemon
+
+        lines = daemon.request(
+            "ll",
+            group=args.group,
+            by_group=args.g,
+            no_colors=args.no_colors,
+            sort=args.sort,
+            cwd=os.getcwd(),
+        )
+        if lines is not None:
+            print("\n".join(lines))
+            return
+    status_cache = None if args.no_cache else cache.StatusCache()
+    kwargs = dict(
+        no_colors=args.no_colors,
+        cache=status_cache,
+        jobs=args.jobs,
+        timeout=args.timeout,
+    )
+    timed_out = []
+    limits = dict(
+        deadline=args.budget and time.monotonic() + args.budget,
+        timed_out=timed_out,
+    )
+
+    def records():
+        for header, repos in utils.get_ll_sections(args.group, args.g):
+            for record in utils.describe_records(
+                repos, status_cache, args.jobs, args.timeout, **limits
+            ):
+                if header is not None:
+                    record["group"] = header
+                yield record
+
+    def show(repos, prefix=""):
+        if args.watch:
+            from . import watch
+
+            watch.watch(repos, **kwargs)
+        elif args.progressive:
+            from . import display
+
+            display.show_progressively(
+                utils.describe_as_completed(repos, **kwargs, **limits),
+                display.placeholder_rows(repos),
+                prefix=prefix,
+            )
         else:
-            for g, prop in utils.get_groups().items():
-                print(f"{g}:")
-                g_repos = {k: repos[k] for k in prop["repos"] if k in repos}
-                for line in utils.describe(g_repos, no_colors=args.no_colors):
-                    print("  ", line)
+            for line in utils.describe(repos, sort=args.sort, **kwargs, **limits):
+                print(f"{prefix}{line}")
+
+    if structured:
+        for line in utils.format_records(records(), args.format):
+            print(line, flush=True)
     else:
-        for line in utils.describe(repos, no_colors=args.no_colors):
-            print(line)
+        for header, repos in utils.get_ll_sections(args.group, args.g):
+            if header is None:
+                show(repos)
+            else:  # display by group
+                print(f"{header}:")
+                show(repos, prefix="   ")
+    if status_cache:
+        status_cache.save(keep=(prop["path"] for prop in utils.get_repos().values()))
+    if timed_out:
+        print(f"Timed out: {' '.join(sorted(set(timed_out)))}", file=sys.stderr)
 
 
 def f_ls(args: argparse.Namespace):
+    from . import daemon
+
+    lines = daemon.request("ls", repo=args.repo)
+    if lines is not None:
+        print("\n".join(lines))
+        return
     repos = utils.get_repos()
     if args.repo:  # one repo, show its path
         print(repos[args.repo]["path"])
@@ -327,6 +426,22 @@ def f_ls(args: argparse.Namespace):
         print(" ".join(repos))
 
 
+def f_here(args: argparse.Namespace):
+    """
+    Run the sub-command in `args.cmd` on the repo that contains the current
+    directory, or print its name
+    """
+    cwd = os.getcwd()
+    name = utils.get_repo_index().find(cwd)
+    if name is None:
+        print(f"{cwd} is not in a registered repo")
+        sys.exit(1)
+    if not args.cmd:
+        print(name)
+        return
+    main([args.cmd[0], name] + args.cmd[1:])
+
+
 def f_group(args: argparse.Namespace):
     groups = utils.get_groups()
     cmd = args.group_cmd or "ll"
@@ -388,8 +503,14 @@ def f_group(args: argparse.Namespace):
 
 def f_context(args: argparse.Namespace):
     choice = args.choice
-    ctx = utils.get_context()
     if choice is None:  # display current context
+        from . import daemon
+
+        lines = daemon.request("context", cwd=os.getcwd())
+        if lines is not None:
+            print("\n".join(lines))
+            return
+        ctx = utils.get_context()
         if ctx:
             group = ctx.stem
             print(f"{group}: {' '.join(utils.get_groups()[group]['repos'])}")
@@ -398,26 +519,125 @@ def f_context(args: argparse.Namespace):
         else:
             print("Context is not set")
     else:  # set context
-        utils.replace_context(ctx, choice)
+        utils.replace_context(utils.get_context(), choice)
+
+
+def f_daemon(args: argparse.Namespace):
+    from . import daemon
+
+    if not daemon.is_supported():
+        print("gita daemon needs Unix domain sockets, which this platform lacks")
+        sys.exit(1)
+    if args.action == "run":
+        daemon.run()
+    elif daemon.request("ping" if args.action == "status" else "stop") is None:
+        print("gita daemon is not running")
+        sys.exit(1)
+    elif args.action == "status":
+        print(f"gita daemon is running at {daemon.get_socket_fname()}")
+
+
+def f_doctor(args: argparse.Namespace):
+    """
+    Diagnose the performance of `gita ll`
+    """
+    if not args.perf:
+        print("Nothing to check. Use --perf to time the status of the repos.")
+        return
+    from . import doctor
+
+    repos, _ = utils.parse_repos_and_rest(args.repo)
+    reports = doctor.diagnose(repos)
+    for line in doctor.format_reports(reports, args.top):
+        print(line)
+    if args.apply:
+        lines = list(doctor.apply(reports[: args.top]))
+        for line in lines:
+            print(line)
+        if any(line.endswith("(failed)") for line in lines):
+            sys.exit(1)
+
+
+def f_validate(args: argparse.Namespace):
+    """
+    Check all registered repos without the cached results, and report the
+    ones whose paths are no longer repos
+    """
+    repos = utils.get_repos(skip_validation=True)
+    validation = cache.ValidationCache()
+    dead = []
+    for name, prop in repos.items():
+        path = prop["path"]
+        valid = utils.is_git(path, include_bare=True)
+        validation.put(path, valid)
+        if not valid:
+            reason = "not a git repo" if os.path.exists(path) else "missing"
+            dead.append(f"{name}: {path} ({reason})")
+    validation.save(keep=(prop["path"] for prop in repos.values()))
+    utils.get_repos.cache_clear()
+    print(f"{len(repos)} repos checked, {len(dead)} dead")
+    for line in dead:
+        print(f"  {line}")
+    if dead:
+        sys.exit(1)
 
 
 def f_rm(args: argparse.Namespace):
     """
     Unregister repo(s) from gita
     """
+    from . import registry_db
+
     path_file = common.get_config_fname("repos.csv")
-    if os.path.isfile(path_file):
-        repos = utils.get_repos()
+    if registry_db.is_enabled() or os.path.isfile(path_file):
+        registry = utils.get_registry()
         group_updated = False
-        groups = utils.get_groups()
         for repo in args.repo:
-            del repos[repo]
-            up = utils.delete_repo_from_groups(repo, groups)
-            group_updated = group_updated or up
+            group_updated |= registry.remove_repo(repo)
         if group_updated:
-            utils.write_to_groups_file(groups, "w")
+            utils.write_to_groups_file(registry.groups, "w")
+
+        utils.write_to_repo_file(registry.repos, "w")
 
-        utils.write_to_repo_file(repos, "w")
+
+def f_registry(args: argparse.Namespace):
+    from . import registry_db
+
+    cmd = args.registry_cmd or "ll"
+    if cmd == "ll":
+        if registry_db.is_enabled():
+            print(f"sqlite: {registry_db.get_fname()}")
+        else:
+            print(f"csv: {common.get_config_fname('repos.csv')}")
+    elif cmd == "import":
+        if registry_db.is_enabled() and not args.force:
+            print(
+                f"{registry_db.get_fname()} exists and may have changes that "
+                "repos.csv and groups.csv lack. Export it first, or use --force "
+                "to replace it."
+            )
+            sys.exit(1)
+        repos = registry.read_repos_csv(common.get_config_fname("repos.csv"))
+        groups = registry.read_groups_csv(common.get_config_fname("groups.csv"))
+        registry_db.import_rows(repos, groups)
+        print(
+            f"Imported {len(repos)} repos and {len(groups)} groups "
+            f"into {registry_db.get_fname()}"
+        )
+    elif cmd == "export":
+        if not registry_db.is_enabled():
+            print("The registry is not in sqlite")
+            sys.exit(1)
+        repos = utils.get_repos(skip_validation=True)
+        groups = {
+            name: {"repos": members, "path": path}
+            for name, members, path in registry_db.read_groups()
+        }
+        utils.write_repos_csv(repos, "w")
+        utils.write_groups_csv(groups, "w")
+        if args.disable:
+            os.remove(registry_db.get_fname())
+        print(f"Exported {len(repos)} repos and {len(groups)} groups")
 
 
 def f_git_cmd(args: argparse.Namespace):
@@ -429,6 +649,7 @@ def f_git_cmd(args: argparse.Namespace):
         repos = args._parsed_repos
     else:
         repos, _ = utils.parse_repos_and_rest(args.repo)
+    repos = utils.select_repos(repos, args.only)
 
     per_repo_cmds = []
     for prop in repos.values():
@@ -473,7 +694,7 @@ def f_shell(args):
         sys.exit(2)
 
     cmds = " ".join(cmds)  # join the shell command into a single string
-    for name, prop in repos.items():
+    for name, prop in utils.select_repos(repos, args.only).items():
         # TODO: pull this out as a function
         got = subprocess.run(
             cmds,
@@ -506,19 +727,29 @@ def f_clear(_):
     utils.write_to_repo_file({}, "w")
 
 
-def main(argv=None):
-    p = argparse.ArgumentParser(
-        prog="gita", formatter_class=argparse.RawTextHelpFormatter, description=__doc__
-    )
-    subparsers = p.add_subparsers(
-        title="sub-commands", help="additional help with sub-command -h"
-    )
+def _print_profile():
+    from . import profiling
 
-    p.add_argument(
-        "-v", "--version", action="version", version=f"%(prog)s {get_version()}"
+    spawns = profiling.disable()
+    paths = {prop["path"]: name for name, prop in utils.get_repos().items()}
+    for line in profiling.summarize(spawns, paths):
+        print(line, file=sys.stderr)
+
+
+def _add_only_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=info.ONLY_STATES,
+        metavar="STATE",
+        help="only run in the repos that are in this state, one of "
+        f"{', '.join(info.ONLY_STATES)}. Repeat it for any of several states. "
+        "It is checked locally, i.e., ahead/behind refer to the last fetch. "
+        "dirty means staged or unstaged changes.",
     )
 
-    # bookkeeping sub-commands
+
+def _add_add_parser(subparsers):
     p_add = subparsers.add_parser("add", description="add repo(s)", help="add repo(s)")
     p_add.add_argument("paths", nargs="+", type=_path_name, help="repo(s) to add")
     p_add.add_argument("-n", "--dry-run", action="store_true", help="dry run")
@@ -546,8 +777,33 @@ def main(argv=None):
         "and create hierarchical groups based on folder structure.",
     )
     xgroup.add_argument("-b", "--bare", action="store_true", help="add bare repo(s)")
+    p_add.add_argument(
+        "--max-depth",
+        type=int,
+        metavar="N",
+        help="with -r or -a, look at most N levels of folders deep",
+    )
+    p_add.add_argument(
+        "--exclude",
+        action="append",
+        metavar="PATTERN",
+        help="with -r or -a, skip the folders whose names or relative paths "
+        "match the glob PATTERN. Repeat it for several patterns.",
+    )
+    p_add.add_argument(
+        "--nested",
+        action="store_true",
+        help="with -r or -a, also look for repos inside repos, e.g., submodules",
+    )
+    p_add.add_argument(
+        "--hidden",
+        action="store_true",
+        help="with -r or -a, also look into the hidden folders, e.g., .cache",
+    )
     p_add.set_defaults(func=f_add)
 
+
+def _add_rm_parser(subparsers):
     p_rm = subparsers.add_parser(
         "rm", description="remove repo(s)", help="remove repo(s)"
     )
@@ -556,6 +812,8 @@ def main(argv=None):
     )
     p_rm.set_defaults(func=f_rm)
 
+
+def _add_freeze_parser(subparsers):
     p_freeze = subparsers.add_parser(
         "freeze",
         description="print all repo information",
@@ -569,6 +827,8 @@ def main(argv=None):
     )
     p_freeze.set_defaults(func=f_freeze)
 
+
+def _add_clone_parser(subparsers):
     p_clone = subparsers.add_parser(
         "clone", description="clone repos", help="clone repos"
     )
@@ -609,6 +869,8 @@ def main(argv=None):
     )
     p_clone.set_defaults(func=f_clone)
 
+
+def _add_rename_parser(subparsers):
     p_rename = subparsers.add_parser(
         "rename", description="rename a repo", help="rename a repo"
     )
@@ -618,6 +880,8 @@ def main(argv=None):
     p_rename.add_argument("new_name", help="new name")
     p_rename.set_defaults(func=f_rename)
 
+
+def _add_flags_parser(subparsers):
     p_flags = subparsers.add_parser(
         "flags",
         description="Set custom git flags for repo.",
@@ -633,7 +897,21 @@ def main(argv=None):
     pf_set.add_argument(
         "flags", nargs=argparse.REMAINDER, help="custom flags, use quotes"
     )
+    pf_untracked = flags_cmds.add_parser(
+        "untracked",
+        description="Set how `gita ll` detects untracked files of repo(s): "
+        "full (default) lets git status list them, and off skips the check "
+        "and shows ~.",
+    )
+    pf_untracked.add_argument(
+        "policy", choices=info.UNTRACKED_POLICIES, help="untracked file policy"
+    )
+    pf_untracked.add_argument(
+        "repo", nargs="+", choices=utils.get_repos(), help="repo name(s)"
+    )
+
 
+def _add_color_parser(subparsers):
     p_color = subparsers.add_parser(
         "color",
         description="display and modify branch coloring of the ll sub-command.",
@@ -660,6 +938,8 @@ def main(argv=None):
         "color", choices=[c.name for c in info.Color], help="available colors"
     )
 
+
+def _add_info_parser(subparsers):
     p_info = subparsers.add_parser(
         "info",
         description="list, add, or remove information items of the ll sub-command.",
@@ -684,6 +964,8 @@ def main(argv=None):
         "The settings are in layout.csv",
     )
 
+
+def _add_ll_parser(subparsers):
     ll_doc = f"""  status symbols:
     +: staged changes
     *: unstaged changes
@@ -714,9 +996,124 @@ def main(argv=None):
         action="store_true",
         help="Disable coloring on the branch names.",
     )
-    p_ll.add_argument("-g", action="store_true", help="Show repo summaries by group.")
+    ll_mode = p_ll.add_mutually_exclusive_group()
+    ll_mode.add_argument(
+        "-g", action="store_true", help="Show repo summaries by group."
+    )
+    ll_mode.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="Keep the summaries up to date until Ctrl-C is pressed. Only the "
+        "repos that change are recomputed.",
+    )
+    p_ll.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of repos to process concurrently. "
+        "The default is the jobs setting in settings.csv, or 4 per CPU up to 32.",
+    )
+    p_ll.add_argument(
+        "-p",
+        "--progressive",
+        action="store_true",
+        help="Show repos as soon as they are ready. On a terminal, rows are "
+        "updated in place; otherwise they are printed in completion order, "
+        "followed by all rows sorted.",
+    )
+    p_ll.add_argument(
+        "-s",
+        "--sort",
+        choices=utils.SORT_KEYS,
+        default="name",
+        help="Order of the repos: by name (default), or by commit time with "
+        "the most recent first. Not used with -p or -w.",
+    )
+    p_ll.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        help="Seconds each repo may take. The git processes of slower repos "
+        "are killed, and they are marked as timed out.",
+    )
+    p_ll.add_argument(
+        "-b",
+        "--budget",
+        type=float,
+        help="Seconds all repos may take. The repos that are not done by then "
+        "are marked as timed out. Not used with -w.",
+    )
+    p_ll.add_argument(
+        "-f",
+        "--format",
+        choices=utils.OUTPUT_FORMATS,
+        default="text",
+        help="Output format: text (default), a JSON array, or newline "
+        "delimited JSON. JSON records come in the order the repos are ready, "
+        "with the group name if displayed by group.",
+    )
+    p_ll.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute everything instead of reusing the status cache.",
+    )
     p_ll.set_defaults(func=f_ll)
 
+
+def _add_daemon_parser(subparsers):
+    p_daemon = subparsers.add_parser(
+        "daemon",
+        help="keep repo status in memory for ll, ls and context",
+        description="Run a long-lived process that keeps the repo registry "
+        "and status up to date in memory. While it runs, `gita ll`, `gita ls` "
+        "and `gita context` are answered by it.",
+    )
+    p_daemon.add_argument(
+        "action",
+        nargs="?",
+        choices=["run", "stop", "status"],
+        default="run",
+        help="run the daemon in the foreground (default), stop it, "
+        "or check if it is running",
+    )
+    p_daemon.set_defaults(func=f_daemon)
+
+
+def _add_doctor_parser(subparsers):
+    p_doctor = subparsers.add_parser(
+        "doctor",
+        help="diagnose slow ll",
+        description="Time each step of `gita ll` for the chosen repos, and "
+        "suggest the git settings that would speed up the slowest ones.",
+    )
+    p_doctor.add_argument(
+        "repo",
+        nargs="*",
+        choices=utils.get_choices(),
+        help="repo(s) or group(s) to check, all repos by default",
+    )
+    p_doctor.add_argument(
+        "--perf",
+        action="store_true",
+        help="time the status pipeline and collect the repo sizes",
+    )
+    p_doctor.add_argument(
+        "-n",
+        "--top",
+        type=int,
+        default=10,
+        help="number of the slowest repos to show",
+    )
+    p_doctor.add_argument(
+        "--apply",
+        action="store_true",
+        help="apply the suggested git settings to the repos shown",
+    )
+    p_doctor.set_defaults(func=f_doctor)
+
+
+def _add_context_parser(subparsers):
     p_context = subparsers.add_parser(
         "context",
         help="set context",
@@ -735,6 +1132,8 @@ def main(argv=None):
     )
     p_context.set_defaults(func=f_context)
 
+
+def _add_ls_parser(subparsers):
     p_ls = subparsers.add_parser(
         "ls",
         help="show repo(s) or repo path",
@@ -748,6 +1147,25 @@ def main(argv=None):
     )
     p_ls.set_defaults(func=f_ls)
 
+
+def _add_here_parser(subparsers):
+    p_here = subparsers.add_parser(
+        "here",
+        help="target the repo of the current directory",
+        description="Run a sub-command on the registered repo that contains "
+        "the current directory, given after the sub-command name, e.g., "
+        "`gita here pull` is `gita pull <repo>`. Without a sub-command, print "
+        "the repo name.",
+    )
+    p_here.add_argument(
+        "cmd",
+        nargs=argparse.REMAINDER,
+        help="sub-command that takes repo names, and its other arguments",
+    )
+    p_here.set_defaults(func=f_here)
+
+
+def _add_group_parser(subparsers):
     p_group = subparsers.add_parser(
         "group", description="list, add, or remove repo group(s)", help="group repos"
     )
@@ -812,6 +1230,8 @@ def main(argv=None):
         "to_ungroup", nargs="+", choices=utils.get_groups(), help="group(s) to delete"
     )
 
+
+def _add_super_parser(subparsers):
     # superman mode
     p_super = subparsers.add_parser(
         "super",
@@ -831,8 +1251,11 @@ def main(argv=None):
     p_super.add_argument(
         "-q", "--quote-mode", action="store_true", help="use quote mode"
     )
+    _add_only_argument(p_super)
     p_super.set_defaults(func=f_super)
 
+
+def _add_shell_parser(subparsers):
     # shell mode
     p_shell = subparsers.add_parser(
         "shell",
@@ -852,9 +1275,11 @@ def main(argv=None):
     p_shell.add_argument(
         "-q", "--quote-mode", action="store_true", help="use quote mode"
     )
+    _add_only_argument(p_shell)
     p_shell.set_defaults(func=f_shell)
 
-    # clear
+
+def _add_clear_parser(subparsers):
     p_clear = subparsers.add_parser(
         "clear",
         description="removes all groups and repositories",
@@ -862,8 +1287,82 @@ def main(argv=None):
     )
     p_clear.set_defaults(func=f_clear)
 
-    # sub-commands that fit boilerplate
-    cmds = utils.get_cmds_from_files()
+
+def _add_validate_parser(subparsers):
+    p_validate = subparsers.add_parser(
+        "validate",
+        help="check the registered repos",
+        description="Check if the registered paths are still repos, ignoring "
+        "the cached results, and list the dead ones. Dead repos are hidden "
+        "from the other sub-commands, and can be removed from repos.csv.",
+    )
+    p_validate.set_defaults(func=f_validate)
+
+
+def _add_registry_parser(subparsers):
+    p_registry = subparsers.add_parser(
+        "registry",
+        description="Move the repos and groups between repos.csv/groups.csv "
+        "and a SQLite database, which scales better to very large numbers of "
+        "repos. The database is used whenever it exists.",
+        help="registry backend",
+    )
+    p_registry.set_defaults(func=f_registry)
+    registry_cmds = p_registry.add_subparsers(
+        dest="registry_cmd", help="additional help with sub-command -h"
+    )
+    registry_cmds.add_parser("ll", description="display the registry backend")
+    pr_import = registry_cmds.add_parser(
+        "import",
+        description="Copy repos.csv and groups.csv into the database, which "
+        "replaces them from then on.",
+    )
+    pr_import.add_argument(
+        "--force",
+        action="store_true",
+        help="replace the database if it exists, losing its changes since the "
+        "CSV files were written",
+    )
+    pr_export = registry_cmds.add_parser(
+        "export", description="Write the database to repos.csv and groups.csv."
+    )
+    pr_export.add_argument(
+        "--disable",
+        action="store_true",
+        help="delete the database afterwards, i.e., go back to the CSV files",
+    )
+
+
+# The built-in sub-commands and the functions that add their parsers
+SUB_COMMANDS = {
+    "add": _add_add_parser,
+    "rm": _add_rm_parser,
+    "freeze": _add_freeze_parser,
+    "clone": _add_clone_parser,
+    "rename": _add_rename_parser,
+    "flags": _add_flags_parser,
+    "color": _add_color_parser,
+    "info": _add_info_parser,
+    "ll": _add_ll_parser,
+    "daemon": _add_daemon_parser,
+    "doctor": _add_doctor_parser,
+    "context": _add_context_parser,
+    "ls": _add_ls_parser,
+    "here": _add_here_parser,
+    "group": _add_group_parser,
+    "super": _add_super_parser,
+    "shell": _add_shell_parser,
+    "clear": _add_clear_parser,
+    "validate": _add_validate_parser,
+    "registry": _add_registry_parser,
+}
+
+
+def _add_git_cmd_parsers(subparsers, cmds: Dict[str, Dict[str, str]]):
+    """
+    Add the parsers of the sub-commands that fit boilerplate, i.e., the
+    delegated git commands in `cmds`
+    """
     for name, data in cmds.items():
         help = data.get("help")
         repo_help = help
@@ -886,13 +1385,91 @@ def main(argv=None):
             type=bool,
             help="If set, run in shell mode",
         )
+        _add_only_argument(sp)
         if is_shell:
             cmd = [cmd]
         else:
             cmd = cmd.split()
         sp.set_defaults(func=f_git_cmd, cmd=cmd)
 
-    argcomplete.autocomplete(p)
+
+class _VersionAction(argparse.Action):
+    """
+    Like the `version` action, but the version is only looked up when asked
+    """
+
+    def __init__(self, option_strings, dest, **kwargs):
+        super().__init__(
+            option_strings,
+            dest,
+            nargs=0,
+            default=argparse.SUPPRESS,
+            help="show program's version number and exit",
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(f"{parser.prog} {get_version()}")
+        parser.exit()
+
+
+def _get_sub_command(argv: List[str]) -> Optional[str]:
+    """
+    Return the sub-command name in `argv`. The top level options take no
+    value, so it is the first word that is not an option.
+    """
+    return next((word for word in argv if not word.startswith("-")), None)
+
+
+def _get_parser():
+    """
+    Return the top level parser with no sub-command, and its sub-parsers
+    """
+    p = argparse.ArgumentParser(
+        prog="gita", formatter_class=argparse.RawTextHelpFormatter, description=__doc__
+    )
+    subparsers = p.add_subparsers(
+        title="sub-commands", help="additional help with sub-command -h"
+    )
+
+    p.add_argument("-v", "--version", action=_VersionAction)
+    p.add_argument(
+        "--profile",
+        action="store_true",
+        help="record the processes that gita spawns, and print the latencies "
+        "by command and the slowest repos to stderr at exit",
+    )
+    return p, subparsers
+
+
+def _get_full_parser() -> argparse.ArgumentParser:
+    p, subparsers = _get_parser()
+    for add_parser in SUB_COMMANDS.values():
+        add_parser(subparsers)
+    _add_git_cmd_parsers(subparsers, utils.get_cmds_from_files())
+    return p
+
+
+def main(argv=None):
+    # The completion is answered from an index without building the parsers
+    completion.autocomplete(_get_full_parser)
+
+    # Only the parser of the chosen sub-command is built, since the others
+    # may read the repos and groups for their choices. All of them are
+    # needed for the help and the error of a wrong name.
+    argv = sys.argv[1:] if argv is None else argv
+    cmds = utils.get_cmds_from_files()
+    name = _get_sub_command(argv)
+    if name in SUB_COMMANDS:
+        p, subparsers = _get_parser()
+        SUB_COMMANDS[name](subparsers)
+    elif name in cmds:
+        p, subparsers = _get_parser()
+        _add_git_cmd_parsers(subparsers, {name: cmds[name]})
+    elif name or not {"-v", "--version"} & set(argv):
+        p = _get_full_parser()
+    else:
+        p, _ = _get_parser()
+
     args = p.parse_args(argv)
 
     args.async_blacklist = {
@@ -900,7 +1477,15 @@ def main(argv=None):
     }
 
     if "func" in args:
-        args.func(args)
+        if args.profile:
+            from . import profiling
+
+            profiling.enable()
+        try:
+            args.func(args)
+        finally:
+            if args.profile:
+                _print_profile()
     else:
         p.print_help()  # pragma: no cover
 
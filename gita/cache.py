@@ -0,0 +1,271 @@
+"""
+On-disk cache of the repo information that is fully determined by the git
+directory, such as branch, local/remote relation, stash, and commit message.
+
+Each entry is keyed by a fingerprint made of the stat results of the files
+that such information depends on. Unstaged changes and untracked files are
+not covered since editing the worktree leaves the git directory untouched.
+
+The validation of the registered repo paths is cached too, see
+`ValidationCache`.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from . import common, gitdir
+
+CACHE_FNAME = "status_cache.json"
+CACHE_VERSION = 2
+# entries beyond this many are evicted, least recently used first
+MAX_ENTRIES = 20000
+
+VALIDATION_FNAME = "repo_validation.json"
+VALIDATION_VERSION = 1
+
+
+def fingerprint(path: str) -> Optional[List]:
+    """
+    Return the fingerprint of the repo at `path`, or None if the repo layout
+    is unknown.
+
+    It consists of the current ref and its upstream ref, and the mtime and
+    size of the files that change when HEAD, the index, the refs, or the
+    stash change.
+    """
+    git_dir = gitdir.find(path)
+    if git_dir is None:
+        return None
+    common_dir = gitdir.get_common_dir(git_dir)
+    ref, _ = gitdir.read_head(git_dir)
+    files = [
+        git_dir / "HEAD",
+        git_dir / "index",
+        common_dir / "config",
+        common_dir / "packed-refs",
+        common_dir / "logs" / "refs" / "stash",
+    ]
+    upstream = ""
+    if ref:
+        files.append(common_dir / ref)
+        if ref.startswith("refs/heads/"):
+            upstream = gitdir.get_upstream_ref(git_dir, ref[len("refs/heads/") :])
+            if upstream is None:  # cannot tell what to watch
+                return None
+            if upstream:
+                files.append(common_dir / upstream)
+    else:  # detached HEAD is displayed with its tag
+        files.append(common_dir / "refs" / "tags")
+    return [ref, upstream] + [_stat(f) for f in files]
+
+
+def _stat(f: Path) -> Optional[List[int]]:
+    try:
+        st = f.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+class StatusCache:
+    """
+    Cached repo information keyed by repo path.
+
+    Lookups and updates are thread-safe. Call `save` to persist the updates.
+    """
+
+    def __init__(self, fname: Optional[str] = None):
+        self.fname = os.fspath(fname or common.get_config_fname(CACHE_FNAME))
+        self.entries = _read(self.fname)
+        self.updated = {}
+        self.fingerprints = {}
+        self.lock = threading.Lock()
+
+    def _fingerprint(self, path: str) -> Optional[List]:
+        """
+        Return the fingerprint of `path`, computed once per cache instance.
+        """
+        with self.lock:
+            if path in self.fingerprints:
+                return self.fingerprints[path]
+        fp = fingerprint(path)
+        with self.lock:
+            return self.fingerprints.setdefault(path, fp)
+
+    def forget(self, paths: Iterable[str]):
+        """
+        Drop the fingerprints computed for `paths`, e.g., after their repos
+        changed. They are recomputed on the next lookup.
+        """
+        with self.lock:
+            for path in paths:
+                self.fingerprints.pop(path, None)
+
+    def get(self, path: str, key: str) -> Any:
+        """
+        Return the cached value of `key` for the repo at `path`, or None if it
+        is missing or stale.
+        """
+        fp = self._fingerprint(path)
+        if fp is None:
+            return None
+        with self.lock:
+            entry = self.updated.get(path) or self.entries.get(path)
+            if not entry or entry["fp"] != fp:
+                return None
+            return entry["data"].get(key)
+
+    def put(self, path: str, **data):
+        """
+        Cache `data` for the repo at `path`
+        """
+        fp = self._fingerprint(path)
+        if fp is None:
+            return
+        with self.lock:
+            entry = self.updated.get(path) or self.entries.get(path)
+            if not entry or entry["fp"] != fp:
+                entry = {"fp": fp, "data": {}}
+            entry = {"fp": fp, "data": {**entry["data"], **data}, "used": time.time()}
+            self.updated[path] = entry
+
+    def save(self, keep: Iterable[str]):
+        """
+        Write the updates to disk, and evict the repos whose paths are not in
+        `keep`.
+
+        The file is re-read under a lock so that concurrent gita processes
+        don't drop each other's updates, and replaced atomically so that
+        readers never see a partial file.
+        """
+        if not self.updated:
+            return
+        keep = set(keep)
+        os.makedirs(os.path.dirname(self.fname), exist_ok=True)
+        with _file_lock(self.fname + ".lock"):
+            entries = _read(self.fname)
+            entries.update(self.updated)
+            entries = {p: e for p, e in entries.items() if p in keep}
+            if len(entries) > MAX_ENTRIES:
+                recent = sorted(entries, key=lambda p: entries[p].get("used", 0))
+                for p in recent[: len(entries) - MAX_ENTRIES]:
+                    del entries[p]
+            _write(self.fname, {"version": CACHE_VERSION, "repos": entries})
+        self.entries = entries
+        self.updated = {}
+
+
+class ValidationCache:
+    """
+    Whether the registered paths are repos, keyed by the mtime and inode of
+    the path. Creating or removing `.git`, or replacing the directory, changes
+    the key. Missing paths are not cached since the check is a failed stat.
+
+    Call `save` to persist the updates.
+    """
+
+    def __init__(self, fname: Optional[str] = None):
+        self.fname = os.fspath(fname or common.get_config_fname(VALIDATION_FNAME))
+        self.entries = _read(self.fname, VALIDATION_VERSION)
+        self.updated = {}
+
+    def get(self, path: str) -> Optional[bool]:
+        """
+        Return whether the repo at `path` was valid with the same key, or None
+        if it is not known.
+        """
+        key = _validation_key(path)
+        entry = self.updated.get(path) or self.entries.get(path)
+        if key is None or not entry or entry[:2] != key:
+            return None
+        return entry[2]
+
+    def put(self, path: str, valid: bool):
+        key = _validation_key(path)
+        if key is not None:
+            self.updated[path] = key + [valid]
+
+    def save(self, keep: Optional[Iterable[str]] = None):
+        """
+        Write the updates to disk. If `keep` is given, the entries of the
+        other paths are dropped.
+        """
+        entries = {**self.entries, **self.updated}
+        if keep is not None:
+            keep = set(keep)
+            entries = {p: e for p, e in entries.items() if p in keep}
+        if entries == self.entries:
+            return
+        os.makedirs(os.path.dirname(self.fname), exist_ok=True)
+        with _file_lock(self.fname + ".lock"):
+            if keep is None:  # keep the updates of concurrent gita processes
+                entries = {**_read(self.fname, VALIDATION_VERSION), **entries}
+            _write(self.fname, {"version": VALIDATION_VERSION, "repos": entries})
+        self.entries = entries
+        self.updated = {}
+
+
+def _validation_key(path: str) -> Optional[List[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_ino]
+
+
+def _read(fname: str, version: int = CACHE_VERSION) -> Dict[str, Any]:
+    try:
+        with open(fname) as f:
+            content = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(content, dict) or content.get("version") != version:
+        return {}
+    return content.get("repos", {})
+
+
+def _write(fname: str, content: Dict):
+    write_atomic(fname, json.dumps(content, separators=(",", ":")).encode())
+
+
+def write_atomic(fname: str, content: bytes):
+    """
+    Replace the file `fname` with `content` at once, so that concurrent
+    readers see either the old or the new file, never a partial one. The
+    directory of `fname` is created if needed.
+    """
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    prefix = f".{os.path.basename(fname)}."
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fname), prefix=prefix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, fname)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+@contextmanager
+def _file_lock(fname: str):
+    """
+    Hold an exclusive lock on `fname`. On platforms without `fcntl`, only the
+    atomic replacement protects the cache file.
+    """
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover
+        yield
+        return
+    with open(fname, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -1,4 +1,7 @@
+import csv
 import os
+from functools import lru_cache
+from typing import Dict
 
 
 def get_config_dir() -> str:
@@ -15,3 +18,20 @@ def get_config_fname(fname: str) -> str:
     Return the file name that stores the repo locations.
     """
     return os.path.join(get_config_dir(), fname)
+
+
+@lru_cache()
+def get_settings() -> Dict[str, str]:
+    """
+    Return the custom settings in settings.csv, which has a header line of
+    setting names and a line of values, e.g.,
+
+    jobs
+    64
+    """
+    settings = {}
+    fname = get_config_fname("settings.csv")
+    if os.path.isfile(fname):
+        with open(fname, "r") as f:
+            settings = next(csv.DictReader(f), {})
+    return settings
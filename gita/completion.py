@@ -0,0 +1,160 @@
+"""
+Answer the shell completion from an index of the command line.
+
+Building the parsers of all sub-commands reads and validates the repos and
+groups, and reads cmds.json, which lags on every TAB press with a large
+registry. Instead, the parser tree is described once in an index file in the
+config directory, along with the repo and group names, and the completion is
+answered by a light parser rebuilt from it. The index is rebuilt whenever
+the repo registry, cmds.json or gita itself change.
+"""
+
+import argparse
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import argcomplete
+
+from . import cache, common, registry_db, utils
+
+INDEX_FNAME = "completion.json"
+INDEX_VERSION = 1
+
+
+def get_fingerprint() -> List[Optional[List[int]]]:
+    """
+    Return the mtime and size of the files that the parsers are built from
+    """
+    package = os.path.dirname(__file__)
+    fnames = [common.get_config_fname(f) for f in ("repos.csv", "groups.csv")]
+    fnames += [
+        registry_db.get_fname(),
+        common.get_config_fname("cmds.json"),
+        os.path.join(package, "cmds.json"),
+        os.path.join(package, "__main__.py"),
+    ]
+    fingerprint = []
+    for fname in fnames:
+        try:
+            st = os.stat(fname)
+        except OSError:
+            fingerprint.append(None)
+        else:
+            fingerprint.append([st.st_mtime_ns, st.st_size])
+    return fingerprint
+
+
+def get_names() -> Dict[str, List[str]]:
+    """
+    Return the name lists that choices may refer to
+    """
+    repos = list(utils.get_repos())
+    groups = list(utils.get_groups())
+    return {"repos": repos, "groups": groups, "repos+groups": repos + groups}
+
+
+def describe(parser: argparse.ArgumentParser, names: Dict[str, List[str]]) -> Dict:
+    """
+    Return what `build` needs to rebuild `parser` and its sub-parsers. Choices
+    that equal one of `names` are stored as its key.
+    """
+    known = {key: set(values) for key, values in names.items()}
+    arguments = []
+    for action in parser._actions:
+        if isinstance(action, argparse._HelpAction):
+            continue
+        if isinstance(action, argparse._SubParsersAction):
+            helps = {a.dest: a.help for a in action._choices_actions}
+            commands = {}
+            for name, sub in action.choices.items():
+                commands[name] = {"help": helps.get(name), **describe(sub, names)}
+            arguments.append({"commands": commands})
+            continue
+        choices = action.choices
+        if choices is not None:
+            choices = list(choices)
+            key = next((k for k, v in known.items() if v == set(choices)), None)
+            choices = key or choices
+        arguments.append(
+            {
+                "flags": action.option_strings,
+                "dest": action.dest,
+                "nargs": action.nargs,
+                "choices": choices,
+                "help": action.help,
+            }
+        )
+    return {"arguments": arguments}
+
+
+def build(
+    spec: Dict,
+    names: Dict[str, List[str]],
+    parser: Optional[argparse.ArgumentParser] = None,
+) -> argparse.ArgumentParser:
+    """
+    Return the parser described by `spec`, which only serves completion
+    """
+    if parser is None:
+        parser = argparse.ArgumentParser(prog="gita")
+    for a in spec["arguments"]:
+        if "commands" in a:
+            subparsers = parser.add_subparsers()
+            for name, sub in a["commands"].items():
+                build(sub, names, subparsers.add_parser(name, help=sub["help"]))
+            continue
+        args = a["flags"] or [a["dest"]]
+        if a["nargs"] == 0:
+            parser.add_argument(*args, action="store_true", help=a["help"])
+            continue
+        choices = a["choices"]
+        if isinstance(choices, str):
+            choices = names[choices]
+        parser.add_argument(*args, nargs=a["nargs"], choices=choices, help=a["help"])
+    return parser
+
+
+def read_index() -> Dict[str, Any]:
+    try:
+        with open(common.get_config_fname(INDEX_FNAME)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return {}
+    return index
+
+
+def write_index(parser: argparse.ArgumentParser, fingerprint: List):
+    names = get_names()
+    index = {
+        "version": INDEX_VERSION,
+        "fingerprint": fingerprint,
+        "names": names,
+        "parser": describe(parser, names),
+    }
+    fname = common.get_config_fname(INDEX_FNAME)
+    try:
+        cache.write_atomic(fname, json.dumps(index, separators=(",", ":")).encode())
+    except OSError:  # completion still works, only slower
+        pass
+
+
+def autocomplete(get_parser: Callable[[], argparse.ArgumentParser]):
+    """
+    Answer the completion request in the environment, if any, and exit.
+
+    @param get_parser: returns the full parser, which is only called when the
+        index is missing or out of date
+    """
+    if "_ARGCOMPLETE" not in os.environ:
+        return
+    fingerprint = get_fingerprint()
+    index = read_index()
+    if index.get("fingerprint") == fingerprint:
+        parser = build(index["parser"], index["names"])
+    else:
+        parser = get_parser()
+        write_index(parser, fingerprint)
+    argcomplete.autocomplete(parser)
@@ -0,0 +1,346 @@
+"""
+Optional long-lived process that keeps the repo registry and the repo status
+in memory, and answers `gita ll`, `gita ls` and `gita context` over a Unix
+domain socket in the config directory.
+
+Each connection carries one JSON request line, e.g.,
+
+    {"version": 1, "cmd": "ls", "repo": null}
+
+which is answered with one JSON line of either the output lines or an error,
+
+    {"lines": ["repo1 repo2"]}
+    {"error": "..."}
+
+The clients fall back to doing the work themselves if there is no daemon or
+it cannot answer.
+
+For `gita ll`, the refs and commits are kept up to date by watching the git
+directories. The worktrees are not fully watched, so their status is taken
+again for each request.
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from . import common, info, utils
+
+SOCKET_FNAME = "daemon.sock"
+PROTOCOL_VERSION = 1
+# Seconds a client waits for the answer before doing the work itself
+CLIENT_TIMEOUT = 30.0
+# Seconds between checks of the config files
+CONFIG_CHECK = 1.0
+# Config files whose changes invalidate the registry
+CONFIG_SUFFIXES = (".csv", ".context", ".json", ".sqlite")
+
+
+def is_supported() -> bool:
+    """
+    Return True if the platform has Unix domain sockets, which Windows lacks
+    """
+    return hasattr(socket, "AF_UNIX") and hasattr(
+        socketserver, "ThreadingUnixStreamServer"
+    )
+
+
+def get_socket_fname() -> str:
+    return common.get_config_fname(SOCKET_FNAME)
+
+
+def request(cmd: str, **kwargs) -> Optional[List[str]]:
+    """
+    Return the output lines of `cmd` answered by the daemon, or None if the
+    daemon is not running or cannot answer.
+    """
+    fname = get_socket_fname()
+    if not is_supported() or not os.path.exists(fname):
+        return None
+    message = {"version": PROTOCOL_VERSION, "cmd": cmd, **kwargs}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(CLIENT_TIMEOUT)
+            s.connect(fname)
+            s.sendall(json.dumps(message).encode() + b"\n")
+            with s.makefile("rb") as f:
+                reply = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    return reply.get("lines")
+
+
+class State:
+    """
+    The repo registry and the snapshots of the repos. The registry is
+    reloaded when the config files change.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.config = None
+        self.snapshots: Dict[str, info.RepoSnapshot] = {}
+
+    def reload(self, force: bool = False) -> Dict[str, Dict[str, str]]:
+        """
+        Return the registered repos, re-reading the config files if they
+        changed or if `force`.
+        """
+        config = _get_config_signature()
+        with self.lock:
+            if force or config != self.config:
+                self.config = config
+                for f in (
+                    utils.get_repos,
+                    utils.get_groups,
+                    utils.get_repo_index,
+                    utils.get_group_index,
+                    utils.get_context,
+                    common.get_settings,
+                    info.get_color_encoding,
+                    info.get_symbols,
+                ):
+                    f.cache_clear()
+            return utils.get_repos()
+
+    def get_snapshots(
+        self, repos: Dict[str, Dict[str, str]]
+    ) -> Dict[str, info.RepoSnapshot]:
+        """
+        Return the snapshots of `repos`. Missing ones are taken now.
+        """
+        with self.lock:
+            snapshots = {
+                name: snap
+                for name, snap in self.snapshots.items()
+                if name in repos and snap.prop == repos[name]
+            }
+        missing = {name: prop for name, prop in repos.items() if name not in snapshots}
+        taken = dict(utils.get_snapshots(missing))
+        with self.lock:
+            self.snapshots.update(taken)
+        return {**snapshots, **taken}
+
+    def refresh(self, repos: Dict[str, Dict[str, str]]):
+        """
+        Take new snapshots of `repos`. The old ones are dropped right away so
+        that they are never served after a change.
+        """
+        with self.lock:
+            for name in repos:
+                self.snapshots.pop(name, None)
+        self.get_snapshots(repos)
+
+    def run_refresh(self, stopped: threading.Event):
+        """
+        Refresh the repos that change, until `stopped` is set. The watcher
+        reports the changes in the git directories and the top of the
+        worktrees. All repos are refreshed every `watch.FULL_REFRESH` seconds
+        like `gita ll --watch`, for the edits in the sub-directories.
+        """
+        # only the daemon needs the watcher, not the clients of `request`
+        from . import watch
+
+        watcher = None
+        try:
+            next_full = 0
+            while not stopped.is_set():
+                now = time.monotonic()
+                full = now >= next_full
+                repos = self.reload(force=full)
+                paths = {name: prop["path"] for name, prop in repos.items()}
+                if watcher is None or watcher.paths != paths:
+                    if watcher:
+                        watcher.close()
+                    watcher = watch.get_watcher(paths)
+                    full = True
+                if full:
+                    names = set(repos)
+                    next_full = now + watch.FULL_REFRESH
+                    with self.lock:
+                        self.snapshots = {
+                            k: v for k, v in self.snapshots.items() if k in repos
+                        }
+                if names:
+                    watcher.arm(names)
+                    self.refresh({name: repos[name] for name in names})
+                timeout = min(CONFIG_CHECK, next_full - time.monotonic())
+                names = watch.wait_for_changes(watcher, timeout)
+        finally:
+            if watcher:
+                watcher.close()
+
+    def answer(self, message: Dict) -> Dict:
+        cmd = message.get("cmd")
+        cwd = Path(message.get("cwd") or "/")
+        if cmd == "ping":
+            return {"lines": []}
+        if cmd == "ll":
+            lines = []
+            with self.lock:
+                self.reload()
+                sections = utils.get_ll_sections(
+                    message.get("group"), message.get("by_group"), cwd
+                )
+            for header, repos in sections:
+                prefix = ""
+                if header is not None:
+                    lines.append(f"{header}:")
+                    prefix = "   "
+                snapshots = self.get_snapshots(repos)
+                # The watcher misses the edits in the sub-directories of the
+                # worktrees, so only the ref and commit information is reused
+                snapshots = dict(
+                    utils.get_snapshots(repos, cache=_Reused(snapshots.values()))
+                )
+                for line in utils.describe_snapshots(
+                    snapshots, message.get("no_colors"), message.get("sort", "name")
+                ):
+                    lines.append(f"{prefix}{line}")
+            return {"lines": lines}
+        if cmd == "ls":
+            repos = self.reload()
+            repo = message.get("repo")
+            if repo:
+                if repo not in repos:
+                    return {"error": f"{repo} is not registered"}
+                return {"lines": [repos[repo]["path"]]}
+            return {"lines": [" ".join(repos)]}
+        if cmd == "context":
+            with self.lock:
+                self.reload()
+                ctx = utils.get_context(cwd)
+                if ctx:
+                    group = ctx.stem
+                    repos = " ".join(utils.get_groups()[group]["repos"])
+                    return {"lines": [f"{group}: {repos}"]}
+            if (Path(common.get_config_dir()) / "auto.context").exists():
+                return {"lines": ["auto: none detected!"]}
+            return {"lines": ["Context is not set"]}
+        return {"error": f"unknown command {cmd}"}
+
+
+class _Reused:
+    """
+    The ref and commit information of the daemon's snapshots, looked up like
+    `cache.StatusCache`. New snapshots with it rerun only the worktree part
+    of `git status`.
+    """
+
+    def __init__(self, snapshots: Iterable[info.RepoSnapshot]):
+        # only what was computed in time, without computing more
+        self.computed = {
+            snap.path: snap.__dict__ for snap in snapshots if not snap.timed_out
+        }
+
+    def get(self, path: str, key: str) -> Any:
+        computed = self.computed.get(path, {})
+        if key == "refs_status" and "status" in computed:
+            status = computed["status"]
+            return [
+                status.head,
+                status.stashed,
+                status.situ,
+                status.ahead,
+                status.behind,
+            ]
+        if key == "last_commit" and "last_commit" in computed:
+            return list(computed["last_commit"])
+        return None
+
+    def put(self, path: str, **data):
+        pass
+
+
+def _get_config_signature() -> List:
+    """
+    Return the names, mtimes and sizes of the config files
+    """
+    try:
+        entries = list(os.scandir(common.get_config_dir()))
+    except OSError:
+        return []
+    sig = []
+    for entry in entries:
+        if entry.name.endswith(CONFIG_SUFFIXES):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            sig.append((entry.name, st.st_mtime_ns, st.st_size))
+    return sorted(sig)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        stop = False
+        try:
+            message = json.loads(self.rfile.readline())
+            if message.get("version") != PROTOCOL_VERSION:
+                reply = {"error": "unsupported protocol version"}
+            elif message.get("cmd") == "stop":
+                stop = True
+                reply = {"lines": []}
+            else:
+                reply = self.server.state.answer(message)
+        except (Exception, SystemExit) as e:  # the client falls back
+            reply = {"error": str(e)}
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+        self.wfile.flush()
+        # only after the reply is out, since `run` exits once the server stops
+        if stop:
+            threading.Thread(target=self.server.shutdown).start()
+
+
+def run():
+    """
+    Serve the requests until stopped with `gita daemon stop`, Ctrl-C or
+    SIGTERM.
+    """
+    if not is_supported():
+        print("gita daemon needs Unix domain sockets")
+        sys.exit(1)
+    if request("ping") is not None:
+        print("gita daemon is already running")
+        sys.exit(1)
+    fname = get_socket_fname()
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    if os.path.exists(fname):  # left over by a daemon that crashed
+        os.unlink(fname)
+    server = make_server(fname)
+    stopped = threading.Event()
+    refresher = threading.Thread(
+        target=server.state.run_refresh, args=(stopped,), daemon=True
+    )
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        refresher.start()
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopped.set()
+        server.server_close()
+        os.unlink(fname)
+
+
+def make_server(fname: str) -> socketserver.BaseServer:
+    """
+    Return a server listening on the socket `fname`, which only the user can
+    connect to.
+    """
+    umask = os.umask(0o077)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(fname, _Handler)
+    finally:
+        os.umask(umask)
+    server.daemon_threads = True
+    server.state = State()
+    return server
@@ -0,0 +1,148 @@
+"""
+Find the repos under some directories, for `gita add -r` and `gita add -a`.
+
+The directories are walked with `os.scandir`, which tells the entry types
+without extra system calls. The walk doesn't descend into git directories,
+including bare repos, nor into repos unless nested repos are asked for. So
+the inside of a repo, with its build output and dependencies, is skipped.
+Hidden directories, e.g., `.cache`, are skipped too unless asked for, like the
+`**` glob that was used before. Symbolic links to directories are followed,
+but each target at most once.
+"""
+
+import fnmatch
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Set, Tuple
+
+from . import utils
+
+# the entries of a git directory, see `gitdir.is_bare_layout`
+_BARE_LAYOUT = {"HEAD", "objects", "refs"}
+
+
+def walk_repos(
+    roots: Sequence[str],
+    max_depth: Optional[int] = None,
+    exclude: Sequence[str] = (),
+    nested: bool = False,
+    exclude_submodule: bool = False,
+    hidden: bool = False,
+) -> Iterator[str]:
+    """
+    Yield the paths of the repos in the `roots` directories, as they are
+    found. They pass `utils.is_git` without the bare repos. The roots are
+    walked in parallel.
+
+    @param max_depth: levels of sub-directories to look into, unlimited if None
+    @param exclude: glob patterns of the directory names or paths relative to
+        their root to skip
+    @param nested: whether to look for repos inside repos, e.g., submodules
+    @param exclude_submodule: whether to leave out the submodules
+    @param hidden: whether to look into the directories whose names start
+        with a dot
+    """
+    options = (max_depth, exclude, nested, exclude_submodule, hidden)
+    if len(roots) < 2:
+        for root in roots:
+            yield from _walk(root, *options)
+        return
+    found = queue.Queue()
+
+    def walk(root: str):
+        try:
+            for path in _walk(root, *options):
+                found.put(path)
+        finally:
+            found.put(None)  # the end of this root
+
+    with ThreadPoolExecutor(max_workers=min(len(roots), utils.get_jobs())) as pool:
+        futures = [pool.submit(walk, root) for root in roots]
+        pending = len(roots)
+        while pending:
+            path = found.get()
+            if path is None:
+                pending -= 1
+            else:
+                yield path
+        for f in futures:
+            f.result()  # raise the errors of the walks
+
+
+def _walk(
+    root: str,
+    max_depth: Optional[int],
+    exclude: Sequence[str],
+    nested: bool,
+    exclude_submodule: bool,
+    hidden: bool,
+) -> Iterator[str]:
+    root = root.rstrip(os.path.sep) or os.path.sep
+    real_root = os.path.realpath(root)
+    # the real paths of the walked symbolic links, to not walk them again
+    visited = {real_root}
+    # (path, real path, depth) of the directories to scan
+    todo = [(root, real_root, 0)]
+    while todo:
+        path, real, depth = todo.pop()
+        scanned = _scan(path)
+        if scanned is None:
+            continue
+        subdirs, names = scanned
+        if ".git" in names:
+            if not (exclude_submodule and utils.is_submodule_repo(Path(path, ".git"))):
+                yield path
+            if not nested:
+                continue
+        elif _BARE_LAYOUT <= names:  # a git directory has no repos inside
+            continue
+        if max_depth is not None and depth >= max_depth:
+            continue
+        for entry, is_link in subdirs:
+            if entry.name == ".git" or _is_excluded(entry, root, exclude):
+                continue
+            if entry.name.startswith(".") and not hidden:
+                continue
+            if is_link:
+                child_real = os.path.realpath(entry.path)
+                # a link to an ancestor or a walked directory would loop
+                if child_real in visited or (real + os.path.sep).startswith(
+                    child_real + os.path.sep
+                ):
+                    continue
+                visited.add(child_real)
+            else:
+                child_real = os.path.join(real, entry.name)
+            todo.append((entry.path, child_real, depth + 1))
+
+
+def _scan(path: str) -> Optional[Tuple[List[Tuple[os.DirEntry, bool]], Set[str]]]:
+    """
+    Return the (entry, whether it is a symbolic link) of the sub-directories
+    of `path` and the names of all entries, or None if it cannot be read
+    """
+    subdirs = []
+    names = set()
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                names.add(entry.name)
+                try:
+                    if entry.is_dir():
+                        subdirs.append((entry, entry.is_symlink()))
+                except OSError:  # e.g., a dangling link
+                    pass
+    except OSError:
+        return None
+    return subdirs, names
+
+
+def _is_excluded(entry: os.DirEntry, root: str, patterns: Sequence[str]) -> bool:
+    if not patterns:
+        return False
+    rel = os.path.relpath(entry.path, root)
+    return any(
+        fnmatch.fnmatch(entry.name, p) or fnmatch.fnmatch(rel, p) for p in patterns
+    )
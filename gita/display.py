@@ -0,0 +1,140 @@
+"""
+Terminal rendering of `gita ll` rows that become ready at different times.
+"""
+
+import shutil
+import sys
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+# ANSI escape sequences
+CLEAR_LINE = "\r\x1b[2K"
+NO_WRAP = "\x1b[?7l"
+WRAP = "\x1b[?7h"
+
+
+class LiveTable:
+    """
+    Rows sorted by key, followed by a status line. Rows are redrawn in place
+    when they change.
+
+    Line wrapping is disabled while the table is live, so that each row takes
+    exactly one terminal line.
+    """
+
+    def __init__(
+        self,
+        rows: Dict[str, str],
+        out: Optional[TextIO] = None,
+        prefix: str = "",
+    ):
+        self.out = out or sys.stdout
+        self.prefix = prefix
+        self.keys = sorted(rows)
+        self.rows = dict(rows)
+        self.index = {k: i for i, k in enumerate(self.keys)}
+        self.status = ""
+        # whether `start` disabled the line wrapping, which `finish` restores
+        self.no_wrap = False
+
+    def fits(self) -> bool:
+        """
+        Return True if the rows and the status line fit in the terminal, so
+        that all of them can be redrawn.
+        """
+        return len(self.keys) + 1 <= shutil.get_terminal_size().lines
+
+    def start(self):
+        self.out.write(NO_WRAP)
+        self.no_wrap = True
+        for k in self.keys:
+            self.out.write(f"{self.prefix}{self.rows[k]}\n")
+        self.out.write(self.status)
+        self.out.flush()
+
+    def update(self, key: str, row: str):
+        """
+        Redraw the row of `key`. The cursor stays on the status line.
+        """
+        if self.rows.get(key) == row:
+            return
+        self.rows[key] = row
+        up = len(self.keys) - self.index[key]
+        self.out.write(f"\x1b[{up}A{CLEAR_LINE}{self.prefix}{row}\x1b[{up}B\r")
+        self.out.write(self.status)
+        self.out.flush()
+
+    def set_status(self, status: str):
+        self.status = status
+        self.out.write(f"{CLEAR_LINE}{status}")
+        self.out.flush()
+
+    def finish(self):
+        self.out.write(CLEAR_LINE)
+        if self.no_wrap:
+            self.out.write(WRAP)
+            self.no_wrap = False
+        self.out.flush()
+
+
+def show_progressively(
+    results: Iterator[Tuple[str, str]],
+    placeholders: Dict[str, str],
+    out: Optional[TextIO] = None,
+    prefix: str = "",
+):
+    """
+    Display the (key, row) `results` that come in arbitrary order, such that
+    the final output is sorted by key.
+
+    On a terminal, placeholder rows are printed first and replaced in place as
+    results arrive. If there are too many rows for that, only the number of
+    pending rows is shown until the sorted rows are printed at the end.
+    Otherwise, the rows are printed as they come, followed by all rows sorted.
+    """
+    out = out or sys.stdout
+    total = len(placeholders)
+    if not out.isatty():
+        rows = {}
+        for key, row in results:
+            rows[key] = row
+            print(f"{prefix}{row}", file=out, flush=True)
+        _print_sorted(rows, out, prefix, separator=True)
+        return
+
+    table = LiveTable(placeholders, out, prefix)
+    live = table.fits()
+    if live:
+        table.start()
+    try:
+        for done, (key, row) in enumerate(results, start=1):
+            if live:
+                table.update(key, row)
+            else:
+                table.rows[key] = row
+            if done < total:
+                table.set_status(f"{total - done} pending")
+    finally:
+        table.finish()
+    if not live:
+        _print_sorted(table.rows, out, prefix)
+
+
+def _print_sorted(
+    rows: Dict[str, str], out: TextIO, prefix: str, separator: bool = False
+):
+    if separator and rows:
+        print(file=out)
+    for key in sorted(rows):
+        print(f"{prefix}{rows[key]}", file=out)
+    out.flush()
+
+
+def placeholder_rows(keys: Iterable[str], text: str = "...") -> Dict[str, str]:
+    """
+    Return rows with the key and `text`, aligned like the `gita ll` rows.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    width = len(max(keys, key=len)) + 1
+    return {k: f"{k:<{width}}{text}" for k in keys}
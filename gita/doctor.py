@@ -0,0 +1,256 @@
+"""
+Diagnose why `gita ll` is slow, see `gita doctor --perf`.
+
+Each step of the `gita ll` pipeline is timed on its own for every repo, with
+no status cache, and the repo size indicators that explain the cost are
+collected. The slowest repos are reported with the git settings that would
+speed them up, which `--apply` sets.
+"""
+
+import struct
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from typing import Callable, Dict, Iterator, List
+
+from . import gitdir, info
+
+# The timed steps of `gita ll`. Each of them gets a fresh snapshot, so that
+# no step reuses the git work of another.
+CHECKS: Dict[str, Callable[[Dict[str, str]], str]] = {
+    "get_repo_status": lambda prop: info.get_repo_status(
+        prop, info.Truncate(), no_colors=True
+    ),
+    "get_commit_msg": lambda prop: info.get_commit_msg(prop, info.Truncate()),
+    "get_commit_time": lambda prop: info.get_commit_time(prop, info.Truncate()),
+    "get_head": lambda prop: info.get_head(prop["path"]),
+}
+
+# The built-in file system monitor only exists on these platforms
+FSMONITOR_PLATFORMS = ("darwin", "win32")
+# Index entries from which the file system monitor pays off
+FSMONITOR_MIN_ENTRIES = 10000
+# Index entries from which the untracked cache pays off
+UNTRACKED_CACHE_MIN_ENTRIES = 1000
+# Commits from which the commit-graph pays off
+COMMIT_GRAPH_MIN_COMMITS = 1000
+
+Suggestion = namedtuple("Suggestion", ["reason", "cmds"])
+
+
+class Report:
+    """
+    Timings and size indicators of one repo
+    """
+
+    def __init__(self, name: str, prop: Dict[str, str]):
+        self.name = name
+        self.prop = prop
+        # check name -> seconds
+        self.timings: Dict[str, float] = {}
+        # index_entries, untracked, packs, loose, commits
+        self.stats: Dict[str, int] = {}
+        # git config key -> value, empty if unset
+        self.settings: Dict[str, str] = {}
+        self.has_commit_graph = False
+        # a bare repo has no worktree to speed up
+        self.is_bare = False
+
+    @property
+    def total(self) -> float:
+        return sum(self.timings.values())
+
+    @property
+    def dominant(self) -> str:
+        """
+        Return the check that takes the most time
+        """
+        return max(self.timings, key=self.timings.get)
+
+    def suggest(self) -> List[Suggestion]:
+        """
+        Return the git settings that would speed up the repo. They are only
+        suggested for the repos big enough to benefit.
+        """
+        git = ["git"] + self.prop["flags"]
+        suggestions = []
+        status_bound = self.dominant == "get_repo_status" and not self.is_bare
+        if (
+            status_bound
+            and self.stats["index_entries"] >= UNTRACKED_CACHE_MIN_ENTRIES
+            and not _is_true(self.settings["core.untrackedCache"])
+        ):
+            suggestions.append(
+                Suggestion(
+                    "remember which directories have no untracked files",
+                    [git + ["config", "core.untrackedCache", "true"]],
+                )
+            )
+        if (
+            status_bound
+            and sys.platform in FSMONITOR_PLATFORMS
+            and self.stats["index_entries"] >= FSMONITOR_MIN_ENTRIES
+            and not _is_true(self.settings["core.fsmonitor"])
+        ):
+            suggestions.append(
+                Suggestion(
+                    "let a file system monitor tell what changed",
+                    [git + ["config", "core.fsmonitor", "true"]],
+                )
+            )
+        if (
+            not self.has_commit_graph
+            and self.stats["commits"] >= COMMIT_GRAPH_MIN_COMMITS
+        ):
+            suggestions.append(
+                Suggestion(
+                    "speed up the ahead/behind counts with a commit-graph",
+                    [
+                        git + ["commit-graph", "write", "--reachable"],
+                        git + ["config", "fetch.writeCommitGraph", "true"],
+                    ],
+                )
+            )
+        return suggestions
+
+
+def _is_true(value: str) -> bool:
+    return value.lower() in ("true", "yes", "on", "1")
+
+
+def diagnose(repos: Dict[str, Dict[str, str]]) -> List[Report]:
+    """
+    Return the reports of `repos`, slowest first. The repos are checked one
+    at a time so that they don't slow each other down.
+    """
+    reports = []
+    for name, prop in repos.items():
+        report = Report(name, prop)
+        for check, func in CHECKS.items():
+            start = time.perf_counter()
+            func(prop)
+            report.timings[check] = time.perf_counter() - start
+        report.stats = get_repo_stats(prop)
+        report.settings = get_git_settings(prop)
+        report.has_commit_graph = has_commit_graph(prop["path"])
+        report.is_bare = _git(prop, ["rev-parse", "--is-bare-repository"]) == "true\n"
+        reports.append(report)
+    return sorted(reports, key=lambda r: r.total, reverse=True)
+
+
+def _git(prop: Dict[str, str], args: List[str]) -> str:
+    result = subprocess.run(
+        ["git"] + prop["flags"] + args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+        cwd=prop["path"],
+    )
+    return result.stdout
+
+
+def get_repo_stats(prop: Dict[str, str]) -> Dict[str, int]:
+    """
+    Return the numbers of index entries, untracked files, packs, loose
+    objects and commits of the repo.
+    """
+    objects = {}
+    for line in _git(prop, ["count-objects", "-v"]).splitlines():
+        key, _, value = line.partition(": ")
+        objects[key] = value
+    untracked = _git(prop, ["ls-files", "-zo", "--exclude-standard"])
+    commits = _git(prop, ["rev-list", "--count", "HEAD"]).strip()
+    return {
+        "index_entries": count_index_entries(prop["path"]),
+        "untracked": untracked.count("\0"),
+        "packs": int(objects.get("packs", 0)),
+        "loose": int(objects.get("count", 0)),
+        "commits": int(commits) if commits.isdigit() else 0,
+    }
+
+
+def count_index_entries(path: str) -> int:
+    """
+    Return the number of entries in the index, read from its header
+    """
+    git_dir = gitdir.find(path)
+    if git_dir is None:
+        return 0
+    try:
+        with open(git_dir / "index", "rb") as f:
+            header = f.read(12)
+    except OSError:
+        return 0
+    if len(header) < 12 or header[:4] != b"DIRC":
+        return 0
+    return struct.unpack(">I", header[8:])[0]
+
+
+def get_git_settings(prop: Dict[str, str]) -> Dict[str, str]:
+    """
+    Return the values of the git settings that `Report.suggest` looks at
+    """
+    return {
+        key: _git(prop, ["config", "--get", key]).strip()
+        for key in ("core.untrackedCache", "core.fsmonitor", "fetch.writeCommitGraph")
+    }
+
+
+def has_commit_graph(path: str) -> bool:
+    git_dir = gitdir.find(path)
+    if git_dir is None:
+        return False
+    objects_info = gitdir.get_common_dir(git_dir) / "objects" / "info"
+    return (objects_info / "commit-graph").is_file() or (
+        objects_info / "commit-graphs" / "commit-graph-chain"
+    ).is_file()
+
+
+def format_reports(reports: List[Report], top: int) -> Iterator[str]:
+    """
+    Generate the lines describing the `top` slowest repos
+    """
+    if not reports:
+        return
+    shown = reports[:top]
+    width = max([len("repo")] + [len(r.name) for r in shown]) + 1
+    yield f"The {len(shown)} slowest of {len(reports)} repos:"
+    yield (
+        f"{'repo':<{width}} {'total':>8}  {'dominant check':<22} "
+        f"{'entries':>8} {'untracked':>9} {'packs':>5} {'loose':>6} "
+        f"{'commits':>7}"
+    )
+    for r in shown:
+        share = r.timings[r.dominant] / r.total if r.total else 0
+        s = r.stats
+        yield (
+            f"{r.name:<{width}} {_ms(r.total):>8}  "
+            f"{f'{r.dominant} {share:.0%}':<22} "
+            f"{s['index_entries']:>8} {s['untracked']:>9} "
+            f"{s['packs']:>5} {s['loose']:>6} {s['commits']:>7}"
+        )
+        for check, seconds in r.timings.items():
+            yield f"    {check:<16} {_ms(seconds):>8}"
+        for suggestion in r.suggest():
+            yield f"    suggestion: {suggestion.reason}"
+            for cmd in suggestion.cmds:
+                yield f"        {' '.join(cmd)}"
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms"
+
+
+def apply(reports: List[Report]) -> Iterator[str]:
+    """
+    Run the suggested commands of `reports`, and generate what is done
+    """
+    for r in reports:
+        for suggestion in r.suggest():
+            for cmd in suggestion.cmds:
+                result = subprocess.run(
+                    cmd, cwd=r.prop["path"], stderr=subprocess.DEVNULL
+                )
+                status = "done" if result.returncode == 0 else "failed"
+                yield f"{r.name}: {' '.join(cmd)} ({status})"
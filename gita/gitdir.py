@@ -0,0 +1,293 @@
+"""
+Read repo information directly from the git directory, without spawning git.
+
+All functions return None if the answer cannot be determined from the files,
+e.g., for unusual layouts or configurations. The callers then fall back to
+running git in a subprocess.
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+PathLike = Union[str, os.PathLike]
+
+# Refs that live in the worktree's own git directory rather than the common one
+PER_WORKTREE_REFS = ("HEAD", "refs/bisect/", "refs/worktree/", "refs/rewritten/")
+
+
+def find(path: PathLike) -> Optional[Path]:
+    """
+    Return the git directory of the repo at `path`.
+
+    For regular repos it is `path/.git`. For worktrees and submodules, `.git`
+    is a file pointing to the git directory. A bare repo is its own git
+    directory.
+
+    Return None for the repos with the reftable ref storage, since their
+    refs are not in files, e.g., HEAD is `ref: refs/heads/.invalid`.
+    """
+    p = Path(path)
+    dot_git = p / ".git"
+    gitdir = None
+    try:
+        if dot_git.is_dir():
+            gitdir = dot_git
+        elif dot_git.is_file():
+            content = dot_git.read_text().strip()
+            if not content.startswith("gitdir:"):
+                return None
+            gitdir = Path(content[len("gitdir:") :].strip())
+            if not gitdir.is_absolute():
+                gitdir = p / gitdir
+            if not gitdir.is_dir():
+                return None
+        elif is_bare_layout(p):
+            gitdir = p
+        if gitdir and (get_common_dir(gitdir) / "reftable").is_dir():
+            return None
+    except OSError:
+        return None
+    return gitdir
+
+
+def is_bare_layout(path: PathLike) -> bool:
+    """
+    Return True if `path` looks like a git directory, i.e., it has HEAD,
+    objects/ and refs/.
+    """
+    p = Path(path)
+    return (p / "HEAD").is_file() and (p / "objects").is_dir() and (p / "refs").is_dir()
+
+
+def get_common_dir(gitdir: Path) -> Path:
+    """
+    Return the directory shared by all worktrees of the repo, where the
+    refs, config and objects are.
+    """
+    try:
+        common = (gitdir / "commondir").read_text().strip()
+    except OSError:
+        return gitdir
+    common = Path(common)
+    if not common.is_absolute():
+        common = gitdir / common
+    return common
+
+
+def read_head(gitdir: Path) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return the symbolic ref and the commit hash of HEAD. The ref is None if
+    HEAD is detached, and the hash is None if it is unknown, e.g., for a
+    branch without commits.
+    """
+    try:
+        content = (gitdir / "HEAD").read_text().strip()
+    except OSError:
+        return None, None
+    if content.startswith("ref:"):
+        ref = content[len("ref:") :].strip()
+        return ref, read_ref(gitdir, ref)
+    return None, content or None
+
+
+def read_ref(gitdir: Path, ref: str, depth: int = 5) -> Optional[str]:
+    """
+    Return the commit hash of `ref`, such as `refs/heads/main`, from the loose
+    ref files or `packed-refs`. Symbolic refs are followed.
+    """
+    if depth <= 0:
+        return None
+    is_local = ref == "HEAD" or ref.startswith(PER_WORKTREE_REFS)
+    base = gitdir if is_local else get_common_dir(gitdir)
+    try:
+        content = (base / ref).read_text().strip()
+    except OSError:
+        return get_packed_refs(base).get(ref)
+    if content.startswith("ref:"):
+        return read_ref(gitdir, content[len("ref:") :].strip(), depth - 1)
+    return content or None
+
+
+def get_packed_refs(common_dir: Path) -> Dict[str, str]:
+    """
+    Return ref name to commit hash in `packed-refs`
+    """
+    refs = {}
+    try:
+        with open(common_dir / "packed-refs") as f:
+            for line in f:
+                # `#` is the header, `^` is the peeled hash of the previous tag
+                if line.startswith(("#", "^")):
+                    continue
+                parts = line.split()
+                if len(parts) == 2:
+                    refs[parts[1]] = parts[0]
+    except OSError:
+        pass
+    return refs
+
+
+def get_branch(gitdir: Path) -> Optional[str]:
+    """
+    Return the current branch name, or None if HEAD is detached.
+    """
+    ref, _ = read_head(gitdir)
+    if ref and ref.startswith("refs/heads/"):
+        return ref[len("refs/heads/") :]
+    return None
+
+
+def has_stash(gitdir: Path) -> bool:
+    """
+    Return True if stashed content exists
+    """
+    common = get_common_dir(gitdir)
+    return (common / "logs" / "refs" / "stash").is_file() or bool(
+        read_ref(gitdir, "refs/stash")
+    )
+
+
+def read_config(gitdir: Path) -> Optional[List[Tuple[str, str]]]:
+    """
+    Return the (key, value) pairs of the repo config in file order, with
+    keys like `branch.main.remote`. Return None if the config includes other
+    files, since the answer may then be incomplete, or if the refs are not
+    stored in files.
+    """
+    try:
+        text = (get_common_dir(gitdir) / "config").read_text()
+    except OSError:
+        return []
+    entries = parse_config(text)
+    if any(k.startswith(("include.", "includeif.")) for k, _ in entries):
+        return None
+    if dict(entries).get("extensions.refstorage", "files").lower() != "files":
+        return None
+    return entries
+
+
+def get_upstream(gitdir: Path, branch: str) -> Optional[Tuple[str, str]]:
+    """
+    Return the remote name and the merge ref of the upstream of `branch`,
+    e.g., ("origin", "refs/heads/main"). Return ("", "") if there is no
+    upstream, and None if it cannot be determined.
+    """
+    config = read_config(gitdir)
+    if config is None:
+        return None
+    remote = merge = ""
+    for key, value in config:
+        if key == f"branch.{branch}.remote":
+            remote = value
+        elif key == f"branch.{branch}.merge":
+            merge = value
+    if not (remote and merge):
+        return "", ""
+    return remote, merge
+
+
+def get_upstream_ref(gitdir: Path, branch: str) -> Optional[str]:
+    """
+    Return the local ref tracking the upstream of `branch`, such as
+    `refs/remotes/origin/main`. Return "" if there is no upstream, and None
+    if it cannot be determined.
+    """
+    upstream = get_upstream(gitdir, branch)
+    if upstream is None:
+        return None
+    remote, merge = upstream
+    if not remote:
+        return ""
+    if remote == ".":  # the upstream is a local branch
+        return merge
+    if not merge.startswith("refs/heads/"):
+        return None
+    # assume the default refspec `+refs/heads/*:refs/remotes/<remote>/*`
+    return f"refs/remotes/{remote}/{merge[len('refs/heads/'):]}"
+
+
+def get_remote_url(gitdir: Path) -> Optional[str]:
+    """
+    Return the URL of the first remote as listed by `git remote -v`, "" if
+    there is no remote, and None if it cannot be determined.
+    """
+    config = read_config(gitdir)
+    if config is None:
+        return None
+    # `url.<base>.insteadOf` rewrites the URLs
+    if any(k.startswith("url.") for k, _ in config):
+        return None
+    for key, value in config:
+        if key.startswith("remote.") and key.endswith(".url"):
+            return value
+    return ""
+
+
+def parse_config(text: str) -> List[Tuple[str, str]]:
+    """
+    Parse the content of a git config file into (key, value) pairs.
+
+    Section and key names are lower-cased, subsection names are kept as is.
+    A key without value is a boolean true.
+    """
+    entries = []
+    section = ""
+    lines = iter(text.splitlines())
+    for line in lines:
+        line = line.strip()
+        if line.startswith("["):
+            end = line.find("]")
+            if end < 0:
+                continue
+            section = _parse_section(line[1:end])
+            line = line[end + 1 :].strip()
+        if not line or line.startswith(("#", ";")):
+            continue
+        name, sep, raw = line.partition("=")
+        name = name.strip().lower()
+        if not sep:
+            entries.append((f"{section}.{name}", "true"))
+            continue
+        # a trailing backslash continues the value on the next line
+        while raw.endswith("\\") and not raw.endswith("\\\\"):
+            raw = raw[:-1] + next(lines, "")
+        entries.append((f"{section}.{name}", _parse_value(raw)))
+    return entries
+
+
+def _parse_section(header: str) -> str:
+    """
+    Return the normalized section name of `[section "subsection"]` or the
+    deprecated `[section.subsection]`.
+    """
+    name, _, sub = header.strip().partition(" ")
+    sub = sub.strip()
+    if sub.startswith('"') and sub.endswith('"'):
+        sub = sub[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+        return f"{name.lower()}.{sub}"
+    return name.lower()
+
+
+def _parse_value(raw: str) -> str:
+    """
+    Return the config value with quotes, escapes and comments processed
+    """
+    escapes = {"n": "\n", "t": "\t", "b": "\b", '"': '"', "\\": "\\"}
+    chars = []
+    quoted = False
+    i = 0
+    raw = raw.strip()
+    while i < len(raw):
+        c = raw[i]
+        if c == '"':
+            quoted = not quoted
+        elif c == "\\" and i + 1 < len(raw):
+            i += 1
+            chars.append(escapes.get(raw[i], raw[i]))
+        elif c in "#;" and not quoted:
+            break
+        else:
+            chars.append(c)
+        i += 1
+    return "".join(chars).strip()
@@ -1,12 +1,18 @@
+import asyncio
 import csv
+import os
+import select
 import subprocess
+import time
 from enum import Enum
 from pathlib import Path
 from collections import namedtuple
-from functools import lru_cache, partial
-from typing import Tuple, List, Callable, Dict
+from contextvars import ContextVar, copy_context
+from functools import cached_property, lru_cache, partial
+from typing import Tuple, List, Callable, Dict, Iterable, Optional, Union
 
-from . import common
+from . import common, gitdir
+from .cache import StatusCache
 
 
 class Truncate:
@@ -112,15 +118,189 @@ def get_color_encoding() -> Dict[str, str]:
     return colors
 
 
-def get_info_funcs(no_colors=False) -> List[Callable[[str], str]]:
+class RepoSnapshot:
+    """
+    Information of one repo for the `gita ll` info items. Each piece is
+    computed lazily and at most once, so that the info items never repeat the
+    git work.
+
+    If `cache` is given, the information that only depends on the git
+    directory is reused from previous runs.
+    """
+
+    def __init__(self, prop: Dict[str, str], cache: Optional[StatusCache] = None):
+        self.prop = prop
+        self.cache = cache
+        # If True, the information could not be collected in time
+        self.timed_out = False
+
+    def __getitem__(self, key: str):
+        return self.prop[key]
+
+    @property
+    def path(self) -> str:
+        return self.prop["path"]
+
+    @cached_property
+    def status(self) -> "RepoStatus":
+        return get_status(self.prop, self.cache)
+
+    @cached_property
+    def head(self) -> str:
+        if "status" in self.__dict__:
+            return self.status.head
+        return get_head(self.path)
+
+    @cached_property
+    def last_commit(self) -> "Commit":
+        cached = self.cache and self.cache.get(self.path, "last_commit")
+        if cached is not None:
+            return Commit(*cached)
+        return self._last_commit_from(*run_git(self._last_commit_cmd(), self.path))
+
+    @property
+    def commit_msg(self) -> str:
+        return self.last_commit.subject
+
+    @property
+    def commit_time(self) -> str:
+        # Not cached since the relative time changes
+        timestamp = self.last_commit.time
+        return "" if timestamp is None else get_relative_time(timestamp)
+
+    def _last_commit_cmd(self) -> List[str]:
+        return ["git"] + self.prop["flags"] + ["log", "-1", "--format=%H%x00%ct%x00%s"]
+
+    def _last_commit_from(self, returncode: int, stdout: str) -> "Commit":
+        fields = stdout.rstrip("\n").split("\0")
+        if returncode != 0 or len(fields) != 3:  # no commits yet
+            return Commit("", None, "")
+        commit = Commit(fields[0], int(fields[1]), fields[2])
+        if self.cache:
+            self.cache.put(self.path, last_commit=list(commit))
+        return commit
+
+    async def prefetch(self, items: Iterable[str], deadline: Optional[float] = None):
+        """
+        Compute what the info `items` need with concurrent git processes, so
+        that accessing it later doesn't block. Anything else is still computed
+        on access.
+
+        If it is not done by the `deadline` in `time.monotonic()` time, the
+        git processes are killed and `timed_out` is set.
+        """
+        token = _deadline.set(deadline)
+        todo = []
+        if "branch" in items or "ahead_behind" in items:
+            todo.append(self._prefetch_status())
+        if "commit_msg" in items or "commit_time" in items:
+            todo.append(self._prefetch_last_commit())
+        # the tasks see the deadline set above
+        tasks = [asyncio.ensure_future(c) for c in todo]
+        _deadline.reset(token)
+        try:
+            if deadline is None:
+                await asyncio.gather(*tasks)
+            else:
+                timeout = deadline - time.monotonic()
+                await asyncio.wait_for(asyncio.gather(*tasks), timeout)
+        except (asyncio.TimeoutError, subprocess.TimeoutExpired):
+            self.timed_out = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _prefetch_status(self):
+        cmd, cached = _status_cmd(self.prop, self.cache)
+        todo = [run_git_async(cmd, self.path)]
+        if not cached:
+            todo.append(has_stashed_async(self.prop["flags"], self.path))
+        result, *stashed = await asyncio.gather(*todo)
+        # The fallbacks of `_status_from` run git synchronously, so it runs in
+        # a thread to not block the other repos. The context carries the
+        # deadline to the git processes there.
+        status_from = partial(
+            copy_context().run,
+            _status_from,
+            self.prop,
+            self.cache,
+            cached,
+            *result,
+            untracked=_get_untracked(self.prop),
+            stashed=_stashed(*stashed),
+        )
+        loop = asyncio.get_running_loop()
+        self.__dict__["status"] = await loop.run_in_executor(None, status_from)
+
+    async def _prefetch_last_commit(self):
+        cached = self.cache and self.cache.get(self.path, "last_commit")
+        if cached is not None:
+            commit = Commit(*cached)
+        else:
+            result = await run_git_async(self._last_commit_cmd(), self.path)
+            commit = self._last_commit_from(*result)
+        self.__dict__["last_commit"] = commit
+
+
+Commit = namedtuple("Commit", ["sha", "time", "subject"])
+
+
+def get_relative_time(timestamp: int, now: Optional[float] = None) -> str:
+    """
+    Return the time since `timestamp` in the words of `git log --date=relative`
+    """
+    diff = int((time.time() if now is None else now) - timestamp)
+    if diff < 0:
+        return "in the future"
+    if diff < 90:
+        return _ago(diff, "second")
+    diff = (diff + 30) // 60
+    if diff < 90:
+        return _ago(diff, "minute")
+    diff = (diff + 30) // 60
+    if diff < 36:
+        return _ago(diff, "hour")
+    # days from here on
+    diff = (diff + 12) // 24
+    if diff < 14:
+        return _ago(diff, "day")
+    if diff < 70:
+        return _ago((diff + 3) // 7, "week")
+    if diff < 365:
+        return _ago((diff + 15) // 30, "month")
+    if diff < 1825:
+        total_months = (diff * 12 * 2 + 365) // (365 * 2)
+        years, months = divmod(total_months, 12)
+        if months:
+            return f"{_plural(years, 'year')}, {_ago(months, 'month')}"
+        return _ago(years, "year")
+    return _ago((diff + 183) // 365, "year")
+
+
+def _plural(n: int, unit: str) -> str:
+    return f"{n} {unit}" if n == 1 else f"{n} {unit}s"
+
+
+def _ago(n: int, unit: str) -> str:
+    return f"{_plural(n, unit)} ago"
+
+
+def _snapshot(prop: Union[Dict[str, str], RepoSnapshot]) -> RepoSnapshot:
+    if isinstance(prop, RepoSnapshot):
+        return prop
+    return RepoSnapshot(prop)
+
+
+def get_info_funcs(no_colors=False) -> List[Callable[[RepoSnapshot, Truncate], str]]:
     """
     Return the functions to generate `gita ll` information. All these functions
-    take the repo path as input and return the corresponding information as str.
-    See `get_path`, `get_repo_status`, `get_common_commit` for examples.
+    take the repo snapshot as input and return the corresponding information as str.
+    See `get_path`, `get_repo_status`, `get_ahead_behind` for examples.
     """
     to_display = get_info_items()
     # This re-definition is to make unit test mocking to work
     all_info_items = {
+        "ahead_behind": get_ahead_behind,
         "branch": partial(get_repo_status, no_colors=no_colors),
         "branch_name": get_repo_branch,
         "commit_msg": get_commit_msg,
@@ -151,8 +331,17 @@ def get_path(prop: Dict[str, str], truncator: Truncate) -> str:
     return f'{Color.cyan}{truncator.truncate("path", prop["path"])}{Color.end}'
 
 
-# TODO: do we need to add the flags here too?
 def get_head(path: str) -> str:
+    """
+    Return the branch name, or the tag name if HEAD is detached.
+    """
+    git_dir = gitdir.find(path)
+    if git_dir:
+        branch = gitdir.get_branch(git_dir)
+        if branch is not None:
+            return branch
+    # detached HEAD or unusual layout
+    # TODO: do we need to add the flags here too?
     result = subprocess.run(
         "git symbolic-ref -q --short HEAD || git describe --tags --exact-match",
         shell=True,
@@ -160,10 +349,62 @@ def get_head(path: str) -> str:
         stderr=subprocess.DEVNULL,
         universal_newlines=True,
         cwd=path,
+        timeout=_get_timeout(),
     )
     return result.stdout.strip()
 
 
+# The `time.monotonic()` time by which the git processes of the repo being
+# prefetched have to finish, see `RepoSnapshot.prefetch`
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def _get_timeout() -> Optional[float]:
+    """
+    Return the seconds left until the deadline, or None if there is none.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0)
+
+
+def run_git(cmd: List[str], path: str) -> Tuple[int, str]:
+    """
+    Run `cmd` in `path`, and return the return code and the stdout
+    """
+    result = subprocess.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+        cwd=path,
+        timeout=_get_timeout(),
+    )
+    return result.returncode, result.stdout
+
+
+async def run_git_async(cmd: List[str], path: str) -> Tuple[int, str]:
+    """
+    Asynchronous version of `run_git`
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        cwd=path,
+    )
+    try:
+        stdout, _ = await process.communicate()
+    except asyncio.CancelledError:  # e.g., timed out
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+        raise
+    return process.returncode, stdout.decode(errors="replace")
+
+
 def run_quiet_diff(flags: List[str], args: List[str], path) -> int:
     """
     Return the return code of git diff `args` in quiet mode
@@ -172,81 +413,160 @@ def run_quiet_diff(flags: List[str], args: List[str], path) -> int:
         ["git"] + flags + ["diff", "--quiet"] + args,
         stderr=subprocess.DEVNULL,
         cwd=path,
+        timeout=_get_timeout(),
     )
     return result.returncode
 
 
-def get_common_commit(path) -> str:
+def has_untracked(flags: List[str], path) -> bool:
     """
-    Return the hash of the common commit of the local and upstream branches.
+    Return True if untracked file/folder exists
+
+    Only the first entry is read, and git is stopped right after.
     """
-    result = subprocess.run(
-        "git merge-base @{0} @{u}".split(),
+    with subprocess.Popen(
+        _untracked_cmd(flags),
         stdout=subprocess.PIPE,
-        universal_newlines=True,
+        stderr=subprocess.DEVNULL,
         cwd=path,
+    ) as process:
+        timeout = _get_timeout()
+        if timeout is not None and os.name == "posix":
+            ready, _, _ = select.select([process.stdout], [], [], timeout)
+            if not ready:
+                process.kill()
+                raise subprocess.TimeoutExpired(process.args, timeout)
+        found = bool(process.stdout.read(1))
+        if process.poll() is None:
+            process.kill()
+    return found
+
+
+def _untracked_cmd(flags: List[str]) -> List[str]:
+    # Untracked folders are listed as one entry without their content
+    return (
+        ["git"]
+        + flags
+        + "ls-files -zo --exclude-standard --directory --no-empty-directory".split()
     )
-    return result.stdout.strip()
 
 
-def has_untracked(flags: List[str], path) -> bool:
+def get_untracked_policy(prop: Dict[str, str]) -> str:
     """
-    Return True if untracked file/folder exists
+    Return how untracked files are detected for the repo, see
+    `UNTRACKED_POLICIES`.
     """
-    cmd = ["git"] + flags + "ls-files -zo --exclude-standard".split()
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, cwd=path)
-    return bool(result.stdout)
+    policy = prop.get("untracked")
+    return policy if policy in UNTRACKED_POLICIES else "full"
+
+
+def _get_untracked(prop: Dict[str, str]) -> Optional[str]:
+    """
+    Return the untracked status if `git status` is not to report it, i.e.,
+    unless the policy is `full`.
+    """
+    if get_untracked_policy(prop) == "off":
+        return "untracked_unknown"
+    return None
 
 
 def has_stashed(flags: List[str], path) -> bool:
     """
     Return True if stashed content exists
     """
-    # FIXME: this doesn't work for repos like worktrees, bare, etc
-    p = Path(path) / ".git" / "logs" / "refs" / "stash"
-    got = False
-    try:
-        got = p.is_file()
-    except Exception:
-        pass
-    return got
+    git_dir = gitdir.find(path)
+    if git_dir:
+        return gitdir.has_stash(git_dir)
+    result = subprocess.run(
+        ["git"] + flags + "rev-parse --verify --quiet refs/stash".split(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        cwd=path,
+        timeout=_get_timeout(),
+    )
+    return result.returncode == 0
+
+
+async def has_stashed_async(flags: List[str], path) -> bool:
+    """
+    Asynchronous version of `has_stashed`
+    """
+    git_dir = gitdir.find(path)
+    if git_dir:
+        return gitdir.has_stash(git_dir)
+    cmd = ["git"] + flags + "rev-parse --verify --quiet refs/stash".split()
+    returncode, _ = await run_git_async(cmd, path)
+    return returncode == 0
+
+
+def _stashed(found: Optional[bool] = None) -> Optional[str]:
+    return None if found is None else ("stashed" if found else "")
+
+
+def get_timed_out(no_colors: bool = False) -> str:
+    """
+    Return the marker displayed in place of the info items of a repo that
+    timed out.
+    """
+    if no_colors:
+        return "(timed out)"
+    return f"{Color.red}(timed out){Color.end}"
+
+
+def get_record(name: str, snap: RepoSnapshot) -> Dict:
+    """
+    Return the status of a repo as a JSON serializable dict, without colors,
+    symbols or truncation. `untracked` is None if it is not checked, and the
+    git information is None if the repo timed out.
+    """
+    record = {"name": name, "path": snap.path, "timed_out": snap.timed_out}
+    if snap.timed_out:
+        status = RepoStatus(*[None] * len(RepoStatus._fields))
+        commit = Commit(None, None, None)
+        untracked = None
+    else:
+        status = snap.status
+        commit = snap.last_commit
+        untracked = {"untracked": True, "": False}.get(status.untracked)
+    record.update(
+        branch=status.head,
+        dirty=_flag(status.dirty),
+        staged=_flag(status.staged),
+        untracked=untracked,
+        stashed=_flag(status.stashed),
+        situation=status.situ,
+        ahead=status.ahead,
+        behind=status.behind,
+        commit_sha=commit.sha or None,
+        commit_subject=commit.subject,
+        commit_time=commit.time,
+    )
+    return record
+
+
+def _flag(value: Optional[str]) -> Optional[bool]:
+    return None if value is None else bool(value)
 
 
 def get_commit_msg(prop: Dict[str, str], truncator: Truncate) -> str:
     """
     Return the last commit message.
     """
-    # `git show-branch --no-name HEAD` is faster than `git show -s --format=%s`
-    cmd = ["git"] + prop["flags"] + "show-branch --no-name HEAD".split()
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL,
-        universal_newlines=True,
-        cwd=prop["path"],
-    )
-    return truncator.truncate("commit_msg", result.stdout.strip())
+    return truncator.truncate("commit_msg", _snapshot(prop).commit_msg)
 
 
 def get_commit_time(prop: Dict[str, str], truncator: Truncate) -> str:
     """
     Return the last commit time in parenthesis.
     """
-    cmd = ["git"] + prop["flags"] + "log -1 --format=%cd --date=relative".split()
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL,
-        universal_newlines=True,
-        cwd=prop["path"],
-    )
-    return truncator.truncate("commit_time", f"({result.stdout.strip()})")
+    return truncator.truncate("commit_time", f"({_snapshot(prop).commit_time})")
 
 
 default_symbols = {
     "dirty": "*",
     "staged": "+",
     "untracked": "?",
+    "untracked_unknown": "~",
     "stashed": "$",
     "local_ahead": "↑",
     "remote_ahead": "↓",
@@ -273,8 +593,8 @@ def get_symbols() -> Dict[str, str]:
 
 
 def get_repo_status(prop: Dict[str, str], truncator: Truncate, no_colors=False) -> str:
-    branch = truncator.truncate("branch", get_head(prop["path"]))
-    dirty, staged, untracked, stashed, situ = _get_repo_status(prop)
+    head, dirty, staged, untracked, stashed, situ = _snapshot(prop).status[:6]
+    branch = truncator.truncate("branch", head)
     symbols = get_symbols()
     info = f"{branch:<10} {truncator.truncate('symbols', f'[{symbols[dirty]}{symbols[staged]}{symbols[stashed]}{symbols[untracked]}{symbols[situ]}]')}"
 
@@ -286,37 +606,297 @@ def get_repo_status(prop: Dict[str, str], truncator: Truncate, no_colors=False)
 
 
 def get_repo_branch(prop: Dict[str, str], truncator: Truncate) -> str:
-    return truncator.truncate("branch_name", get_head(prop["path"]))
+    return truncator.truncate("branch_name", _snapshot(prop).head)
+
+
+def get_ahead_behind(prop: Dict[str, str], truncator: Truncate) -> str:
+    """
+    Return how many commits the local branch is ahead of and behind its
+    upstream, e.g., `↑2 ↓3`. It is empty if they are in sync or if there is
+    no upstream.
+    """
+    status = _snapshot(prop).status
+    symbols = get_symbols()
+    counts = []
+    if status.ahead:
+        counts.append(f"{symbols['local_ahead']}{status.ahead}")
+    if status.behind:
+        counts.append(f"{symbols['remote_ahead']}{status.behind}")
+    return truncator.truncate("ahead_behind", " ".join(counts))
+
+
+# `ahead` and `behind` are the numbers of commits only in HEAD and only in
+# the upstream branch
+RepoStatus = namedtuple(
+    "RepoStatus",
+    ["head", "dirty", "staged", "untracked", "stashed", "situ", "ahead", "behind"],
+    defaults=(0, 0),
+)
+
+
+def get_status(prop: Dict[str, str], cache: Optional[StatusCache] = None) -> RepoStatus:
+    """
+    Return the status of one repo from a single `git status` call.
+
+    Fall back to the one-check-per-process `_get_repo_status` if git cannot
+    produce the porcelain v2 output, which needs git 2.11. The stash is read
+    from the git directory, since the `# stash` line of `--show-stash` needs
+    git 2.35, and older versions silently leave it out.
+
+    With a `cache` hit, the branch, stash and local/remote relation are
+    reused, and `git status` skips the ahead/behind computation.
+    """
+    cmd, cached = _status_cmd(prop, cache)
+    result = run_git(cmd, prop["path"])
+    stashed = None if cached else has_stashed(prop["flags"], prop["path"])
+    return _status_from(
+        prop,
+        cache,
+        cached,
+        *result,
+        untracked=_get_untracked(prop),
+        stashed=_stashed(stashed),
+    )
 
 
-def _get_repo_status(prop: Dict[str, str]) -> Tuple[str, str, str, str, str]:
+def _status_cmd(
+    prop: Dict[str, str], cache: Optional[StatusCache]
+) -> Tuple[List[str], Optional[List[str]]]:
+    """
+    Return the `git status` command and the cached part of the status
     """
-    Return the status of one repo
+    cached = cache and cache.get(prop["path"], "refs_status")
+    cmd = ["git", "--no-optional-locks"] + prop["flags"] + ["status", "--porcelain=v2"]
+    if not cached:
+        cmd.append("--branch")
+    if get_untracked_policy(prop) != "full":
+        cmd.append("--untracked-files=no")
+    return cmd, cached
+
+
+def _status_from(
+    prop: Dict[str, str],
+    cache: Optional[StatusCache],
+    cached: Optional[List[str]],
+    returncode: int,
+    stdout: str,
+    untracked: Optional[str] = None,
+    stashed: Optional[str] = None,
+) -> RepoStatus:
+    """
+    Return the status given the result of the `_status_cmd` command, and the
+    `untracked` and `stashed` status if they are not from `git status`.
+    """
+    path = prop["path"]
+    if returncode != 0:
+        return RepoStatus(get_head(path), *_get_repo_status(prop))
+    status = parse_porcelain_status(stdout)
+    if untracked is not None:
+        status = status._replace(untracked=untracked)
+    if stashed is not None:
+        status = status._replace(stashed=stashed)
+    if cached:
+        head, stashed, situ, ahead, behind = cached
+        return status._replace(
+            head=head, stashed=stashed, situ=situ, ahead=ahead, behind=behind
+        )
+    if status.head is None:  # detached HEAD: show the tag if there is one
+        status = status._replace(head=get_head(path))
+    if cache:
+        cache.put(
+            path,
+            refs_status=[
+                status.head,
+                status.stashed,
+                status.situ,
+                status.ahead,
+                status.behind,
+            ],
+        )
+    return status
+
+
+def parse_porcelain_status(output: str) -> RepoStatus:
+    """
+    Parse the output of `git status --porcelain=v2 --branch`, and the
+    `# stash` line of `--show-stash` if it is there.
+
+    The head is None if it is detached.
+    """
+    head = None
+    dirty = staged = untracked = stashed = ""
+    situ = "no_remote"
+    ahead = behind = 0
+    for line in output.splitlines():
+        if line.startswith("# branch.head "):
+            name = line[len("# branch.head ") :]
+            if name != "(detached)":
+                head = name
+        elif line.startswith("# branch.ab "):
+            # e.g., `# branch.ab +2 -3`
+            ahead, behind = (abs(int(n)) for n in line.split()[2:4])
+            situ = get_situation(ahead, behind)
+        elif line.startswith("# stash "):
+            stashed = "stashed"
+        elif line.startswith("? "):
+            untracked = "untracked"
+        elif line.startswith("u "):  # unmerged
+            dirty, staged = "dirty", "staged"
+        elif line[:2] in ("1 ", "2 "):
+            # the XY field: X is the index status, Y is the worktree status
+            if line[2] != ".":
+                staged = "staged"
+            if line[3] != ".":
+                dirty = "dirty"
+    return RepoStatus(head, dirty, staged, untracked, stashed, situ, ahead, behind)
+
+
+def get_situation(ahead: int, behind: int) -> str:
+    """
+    Return the local/remote relation given the ahead/behind counts
+    """
+    if ahead and behind:
+        return "diverged"
+    if ahead:
+        return "local_ahead"
+    if behind:
+        return "remote_ahead"
+    return "in_sync"
+
+
+def _get_repo_status(prop: Dict[str, str]) -> Tuple[str, str, str, str, str, int, int]:
+    """
+    Return the status of one repo, one git process per check
     """
     path = prop["path"]
     flags = prop["flags"]
     dirty = "dirty" if run_quiet_diff(flags, [], path) else ""
     staged = "staged" if run_quiet_diff(flags, ["--cached"], path) else ""
-    untracked = "untracked" if has_untracked(flags, path) else ""
+    untracked = _get_untracked(prop)
+    if untracked is None:
+        untracked = "untracked" if has_untracked(flags, path) else ""
     stashed = "stashed" if has_stashed(flags, path) else ""
 
-    diff_returncode = run_quiet_diff(flags, ["@{u}", "@{0}"], path)
-    if diff_returncode == 128:
-        situ = "no_remote"
-    elif diff_returncode == 0:
-        situ = "in_sync"
-    else:
-        common_commit = get_common_commit(path)
-        outdated = run_quiet_diff(flags, ["@{u}", common_commit], path)
-        if outdated:
-            diverged = run_quiet_diff(flags, ["@{0}", common_commit], path)
-            situ = "diverged" if diverged else "remote_ahead"
-        else:  # local is ahead of remote
-            situ = "local_ahead"
-    return dirty, staged, untracked, stashed, situ
+    counts = get_ahead_behind_counts(flags, path)
+    if counts is None:
+        return dirty, staged, untracked, stashed, "no_remote", 0, 0
+    return dirty, staged, untracked, stashed, get_situation(*counts), *counts
+
+
+def get_ahead_behind_counts(flags: List[str], path) -> Optional[Tuple[int, int]]:
+    """
+    Return the numbers of commits only in HEAD and only in the upstream
+    branch, or None if there is no upstream.
+    """
+    returncode, stdout = run_git(
+        ["git"] + flags + "rev-list --left-right --count @{u}...HEAD".split(), path
+    )
+    if returncode != 0:
+        return None
+    behind, ahead = (int(n) for n in stdout.split())
+    return ahead, behind
+
+
+# The repo states that `--only` selects, and the local/remote relations that
+# stand for them. A repo is selected if it is in any of the chosen states.
+ONLY_STATES = ("dirty", "ahead", "behind", "diverged", "no-remote", "stashed")
+_ONLY_SITUATIONS = {
+    "ahead": "local_ahead",
+    "behind": "remote_ahead",
+    "diverged": "diverged",
+    "no-remote": "no_remote",
+}
+
+
+async def is_in_states(
+    prop: Dict[str, str], states: Iterable[str], cache: Optional[StatusCache] = None
+) -> bool:
+    """
+    Return True if the repo is in any of the `ONLY_STATES` in `states`.
+
+    The cheapest checks come first. The stash and most local/remote relations
+    are read from the git directory or the `cache`, and git is only spawned
+    for what is left. Nothing touches the network, so the relation is with
+    the remote branches as of the last fetch.
+    """
+    states = set(states)
+    path = prop["path"]
+    if "stashed" in states and await has_stashed_async(prop["flags"], path):
+        return True
+    situations = {_ONLY_SITUATIONS[s] for s in states if s in _ONLY_SITUATIONS}
+    if situations and await get_situation_async(prop, cache) in situations:
+        return True
+    if "dirty" in states:
+        return await has_changes_async(prop["flags"], path)
+    return False
+
+
+def read_situation(path: str) -> Optional[str]:
+    """
+    Return the local/remote relation if the git directory tells it, i.e.,
+    there is no upstream, or the upstream is at HEAD. Otherwise return None.
+    """
+    git_dir = gitdir.find(path)
+    if git_dir is None:
+        return None
+    ref, head = gitdir.read_head(git_dir)
+    if ref is None:  # detached HEAD has no upstream
+        return "no_remote"
+    if not ref.startswith("refs/heads/"):
+        return None
+    upstream = gitdir.get_upstream_ref(git_dir, ref[len("refs/heads/") :])
+    if upstream is None:
+        return None
+    if not upstream:
+        return "no_remote"
+    if head and gitdir.read_ref(git_dir, upstream) == head:
+        return "in_sync"
+    return None
+
+
+async def get_situation_async(
+    prop: Dict[str, str], cache: Optional[StatusCache] = None
+) -> str:
+    """
+    Return the local/remote relation of the repo from the git directory, or
+    the `cache`, or else `git rev-list`
+    """
+    path = prop["path"]
+    situ = read_situation(path)
+    if situ is None and cache:
+        cached = cache.get(path, "refs_status")
+        if cached:
+            situ = cached[2]
+    if situ is None:
+        returncode, stdout = await run_git_async(
+            ["git"]
+            + prop["flags"]
+            + "rev-list --left-right --count @{u}...HEAD".split(),
+            path,
+        )
+        if returncode != 0:
+            return "no_remote"
+        behind, ahead = (int(n) for n in stdout.split())
+        situ = get_situation(ahead, behind)
+    return situ
+
+
+async def has_changes_async(flags: List[str], path) -> bool:
+    """
+    Return True if the tracked files have staged or unstaged changes
+    """
+    cmd = ["git", "--no-optional-locks"] + flags
+    cmd += ["status", "--porcelain", "--untracked-files=no"]
+    returncode, stdout = await run_git_async(cmd, path)
+    return returncode == 0 and bool(stdout)
+
 
+# How untracked files are detected: `full` lets `git status` list them, and
+# `off` skips the check.
+UNTRACKED_POLICIES = ("full", "off")
 
 ALL_INFO_ITEMS = {
+    "ahead_behind",
     "branch",
     "branch_name",
     "commit_msg",
@@ -0,0 +1,204 @@
+"""
+Record the processes that gita spawns, see `gita --profile`.
+
+`subprocess.Popen`, which `subprocess.run` goes through, and
+`asyncio.create_subprocess_exec` are wrapped while profiling is enabled. Each
+process is recorded with its argv, working directory, wall time from spawn to
+exit, return code, and the bytes of output collected by `communicate`.
+"""
+
+import asyncio
+import math
+import os
+import shlex
+import subprocess
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+# Number of the slowest repos in the summary
+TOP_REPOS = 10
+
+# git options that take the next argument as their value
+_GIT_OPTIONS_WITH_VALUE = {"-c", "-C", "--git-dir", "--work-tree", "--namespace"}
+
+
+class Spawn:
+    """
+    One spawned process. `seconds` and `returncode` stay None until it is
+    waited for, and `nbytes` unless its output is collected by `communicate`.
+    """
+
+    def __init__(self, argv: Union[str, Sequence[str]], cwd: Optional[str]):
+        self.argv = argv
+        self.cwd = None if cwd is None else os.fspath(cwd)
+        self.start = time.perf_counter()
+        self.seconds: Optional[float] = None
+        self.returncode: Optional[int] = None
+        self.nbytes: Optional[int] = None
+
+    def finish(self, returncode: int):
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self.start
+            self.returncode = returncode
+
+    def count_output(self, *outputs):
+        self.nbytes = sum(
+            len(out.encode() if isinstance(out, str) else out) for out in outputs if out
+        )
+
+    @property
+    def command(self) -> str:
+        return get_command_type(self.argv)
+
+
+_spawns: List[Spawn] = []
+# True while asyncio spawns a process, which is recorded by
+# `_create_subprocess_exec` rather than by `_Popen`
+_in_asyncio: ContextVar[bool] = ContextVar("in_asyncio", default=False)
+_originals = {}
+
+
+class _Popen(subprocess.Popen):
+    def __init__(self, args, *rest, **kwargs):
+        self._spawn = None if _in_asyncio.get() else Spawn(args, kwargs.get("cwd"))
+        super().__init__(args, *rest, **kwargs)
+        if self._spawn:
+            _spawns.append(self._spawn)
+
+    def communicate(self, *args, **kwargs):
+        stdout, stderr = super().communicate(*args, **kwargs)
+        if self._spawn:
+            self._spawn.count_output(stdout, stderr)
+        return stdout, stderr
+
+    def wait(self, *args, **kwargs):
+        returncode = super().wait(*args, **kwargs)
+        if self._spawn:
+            self._spawn.finish(returncode)
+        return returncode
+
+
+async def _create_subprocess_exec(program, *args, **kwargs):
+    spawn = Spawn([program, *args], kwargs.get("cwd"))
+    token = _in_asyncio.set(True)
+    try:
+        process = await _originals["create_subprocess_exec"](program, *args, **kwargs)
+    finally:
+        _in_asyncio.reset(token)
+    _spawns.append(spawn)
+    wait = process.wait
+    communicate = process.communicate
+
+    async def timed_wait():
+        returncode = await wait()
+        spawn.finish(returncode)
+        return returncode
+
+    async def counted_communicate(*args, **kwargs):
+        stdout, stderr = await communicate(*args, **kwargs)
+        spawn.count_output(stdout, stderr)
+        return stdout, stderr
+
+    # `communicate` waits through the instance attribute too
+    process.wait = timed_wait
+    process.communicate = counted_communicate
+    return process
+
+
+def enable():
+    """
+    Start recording the spawned processes
+    """
+    if _originals:
+        return
+    _originals["Popen"] = subprocess.Popen
+    _originals["create_subprocess_exec"] = asyncio.create_subprocess_exec
+    subprocess.Popen = _Popen
+    asyncio.create_subprocess_exec = _create_subprocess_exec
+
+
+def disable():
+    """
+    Stop recording, and return the recorded processes
+    """
+    if _originals:
+        subprocess.Popen = _originals.pop("Popen")
+        asyncio.create_subprocess_exec = _originals.pop("create_subprocess_exec")
+    spawns = list(_spawns)
+    _spawns.clear()
+    return spawns
+
+
+def get_command_type(argv: Union[str, Sequence[str]]) -> str:
+    """
+    Return the program and, for git, its sub-command, e.g., `git status`.
+    A shell command line is split first.
+    """
+    if isinstance(argv, str):
+        argv = shlex.split(argv)
+    if not argv:
+        return ""
+    program = os.path.basename(os.fspath(argv[0]))
+    if program != "git":
+        return program
+    i = 1
+    while i < len(argv) and argv[i].startswith("-"):
+        i += 2 if argv[i] in _GIT_OPTIONS_WITH_VALUE else 1
+    return f"git {argv[i]}" if i < len(argv) else "git"
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Return the `p` percentile of the sorted `values` by the nearest rank
+    """
+    return values[max(math.ceil(p * len(values)) - 1, 0)]
+
+
+def summarize(
+    spawns: List[Spawn], repos: Dict[str, str], top: int = TOP_REPOS
+) -> Iterator[str]:
+    """
+    Generate the summary lines of `spawns`: the latencies by command type,
+    and the `top` repos that spent the most time in processes.
+
+    @param repos: repo path -> repo name, for naming the working directories
+    """
+    seconds = defaultdict(list)
+    nbytes = defaultdict(int)
+    by_repo = defaultdict(list)
+    for s in spawns:
+        if s.seconds is not None:
+            seconds[s.command].append(s.seconds)
+            by_repo[repos.get(s.cwd, s.cwd or os.getcwd())].append(s.seconds)
+        nbytes[s.command] += s.nbytes or 0
+    total = sum(sum(v) for v in seconds.values())
+    yield f"{_processes(len(spawns))} spawned, {_ms(total)} in total"
+    if not seconds:
+        return
+    width = max([len("command")] + [len(c) for c in seconds]) + 1
+    yield (
+        f"{'command':<{width}} {'count':>6} {'total':>10} {'p50':>10} "
+        f"{'p95':>10} {'max':>10} {'bytes':>10}"
+    )
+    for command, values in sorted(seconds.items(), key=lambda kv: -sum(kv[1])):
+        values.sort()
+        yield (
+            f"{command:<{width}} {len(values):>6} {_ms(sum(values)):>10} "
+            f"{_ms(percentile(values, 0.5)):>10} {_ms(percentile(values, 0.95)):>10} "
+            f"{_ms(values[-1]):>10} {nbytes[command]:>10}"
+        )
+    slowest = sorted(by_repo.items(), key=lambda kv: -sum(kv[1]))[:top]
+    yield f"The {len(slowest)} slowest repos:"
+    width = max(len(r) for r, _ in slowest) + 1
+    for repo, values in slowest:
+        yield f"{repo:<{width}} {_ms(sum(values)):>10} in {_processes(len(values))}"
+
+
+def _processes(n: int) -> str:
+    return f"{n} process" if n == 1 else f"{n} processes"
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms"
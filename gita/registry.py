@@ -0,0 +1,172 @@
+"""
+Compiled snapshot of the registry, i.e., the repos in repos.csv, the groups in
+groups.csv, and the delegated commands of the default and custom cmds.json.
+
+The text files stay the source of truth, unless the SQLite backend of
+`registry_db` replaces the CSV files. Their parsed content is saved with
+`marshal` in one file of the config directory, and reused as long as the
+mtimes and sizes of the text files are unchanged, which saves the parsing on
+every invocation.
+"""
+
+import csv
+import json
+import marshal
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import common, registry_db
+from .cache import write_atomic
+
+SNAPSHOT_FNAME = "registry.snapshot"
+SNAPSHOT_VERSION = 1
+# A source file modified this recently may be modified again within the
+# granularity of its mtime, which the fingerprint cannot tell apart
+RACY_SECONDS = 2
+
+
+def get_sources() -> Tuple[str, str, str, str]:
+    """
+    Return the file names of repos.csv, groups.csv, and the custom and default
+    cmds.json
+    """
+    return (
+        common.get_config_fname("repos.csv"),
+        common.get_config_fname("groups.csv"),
+        os.path.join(common.get_config_dir(), "cmds.json"),
+        os.path.join(os.path.dirname(__file__), "cmds.json"),
+    )
+
+
+def get_fingerprint(sources: Tuple[str, ...]) -> List[Optional[Tuple]]:
+    """
+    Return the name, mtime and size of the `sources`, None for a missing one
+    """
+    fingerprint = []
+    for fname in sources:
+        try:
+            st = os.stat(fname)
+        except OSError:
+            fingerprint.append(None)
+        else:
+            fingerprint.append((os.fspath(fname), st.st_mtime_ns, st.st_size))
+    return fingerprint
+
+
+def load() -> Dict[str, Any]:
+    """
+    Return the parsed registry, from the snapshot if it is up to date:
+
+    - repos: list of (path, name, type, flags, untracked policy) of repos.csv
+    - groups: list of (name, repo names, path) of groups.csv
+    - cmds: the merged delegated commands
+
+    The content is new on every call, and can be modified by the caller.
+    """
+    sources = get_sources()
+    if registry_db.is_enabled():  # only the commands are parsed
+        sources = ("", "") + sources[2:]
+    fingerprint = get_fingerprint(sources)
+    fname = common.get_config_fname(SNAPSHOT_FNAME)
+    # the file names may all be the same when redirected, e.g., in tests
+    cacheable = fname not in sources
+    if cacheable:
+        snapshot = _read(fname)
+        if snapshot.get("fingerprint") == fingerprint:
+            return snapshot["registry"]
+    registry = compile_registry(*sources)
+    now = time.time_ns()
+    racy = any(f and now - f[1] < RACY_SECONDS * 10**9 for f in fingerprint)
+    if cacheable and not racy:
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "fingerprint": fingerprint,
+            "registry": registry,
+        }
+        try:
+            write_atomic(fname, marshal.dumps(snapshot))
+        except OSError:  # the registry still works, only slower
+            pass
+    return registry
+
+
+def load_repos() -> List[Tuple[str, str, str, List[str], str]]:
+    """
+    Return the repos in the format of `load`, from the SQLite backend if it
+    is enabled
+    """
+    if registry_db.is_enabled():
+        return registry_db.read_repos()
+    return load()["repos"]
+
+
+def load_groups() -> List[Tuple[str, List[str], str]]:
+    """
+    Return the groups in the format of `load`, see `load_repos`
+    """
+    if registry_db.is_enabled():
+        return registry_db.read_groups()
+    return load()["groups"]
+
+
+def compile_registry(
+    repos_fname: str, groups_fname: str, custom_cmds_fname: str, cmds_fname: str
+) -> Dict[str, Any]:
+    """
+    Parse the source files, see `load`
+    """
+    return {
+        "repos": read_repos_csv(repos_fname),
+        "groups": read_groups_csv(groups_fname),
+        "cmds": read_cmds(custom_cmds_fname, cmds_fname),
+    }
+
+
+def read_repos_csv(fname: str) -> List[Tuple[str, str, str, List[str], str]]:
+    repos = []
+    if os.path.isfile(fname) and os.stat(fname).st_size > 0:
+        with open(fname) as f:
+            rows = csv.DictReader(
+                f, ["path", "name", "type", "flags", "untracked"], restval=""
+            )  # it's actually a reader
+            repos = [
+                (r["path"], r["name"], r["type"], r["flags"].split(), r["untracked"])
+                for r in rows
+            ]
+    return repos
+
+
+def read_groups_csv(fname: str) -> List[Tuple[str, List[str], str]]:
+    groups = []
+    # Each line is:  group-name:repo1 repo2 repo3:group-path
+    if os.path.isfile(fname) and os.stat(fname).st_size > 0:
+        with open(fname, "r") as f:
+            rows = csv.DictReader(
+                f, ["name", "repos", "path"], restval="", delimiter=":"
+            )
+            groups = [(r["name"], r["repos"].split(), r["path"]) for r in rows]
+    return groups
+
+
+def read_cmds(custom_cmds_fname: str, cmds_fname: str) -> Dict[str, Dict[str, str]]:
+    with open(cmds_fname, "r") as f:
+        cmds = json.load(f)
+    custom_cmds = {}
+    if os.path.isfile(custom_cmds_fname) and os.path.getsize(custom_cmds_fname):
+        with open(custom_cmds_fname, "r") as f:
+            custom_cmds = json.load(f)
+    # custom commands shadow default ones
+    cmds.update(custom_cmds)
+    return cmds
+
+
+def _read(fname: str) -> Dict[str, Any]:
+    try:
+        with open(fname, "rb") as f:
+            snapshot = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        return {}
+    return snapshot
@@ -0,0 +1,272 @@
+"""
+Optional SQLite backend of the repo registry, for very large fleets.
+
+When `registry.sqlite` exists in the config directory, it replaces repos.csv
+and groups.csv. The repos, groups and group memberships are indexed tables.
+A write only touches the rows that changed since they were read, in one
+transaction, so that concurrent gita processes don't clobber each other's
+changes. See `gita registry` for the import from and export to the CSV files.
+
+`sqlite3` is only imported to connect, since the registry of most users is
+in the CSV files and this module is imported by every gita command.
+"""
+
+import os
+from contextlib import closing
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
+
+if TYPE_CHECKING:
+    import sqlite3
+
+from . import common
+
+DB_FNAME = "registry.sqlite"
+# seconds to wait for the write lock of another process
+LOCK_TIMEOUT = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    type TEXT NOT NULL DEFAULT '',
+    flags TEXT NOT NULL DEFAULT '',
+    untracked TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS repos_path ON repos (path);
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    group_id INTEGER NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+    repo TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (group_id, repo)
+);
+CREATE INDEX IF NOT EXISTS memberships_repo ON memberships (repo);
+"""
+
+# (database, table) -> name -> row, as last read or written by this process,
+# which the writers diff against
+_base: Dict[Tuple[str, str], Dict[str, Tuple]] = {}
+
+
+def get_fname() -> str:
+    return os.path.join(common.get_config_dir(), DB_FNAME)
+
+
+def is_enabled() -> bool:
+    return os.path.exists(get_fname())
+
+
+def connect(create: bool = False) -> "sqlite3.Connection":
+    """
+    Return a connection to the database, which is only created if `create`
+    """
+    import sqlite3
+
+    fname = get_fname()
+    if create:
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        conn = sqlite3.connect(fname, timeout=LOCK_TIMEOUT)
+    else:
+        conn = sqlite3.connect(f"file:{fname}?mode=rw", timeout=LOCK_TIMEOUT, uri=True)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def read_repos() -> List[Tuple[str, str, str, List[str], str]]:
+    """
+    Return the repos in the format of `registry.load`
+    """
+    with closing(connect()) as conn:
+        rows = _read_repo_rows(conn)
+    _base[get_fname(), "repos"] = rows
+    return [
+        (path, name, repo_type, flags.split(), untracked)
+        for name, (path, repo_type, flags, untracked) in rows.items()
+    ]
+
+
+def read_groups() -> List[Tuple[str, List[str], str]]:
+    """
+    Return the groups in the format of `registry.load`
+    """
+    with closing(connect()) as conn:
+        rows = _read_group_rows(conn)
+    _base[get_fname(), "groups"] = rows
+    return [(name, list(members), path) for name, (path, members) in rows.items()]
+
+
+def _read_repo_rows(conn: "sqlite3.Connection") -> Dict[str, Tuple]:
+    cursor = conn.execute(
+        "SELECT name, path, type, flags, untracked FROM repos ORDER BY id"
+    )
+    return {name: tuple(rest) for name, *rest in cursor}
+
+
+def _read_group_rows(conn: "sqlite3.Connection") -> Dict[str, Tuple]:
+    cursor = conn.execute(
+        "SELECT g.name, g.path, m.repo FROM groups g "
+        "LEFT JOIN memberships m ON m.group_id = g.id ORDER BY g.id, m.position"
+    )
+    groups = {}
+    for name, path, repo in cursor:
+        members = groups.setdefault(name, (path, []))[1]
+        if repo is not None:
+            members.append(repo)
+    return {name: (path, tuple(members)) for name, (path, members) in groups.items()}
+
+
+def _repo_row(prop: Dict) -> Tuple:
+    flags = prop.get("flags") or []
+    if not isinstance(flags, str):
+        flags = " ".join(flags)
+    return (prop["path"], prop.get("type") or "", flags, prop.get("untracked") or "")
+
+
+def write_repos(repos: Dict[str, Dict], mode: str):
+    """
+    Save `repos` like `utils.write_to_repo_file`: "a+" adds them, and "w"
+    makes them the only repos by applying the changes since they were read.
+    """
+    rows = {name: _repo_row(prop) for name, prop in repos.items()}
+    with closing(connect()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        base = _get_base(conn, "repos", _read_repo_rows)
+        if mode == "w":
+            removed = base.keys() - rows.keys()
+            conn.executemany(
+                "DELETE FROM repos WHERE name = ?", ((name,) for name in removed)
+            )
+            new_base = rows
+        else:
+            new_base = {**base, **rows}
+        for name, row in rows.items():
+            if base.get(name) == row:
+                continue
+            updated = conn.execute(
+                "UPDATE repos SET path = ?, type = ?, flags = ?, untracked = ? "
+                "WHERE name = ?",
+                row + (name,),
+            ).rowcount
+            if not updated:
+                conn.execute(
+                    "INSERT INTO repos (path, type, flags, untracked, name) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    row + (name,),
+                )
+    _base[get_fname(), "repos"] = new_base
+
+
+def write_groups(groups: Dict[str, Dict], mode: str):
+    """
+    Save `groups` like `utils.write_to_groups_file`, see `write_repos`
+    """
+    # groups with no repos are deleted
+    rows = {
+        name: (prop["path"] or "", tuple(sorted(prop["repos"])))
+        for name, prop in groups.items()
+        if prop["repos"]
+    }
+    with closing(connect()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        base = _get_base(conn, "groups", _read_group_rows)
+        if mode == "w":
+            removed = base.keys() - rows.keys()
+            conn.executemany(
+                "DELETE FROM groups WHERE name = ?", ((name,) for name in removed)
+            )
+            new_base = rows
+        else:
+            new_base = {**base, **rows}
+        for name, (path, members) in rows.items():
+            if base.get(name) == (path, members):
+                continue
+            conn.execute(
+                "INSERT OR IGNORE INTO groups (name, path) VALUES (?, ?)", (name, path)
+            )
+            conn.execute("UPDATE groups SET path = ? WHERE name = ?", (path, name))
+            (group_id,) = conn.execute(
+                "SELECT id FROM groups WHERE name = ?", (name,)
+            ).fetchone()
+            _set_members(conn, group_id, members)
+    _base[get_fname(), "groups"] = new_base
+
+
+def rename_repo(repo: str, new_name: str):
+    """
+    Rename `repo` in the repos and its group memberships
+    """
+    fname = get_fname()
+    with closing(connect()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE repos SET name = ? WHERE name = ?", (new_name, repo))
+        conn.execute(
+            "UPDATE OR REPLACE memberships SET repo = ? WHERE repo = ?",
+            (new_name, repo),
+        )
+    repos = _base.get((fname, "repos"))
+    if repos is not None:
+        _base[fname, "repos"] = {
+            new_name if name == repo else name: row for name, row in repos.items()
+        }
+    groups = _base.get((fname, "groups"))
+    if groups is not None:
+        _base[fname, "groups"] = {
+            name: (path, tuple(new_name if r == repo else r for r in members))
+            for name, (path, members) in groups.items()
+        }
+
+
+def _set_members(conn: "sqlite3.Connection", group_id: int, members: Iterable[str]):
+    conn.execute("DELETE FROM memberships WHERE group_id = ?", (group_id,))
+    conn.executemany(
+        "INSERT OR IGNORE INTO memberships (group_id, repo, position) "
+        "VALUES (?, ?, ?)",
+        ((group_id, repo, i) for i, repo in enumerate(members)),
+    )
+
+
+def _get_base(conn: "sqlite3.Connection", table: str, read) -> Dict[str, Tuple]:
+    """
+    Return the rows of `table` that this process saw, or the current ones if
+    it has not read them
+    """
+    key = get_fname(), table
+    if key not in _base:
+        _base[key] = read(conn)
+    return _base[key]
+
+
+def import_rows(
+    repos: List[Tuple[str, str, str, List[str], str]],
+    groups: List[Tuple[str, List[str], str]],
+):
+    """
+    Replace the content of the database, which is created if needed, with the
+    `repos` and `groups` in the format of `registry.load`
+    """
+    with closing(connect(create=True)) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM memberships")
+        conn.execute("DELETE FROM groups")
+        conn.execute("DELETE FROM repos")
+        conn.executemany(
+            "INSERT OR REPLACE INTO repos (path, name, type, flags, untracked) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (path, name, repo_type, " ".join(flags), untracked)
+                for path, name, repo_type, flags, untracked in repos
+            ),
+        )
+        for name, members, path in groups:
+            group_id = conn.execute(
+                "INSERT OR REPLACE INTO groups (name, path) VALUES (?, ?)",
+                (name, path),
+            ).lastrowid
+            _set_members(conn, group_id, members)
+    _base.clear()
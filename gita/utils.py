@@ -6,13 +6,26 @@ import os
 import platform
 import subprocess
 import sys
+import time
 from collections import Counter, defaultdict
-from concurrent.futures import ThreadPoolExecutor
-from functools import lru_cache
+from functools import lru_cache, partial
+from itertools import chain
 from pathlib import Path
-from typing import Coroutine, Dict, List, Tuple, Union
-
-from . import common, info
+from typing import (
+    Callable,
+    Coroutine,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from . import common, gitdir, info, registry, registry_db
+from .cache import StatusCache, ValidationCache
+from .model import Group, PathIndex, Registry, Repo
 
 MAX_INT = sys.maxsize
 
@@ -46,30 +59,40 @@ def get_repos(skip_validation: bool = False) -> Dict[str, Dict[str, str]]:
     Parameters:
     skip_validation (bool): Returns repos in config even if their path do not exists.
     """
-    path_file = common.get_config_fname("repos.csv")
     repos = {}
-    if os.path.isfile(path_file) and os.stat(path_file).st_size > 0:
-        with open(path_file) as f:
-            rows = csv.DictReader(
-                f, ["path", "name", "type", "flags"], restval=""
-            )  # it's actually a reader
-            for r in rows:
-                if skip_validation or is_git(r["path"], include_bare=True):
-                    repos[r["name"]] = {
-                        "path": r["path"],
-                        "type": r["type"],
-                        "flags": r["flags"].split(),
-                    }
+    rows = registry.load_repos()
+    validation = None if skip_validation or not rows else ValidationCache()
+    for path, name, repo_type, flags, untracked in rows:
+        if skip_validation or is_valid_repo(path, validation):
+            # the untracked file policy is in `info.UNTRACKED_POLICIES`
+            repos[name] = Repo(path, repo_type, flags, untracked)
+    if validation:
+        validation.save()
     return repos
 
 
+def is_valid_repo(path: str, validation: Optional[ValidationCache] = None) -> bool:
+    """
+    Return True if the registered `path` is a repo, reusing the result cached
+    in `validation` if the path is unchanged.
+    """
+    valid = validation and validation.get(path)
+    if valid is None:
+        valid = is_git(path, include_bare=True)
+        if validation:
+            validation.put(path, valid)
+    return valid
+
+
 @lru_cache()
-def get_context() -> Union[Path, None]:
+def get_context(cwd: Optional[Path] = None) -> Union[Path, None]:
     """
     Return context file path, or None if not set. Note that if in auto context
     mode, the return value is not auto.context but the resolved context,
     which could be None.
 
+    @param cwd: the directory that the auto context is resolved for, by
+                default the current working directory
     """
     config_dir = Path(common.get_config_dir())
     matches = list(config_dir.glob("*.context"))
@@ -81,16 +104,7 @@ def get_context() -> Union[Path, None]:
     ctx = matches[0]
     if ctx.stem == "auto":
         # The context is set to be the group with minimal distance to cwd
-        candidate = None
-        min_dist = MAX_INT
-        for gname, prop in get_groups().items():
-            rel = get_relative_path(Path.cwd(), prop["path"])
-            if rel is None:
-                continue
-            d = len(rel)
-            if d < min_dist:
-                candidate = gname
-                min_dist = d
+        candidate = get_group_index().find(cwd or Path.cwd())
         if not candidate:
             ctx = None
         else:
@@ -104,24 +118,59 @@ def get_groups() -> Dict[str, Dict[str, Union[str, List]]]:
     Return a `dict` of group name to group properties such as repo names and
     group path.
     """
-    fname = common.get_config_fname("groups.csv")
-    groups = {}
     repos = get_repos()
-    # Each line is:  group-name:repo1 repo2 repo3:group-path
-    if os.path.isfile(fname) and os.stat(fname).st_size > 0:
-        with open(fname, "r") as f:
-            rows = csv.DictReader(
-                f, ["name", "repos", "path"], restval="", delimiter=":"
-            )
-            # filter out invalid repos
-            groups = {
-                r["name"]: {
-                    "repos": [repo for repo in r["repos"].split() if repo in repos],
-                    "path": r["path"],
-                }
-                for r in rows
-            }
-    return groups
+    # filter out invalid repos
+    return {
+        name: Group([repo for repo in members if repo in repos], path)
+        for name, members, path in registry.load_groups()
+    }
+
+
+def get_registry() -> Registry:
+    """
+    Return the registry of `get_repos` and `get_groups`, which share their
+    records
+    """
+    return Registry(get_repos(), get_groups())
+
+
+@lru_cache()
+def get_repo_index() -> PathIndex:
+    return get_registry().by_path
+
+
+@lru_cache()
+def get_group_index() -> PathIndex:
+    return PathIndex(get_groups())
+
+
+def get_ll_sections(
+    group: Optional[str] = None, by_group: bool = False, cwd: Optional[Path] = None
+) -> List[Tuple[Optional[str], Dict[str, Dict[str, str]]]]:
+    """
+    Return the group headers and repos that `gita ll` displays. The header is
+    None when the repos are not displayed by group.
+
+    @param group: only display repos in this group, by default the context
+    @param by_group: display the repos of each group under its name
+    @param cwd: the directory that the auto context is resolved for
+    """
+    repos = get_repos()
+    ctx = get_context(cwd)
+    if group is None and ctx:
+        group = ctx.stem
+    group_repos = None
+    if group:  # only display repos in this group
+        group_repos = get_groups()[group]["repos"]
+        repos = {k: repos[k] for k in group_repos if k in repos}
+    if not by_group:
+        return [(None, repos)]
+    if group_repos:
+        return [(group, repos)]
+    return [
+        (g, {k: repos[k] for k in prop["repos"] if k in repos})
+        for g, prop in get_groups().items()
+    ]
 
 
 def delete_repo_from_groups(repo: str, groups: Dict[str, Dict]) -> bool:
@@ -154,19 +203,27 @@ def replace_context(old: Union[Path, None], new: str):
         Path(auto.with_name(f"{new}.context")).write_text("")
 
 
-def get_choices() -> List[Union[str, None]]:
+class Choices(dict):
     """
-    Return all repo names, group names, and an additional empty list. The empty
-    list is added as a workaround of
+    Names for the `choices` of an argparse argument, with a hash lookup. The
+    empty list is also accepted as a workaround of
     argparse's problem with coexisting nargs='*' and choices.
     See https://utcc.utoronto.ca/~cks/space/blog/python/ArgparseNargsChoicesLimitation
     and
     https://bugs.python.org/issue27227
     """
-    choices = list(get_repos())
-    choices.extend(get_groups())
-    choices.append([])
-    return choices
+
+    def __contains__(self, item) -> bool:
+        if isinstance(item, list):
+            return not item
+        return super().__contains__(item)
+
+
+def get_choices() -> Choices:
+    """
+    Return all repo names and group names
+    """
+    return Choices.fromkeys(chain(get_repos(), get_groups()))
 
 
 def is_submodule_repo(p: Path) -> bool:
@@ -197,16 +254,12 @@ def is_git(path: str, include_bare=False, exclude_submodule=False) -> bool:
         return True
     if not include_bare:
         return False
-    # detect bare repo
-    got = subprocess.run(
-        "git rev-parse --is-bare-repository".split(),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL,
-        cwd=path,
-    )
-    if got.returncode == 0 and got.stdout == b"true\n":
-        return True
-    return False
+    # detect bare repo by its layout, unless its config says otherwise
+    if not gitdir.is_bare_layout(path):
+        return False
+    config = gitdir.read_config(Path(path)) or []
+    bare = dict(config).get("core.bare", "true").lower()
+    return bare not in ("false", "no", "off", "0")
 
 
 def rename_repo(repos: Dict[str, Dict[str, str]], repo: str, new_name: str):
@@ -216,28 +269,34 @@ def rename_repo(repos: Dict[str, Dict[str, str]], repo: str, new_name: str):
     if new_name in repos:
         print(f"{new_name} is already in use!")
         return
-    prop = repos[repo]
-    del repos[repo]
-    repos[new_name] = prop
+    if registry_db.is_enabled():
+        registry_db.rename_repo(repo, new_name)
+        repos[new_name] = repos.pop(repo)
+        return
+    # the groups are read before the rename, which would filter out `repo`
+    registry = Registry(repos, get_groups())
+    registry.rename_repo(repo, new_name)
     write_to_repo_file(repos, "w")
-
-    groups = get_groups()
-    for g, values in groups.items():
-        members = values["repos"]
-        if repo in members:
-            members.remove(repo)
-            members.append(new_name)
-            groups[g]["repos"] = sorted(members)
-    write_to_groups_file(groups, "w")
+    write_to_groups_file(registry.groups, "w")
 
 
 def write_to_repo_file(repos: Dict[str, Dict[str, str]], mode: str):
     """
     @param repos: each repo is {name: {properties}}
+    @param mode: "a+" to add `repos`, "w" to make them the only repos
     """
+    if registry_db.is_enabled():
+        registry_db.write_repos(repos, mode)
+    else:
+        write_repos_csv(repos, mode)
+
+
+def write_repos_csv(repos: Dict[str, Dict[str, str]], mode: str):
     # The 3rd column is repo type; unused field
+    # The optional 5th column is the untracked file policy
     data = [
         (prop["path"], name, prop.get("type", ""), " ".join(prop["flags"]))
+        + ((prop["untracked"],) if prop.get("untracked") else ())
         for name, prop in repos.items()
     ]
     fname = common.get_config_fname("repos.csv")
@@ -249,7 +308,17 @@ def write_to_repo_file(repos: Dict[str, Dict[str, str]], mode: str):
 
 # TODO: combine with the repo writer
 def write_to_groups_file(groups: Dict[str, Dict], mode: str):
-    """ """
+    """
+    @param groups: each group is {name: {"repos": [...], "path": ...}}
+    @param mode: "a+" to add `groups`, "w" to make them the only groups
+    """
+    if registry_db.is_enabled():
+        registry_db.write_groups(groups, mode)
+    else:
+        write_groups_csv(groups, mode)
+
+
+def write_groups_csv(groups: Dict[str, Dict], mode: str):
     fname = common.get_config_fname("groups.csv")
     os.makedirs(os.path.dirname(fname), exist_ok=True)
     if not groups:  # all groups are deleted
@@ -261,7 +330,7 @@ def write_to_groups_file(groups: Dict[str, Dict], mode: str):
                 del groups[name]
         with open(fname, mode, newline="") as f:
             data = [
-                (group, " ".join(prop["repos"]), prop["path"])
+                (group, " ".join(sorted(prop["repos"])), prop["path"])
                 for group, prop in groups.items()
             ]
             writer = csv.writer(
@@ -289,25 +358,41 @@ def _make_name(
 
 def add_repos(
     repos: Dict[str, Dict[str, str]],
-    new_paths: List[str],
+    new_paths: Iterable[str],
     include_bare=False,
     exclude_submodule=False,
     dry_run=False,
+    validated=False,
 ) -> Dict[str, Dict[str, str]]:
     """
     Write new repo paths to file; return the added repos.
 
+    The paths are consumed as they come, e.g., from `discover.walk_repos`. A
+    dry run prints the new ones right away, and a terminal shows their count
+    as it grows.
+
     @param repos: name -> path
+    @param validated: whether `new_paths` are known to be repos
     """
     existing_paths = {prop["path"] for prop in repos.values()}
-    new_paths = {p for p in new_paths if is_git(p, include_bare, exclude_submodule)}
-    new_paths = new_paths - existing_paths
+    progress = not dry_run and sys.stdout.isatty()
+    found = {}  # keeps the order in which they are found
+    for p in new_paths:
+        if p in existing_paths or p in found:
+            continue
+        if not validated and not is_git(p, include_bare, exclude_submodule):
+            continue
+        found[p] = None
+        if dry_run:
+            print(p, flush=True)
+        elif progress:
+            print(f"\rFound {len(found)} new repo(s).", end="", flush=True)
+    new_paths = list(found)
     new_repos = {}
     if new_paths:
-        print(f"Found {len(new_paths)} new repo(s).")
+        prefix = "\r" if progress else ""  # over the progress
+        print(f"{prefix}Found {len(new_paths)} new repo(s).")
         if dry_run:
-            for p in new_paths:
-                print(p)
             return {}
         name_counts = Counter(os.path.basename(os.path.normpath(p)) for p in new_paths)
         new_repos = {
@@ -411,22 +496,303 @@ def exec_async_tasks(tasks: List[Coroutine]) -> List[Union[None, str]]:
     return asyncio.run(_gather_tasks(tasks))
 
 
-def describe(repos: Dict[str, Dict[str, str]], no_colors: bool = False) -> str:
+def select_repos(
+    repos: Dict[str, Dict[str, str]], states: Iterable[str], jobs: Optional[int] = None
+) -> Dict[str, Dict[str, str]]:
     """
-    Return the status of all repos
+    Return the repos that are in any of the `states`, see `info.ONLY_STATES`.
+    All of them if no state is given.
     """
-    if repos:
-        truncator = info.Truncate()
-        name_width = len(max(repos, key=len)) + 1
-        funcs = info.get_info_funcs(no_colors=no_colors)
+    if not states or not repos:
+        return repos
+    status_cache = StatusCache()
+
+    async def check_all() -> List[bool]:
+        semaphore = asyncio.Semaphore(get_jobs(jobs))
+
+        async def check(prop: Dict[str, str]) -> bool:
+            async with semaphore:
+                return await info.is_in_states(prop, states, status_cache)
 
-        num_threads = min(multiprocessing.cpu_count(), len(repos))
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            for line in executor.map(
-                lambda name: f"{name:<{name_width}}{' '.join(f(repos[name], truncator) for f in funcs)}",
-                sorted(repos),
-            ):
-                yield line
+        return await asyncio.gather(*(check(prop) for prop in repos.values()))
+
+    (selected,) = exec_async_tasks([check_all()])
+    return {name: repos[name] for name, ok in zip(repos, selected) if ok}
+
+
+def get_jobs(jobs: Optional[int] = None) -> int:
+    """
+    Return the number of repos to process concurrently: `jobs` if given,
+    otherwise the `jobs` setting, otherwise a default suited to work that
+    mostly waits for git processes and the disk.
+    """
+    if jobs is None:
+        jobs = common.get_settings().get("jobs")
+    if jobs:
+        return max(int(jobs), 1)
+    return min(32, 4 * multiprocessing.cpu_count())
+
+
+def describe(
+    repos: Dict[str, Dict[str, str]],
+    no_colors: bool = False,
+    cache: Optional[StatusCache] = None,
+    jobs: Optional[int] = None,
+    sort: str = "name",
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    timed_out: Optional[List[str]] = None,
+) -> str:
+    """
+    Return the status of all repos, in the order of `sort`, see `SORT_KEYS`.
+
+    The git processes of up to `jobs` repos run concurrently in an event loop.
+    When sorted by name, each line is yielded as soon as it and the lines
+    before it are ready.
+
+    @param timeout: seconds each repo may take
+    @param deadline: `time.monotonic()` time by which all repos must be done
+    @param timed_out: the names of the repos that time out are added to it
+    """
+    limits = dict(timeout=timeout, deadline=deadline)
+    if sort != "name":
+        items = set(info.get_info_items()) | {sort}
+        snapshots = dict(get_snapshots(repos, cache, jobs, items=items, **limits))
+        _add_timed_out(snapshots.items(), timed_out)
+        yield from describe_snapshots(snapshots, no_colors, sort)
+        return
+    lines = _describe(
+        repos,
+        no_colors,
+        cache,
+        jobs,
+        ordered=True,
+        name_width=None,
+        timed_out=timed_out,
+        **limits,
+    )
+    for _, line in lines:
+        yield line
+
+
+def describe_as_completed(
+    repos: Dict[str, Dict[str, str]],
+    no_colors: bool = False,
+    cache: Optional[StatusCache] = None,
+    jobs: Optional[int] = None,
+    name_width: Optional[int] = None,
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    timed_out: Optional[List[str]] = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Return the repo names and status lines of all repos, in the order their
+    status becomes ready.
+
+    @param name_width: width of the name column, by default fit to `repos`
+    See `describe` for the other parameters.
+    """
+    yield from _describe(
+        repos,
+        no_colors,
+        cache,
+        jobs,
+        ordered=False,
+        name_width=name_width,
+        timed_out=timed_out,
+        timeout=timeout,
+        deadline=deadline,
+    )
+
+
+def _describe(
+    repos: Dict[str, Dict[str, str]],
+    no_colors: bool,
+    cache: Optional[StatusCache],
+    jobs: Optional[int],
+    ordered: bool,
+    name_width: Optional[int],
+    timed_out: Optional[List[str]],
+    **limits,
+) -> Iterator[Tuple[str, str]]:
+    if not repos:
+        return
+    render = _make_render(repos, no_colors, name_width)
+    for name, snap in get_snapshots(repos, cache, jobs, ordered, **limits):
+        _add_timed_out([(name, snap)], timed_out)
+        yield name, render(name, snap)
+
+
+def describe_records(
+    repos: Dict[str, Dict[str, str]],
+    cache: Optional[StatusCache] = None,
+    jobs: Optional[int] = None,
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    timed_out: Optional[List[str]] = None,
+) -> Iterator[Dict]:
+    """
+    Return the status of all repos as dicts, see `info.get_record`, in the
+    order their status becomes ready.
+
+    See `describe` for the parameters.
+    """
+    snapshots = get_snapshots(
+        repos, cache, jobs, items=RECORD_ITEMS, timeout=timeout, deadline=deadline
+    )
+    for name, snap in snapshots:
+        _add_timed_out([(name, snap)], timed_out)
+        yield info.get_record(name, snap)
+
+
+# The info items whose information makes up the records
+RECORD_ITEMS = ("branch", "commit_msg")
+
+# How `gita ll` can print the repos
+OUTPUT_FORMATS = ("text", "json", "ndjson")
+
+
+def format_records(records: Iterable[Dict], fmt: str) -> Iterator[str]:
+    """
+    Return the output lines of `records` in the format `fmt`, which is
+    `ndjson` for one JSON object per line, or `json` for a JSON array with
+    one element per line. Each line comes as soon as its record does, except
+    that the last element of the array waits for the end.
+    """
+    if fmt == "ndjson":
+        for record in records:
+            yield json.dumps(record)
+        return
+    yield "["
+    previous = None
+    for record in records:
+        if previous is not None:
+            yield f"  {previous},"
+        previous = json.dumps(record)
+    if previous is not None:
+        yield f"  {previous}"
+    yield "]"
+
+
+def _add_timed_out(
+    snapshots: Iterable[Tuple[str, info.RepoSnapshot]],
+    timed_out: Optional[List[str]],
+):
+    if timed_out is not None:
+        timed_out.extend(name for name, snap in snapshots if snap.timed_out)
+
+
+def describe_snapshots(
+    snapshots: Dict[str, info.RepoSnapshot],
+    no_colors: bool = False,
+    sort: str = "name",
+) -> Iterator[str]:
+    """
+    Return the status lines of repos whose snapshots are already taken, in
+    the order of `sort`.
+    """
+    if not snapshots:
+        return
+    render = _make_render(snapshots, no_colors)
+    for name in sorted(snapshots, key=partial(SORT_KEYS[sort], snapshots)):
+        yield render(name, snapshots[name])
+
+
+def _by_commit_time(snapshots: Dict[str, info.RepoSnapshot], name: str) -> Tuple:
+    # most recent first, then repos without commits, then timed out repos
+    snap = snapshots[name]
+    if snap.timed_out:
+        return 2, 0, name
+    timestamp = snap.last_commit.time
+    if timestamp is None:
+        return 1, 0, name
+    return 0, -timestamp, name
+
+
+# How `gita ll` can order the repos. Each function returns the sort key of a
+# repo given the snapshots and the repo name.
+SORT_KEYS = {
+    "name": lambda snapshots, name: name,
+    "commit_time": _by_commit_time,
+}
+
+
+def _make_render(
+    names: Iterable[str], no_colors: bool, name_width: Optional[int] = None
+) -> Callable[[str, info.RepoSnapshot], str]:
+    truncator = info.Truncate()
+    name_width = name_width or len(max(names, key=len)) + 1
+    funcs = info.get_info_funcs(no_colors=no_colors)
+
+    def render(name: str, snap: info.RepoSnapshot) -> str:
+        if snap.timed_out:
+            return f"{name:<{name_width}}{info.get_timed_out(no_colors)}"
+        return f"{name:<{name_width}}{' '.join(f(snap, truncator) for f in funcs)}"
+
+    return render
+
+
+def get_snapshots(
+    repos: Dict[str, Dict[str, str]],
+    cache: Optional[StatusCache] = None,
+    jobs: Optional[int] = None,
+    ordered: bool = False,
+    items: Optional[Iterable[str]] = None,
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[Tuple[str, info.RepoSnapshot]]:
+    """
+    Return the repo names and snapshots of all repos, with the information
+    of the info `items` collected, by default the displayed ones. They come in
+    the order of repo names if `ordered`, otherwise in the order they become
+    ready.
+
+    A repo times out if it takes more than `timeout` seconds, or if it is not
+    done by the `deadline` in `time.monotonic()` time.
+    """
+    if not repos:
+        return
+    if items is None:
+        items = info.get_info_items()
+
+    async def prefetch(name: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            snap = info.RepoSnapshot(repos[name], cache)
+            limits = [deadline] if deadline else []
+            if timeout:
+                limits.append(time.monotonic() + timeout)
+            await snap.prefetch(items, min(limits, default=None))
+            return snap
+
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    loop = asyncio.new_event_loop()
+    tasks = {}
+    try:
+        # The semaphore has to be created in the loop for python < 3.10
+        semaphore = loop.run_until_complete(_make_semaphore(get_jobs(jobs)))
+        tasks = {name: loop.create_task(prefetch(name, semaphore)) for name in repos}
+        if ordered:
+            for name in sorted(repos):
+                yield name, loop.run_until_complete(tasks[name])
+        else:
+            names = {task: name for name, task in tasks.items()}
+            pending = set(tasks.values())
+            while pending:
+                done, pending = loop.run_until_complete(
+                    asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                )
+                for task in sorted(done, key=names.get):
+                    yield names[task], task.result()
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks.values(), return_exceptions=True))
+        loop.close()
+
+
+async def _make_semaphore(value: int) -> asyncio.Semaphore:
+    return asyncio.Semaphore(value)
 
 
 def get_cmds_from_files() -> Dict[str, Dict[str, str]]:
@@ -441,22 +807,7 @@ def get_cmds_from_files() -> Dict[str, Dict[str, str]]:
                 'help': 'remove all untracked files/folders'},
     }
     """
-    # default config file
-    fname = os.path.join(os.path.dirname(__file__), "cmds.json")
-    with open(fname, "r") as f:
-        cmds = json.load(f)
-
-    # custom config file
-    root = common.get_config_dir()
-    fname = os.path.join(root, "cmds.json")
-    custom_cmds = {}
-    if os.path.isfile(fname) and os.path.getsize(fname):
-        with open(fname, "r") as f:
-            custom_cmds = json.load(f)
-
-    # custom commands shadow default ones
-    cmds.update(custom_cmds)
-    return cmds
+    return registry.load()["cmds"]
 
 
 def parse_repos_and_rest(
@@ -488,13 +839,6 @@ def parse_repos_and_rest(
         sys.exit(2)
 
     if names:
-        chosen = {}
-        for k in names:
-            if k in repos:
-                chosen[k] = repos[k]
-            if k in groups:
-                for r in groups[k]["repos"]:
-                    chosen[r] = repos[r]
         # if not set here, all repos are chosen
-        repos = chosen
+        repos = Registry(repos, groups).expand(names)
     return repos, input[i:]
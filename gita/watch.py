@@ -0,0 +1,355 @@
+"""
+Keep the `gita ll` rows up to date as repos change.
+
+On Linux, file system events are delivered by inotify. Elsewhere, the git
+directories are polled. Only the repos that changed are recomputed, and only
+their rows are redrawn.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, TextIO, Tuple
+
+from . import display, gitdir, utils
+from .cache import StatusCache, fingerprint
+
+# Seconds without new events before the changed repos are recomputed
+DEBOUNCE = 0.2
+# Longest wait for a quiet moment while events keep coming
+MAX_DEBOUNCE = 2.0
+# Seconds between refreshes of all repos. Events are only watched in the top
+# directory of the worktrees, so edits in sub-directories show up this late.
+FULL_REFRESH = 60.0
+# Seconds between checks of the polling watcher
+POLL_INTERVAL = 2.0
+
+# Files in the git directory that the displayed information depends on
+GIT_FILES = frozenset(
+    (
+        "HEAD",
+        "index",
+        "FETCH_HEAD",
+        "ORIG_HEAD",
+        "MERGE_HEAD",
+        "packed-refs",
+        "config",
+    )
+)
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+)
+_EVENT = struct.Struct("iIII")
+
+# A predicate on the names of the changed entries in a watched directory
+NameFilter = Callable[[str], bool]
+
+
+def _is_git_file(name: str) -> bool:
+    return name in GIT_FILES
+
+
+def _is_ref(name: str) -> bool:
+    # git writes `<ref>.lock` first and renames it to `<ref>`
+    return not name.endswith(".lock")
+
+
+def _is_stash(name: str) -> bool:
+    return name == "stash"
+
+
+def _is_worktree_entry(name: str) -> bool:
+    return name != ".git"
+
+
+def get_watch_dirs(path: str) -> Dict[Path, NameFilter]:
+    """
+    Return the directories to watch for the repo at `path`, and for each of
+    them, which changed entries matter.
+    """
+    dirs = {Path(path): _is_worktree_entry}
+    git_dir = gitdir.find(path)
+    if git_dir is None:
+        return dirs
+    common_dir = gitdir.get_common_dir(git_dir)
+    dirs[git_dir] = dirs[common_dir] = _is_git_file
+    dirs[common_dir / "refs"] = _is_stash
+    for top in ("heads", "remotes", "tags"):
+        for root, _, _ in os.walk(common_dir / "refs" / top):
+            dirs[Path(root)] = _is_ref
+    return dirs
+
+
+class Inotify:
+    """
+    Thin wrapper of the Linux inotify API
+    """
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise _last_error()
+
+    def add_watch(self, path: Path, mask: int = WATCH_MASK) -> int:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise _last_error()
+        return wd
+
+    def read(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """
+        Return the (watch descriptor, mask, name) of the events that arrive
+        within `timeout` seconds.
+        """
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _last_error() -> OSError:
+    err = ctypes.get_errno()
+    return OSError(err, os.strerror(err))
+
+
+class InotifyWatcher:
+    """
+    Report the repos that changed, using inotify
+    """
+
+    def __init__(self, paths: Dict[str, str]):
+        self.paths = paths
+        self.inotify = Inotify()
+        # watch descriptor -> names of the repos and their filters
+        self.watches: Dict[int, Dict[str, NameFilter]] = {}
+
+    def arm(self, names: Set[str]):
+        """
+        Watch the directories of the repos in `names`. Directories that were
+        created since the last call, such as new ref namespaces, are added.
+        """
+        for name in names:
+            for d, accept in get_watch_dirs(self.paths[name]).items():
+                try:
+                    wd = self.inotify.add_watch(d)
+                except OSError:  # gone, or out of watches
+                    continue
+                self.watches.setdefault(wd, {})[name] = accept
+
+    def wait(self, timeout: float) -> Set[str]:
+        """
+        Return the names of the repos that changed, waiting up to `timeout`
+        seconds for the first change.
+        """
+        end = time.monotonic() + timeout
+        changed = set()
+        while not changed:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            for wd, mask, entry in self.inotify.read(remaining):
+                if mask & IN_Q_OVERFLOW:
+                    return set(self.paths)
+                if mask & IN_IGNORED:  # the directory is gone
+                    changed.update(self.watches.pop(wd, ()))
+                    continue
+                for name, accept in self.watches.get(wd, {}).items():
+                    if accept(entry):
+                        changed.add(name)
+        return changed
+
+    def close(self):
+        self.inotify.close()
+
+
+class PollingWatcher:
+    """
+    Report the repos that changed, by comparing the stat results of the files
+    the displayed information depends on
+    """
+
+    def __init__(self, paths: Dict[str, str], interval: float = POLL_INTERVAL):
+        self.paths = paths
+        self.interval = interval
+        self.signatures = {}
+        self.last_poll = time.monotonic()
+
+    def _signature(self, name: str) -> Tuple:
+        path = self.paths[name]
+        try:
+            root = os.stat(path).st_mtime_ns
+        except OSError:
+            root = None
+        return fingerprint(path), root
+
+    def arm(self, names: Set[str]):
+        for name in names:
+            self.signatures[name] = self._signature(name)
+
+    def wait(self, timeout: float) -> Set[str]:
+        end = time.monotonic() + max(timeout, 0)
+        while True:
+            next_poll = self.last_poll + self.interval
+            if next_poll > end:
+                time.sleep(max(end - time.monotonic(), 0))
+                return set()
+            time.sleep(max(next_poll - time.monotonic(), 0))
+            self.last_poll = time.monotonic()
+            changed = {
+                name
+                for name, sig in self.signatures.items()
+                if self._signature(name) != sig
+            }
+            if changed:
+                return changed
+
+    def close(self):
+        pass
+
+
+def get_watcher(paths: Dict[str, str]):
+    """
+    Return an inotify watcher if possible, otherwise a polling one.
+    """
+    try:
+        return InotifyWatcher(paths)
+    except (OSError, AttributeError):  # no inotify in libc
+        return PollingWatcher(paths)
+
+
+def wait_for_changes(watcher, timeout: float, debounce: float = DEBOUNCE) -> Set[str]:
+    """
+    Return the names of the repos that changed within `timeout` seconds, once
+    no more changes come for `debounce` seconds.
+    """
+    names = watcher.wait(timeout)
+    quiet_by = time.monotonic() + MAX_DEBOUNCE
+    while names and time.monotonic() < quiet_by:
+        more = watcher.wait(debounce)
+        if not more:
+            break
+        names |= more
+    return names
+
+
+class _Rows:
+    """
+    Rows that are redrawn in place on a terminal that can hold all of them.
+    Otherwise, the rows that changed in a refresh are printed sorted below the
+    previous ones.
+    """
+
+    def __init__(self, placeholders: Dict[str, str], out: TextIO):
+        self.table = display.LiveTable(placeholders, out)
+        self.live = out.isatty() and self.table.fits()
+        self.changed = set()
+        if self.live:
+            self.table.start()
+
+    def update(self, name: str, row: str):
+        if self.live:
+            self.table.update(name, row)
+        elif self.table.rows.get(name) != row:
+            self.table.rows[name] = row
+            self.changed.add(name)
+
+    def set_status(self, status: str):
+        if self.live:
+            self.table.set_status(status)
+            return
+        for name in sorted(self.changed):
+            print(self.table.rows[name], file=self.table.out)
+        self.table.out.flush()
+        self.changed.clear()
+
+    def finish(self):
+        if self.live:
+            self.table.finish()
+
+
+def watch(
+    repos: Dict[str, Dict[str, str]],
+    no_colors: bool = False,
+    cache: Optional[StatusCache] = None,
+    jobs: Optional[int] = None,
+    timeout: Optional[float] = None,
+    out: Optional[TextIO] = None,
+    debounce: float = DEBOUNCE,
+    full_refresh: float = FULL_REFRESH,
+):
+    """
+    Display the status of `repos` and update it as they change, until
+    interrupted with Ctrl-C.
+    """
+    if not repos:
+        return
+    out = out or sys.stdout
+    paths = {name: prop["path"] for name, prop in repos.items()}
+    name_width = len(max(repos, key=len)) + 1
+    rows = _Rows(display.placeholder_rows(repos), out)
+    watcher = get_watcher(paths)
+    idle = f"watching {len(repos)} repos, press Ctrl-C to quit"
+    try:
+        names = set(repos)
+        next_full = time.monotonic() + full_refresh
+        while True:
+            rows.set_status(f"updating {len(names)} repos")
+            # watch before computing, so that no change is missed in between
+            watcher.arm(names)
+            if cache:
+                cache.forget(paths[n] for n in names)
+            for name, row in utils.describe_as_completed(
+                {n: repos[n] for n in names},
+                no_colors,
+                cache,
+                jobs,
+                name_width,
+                timeout=timeout,
+            ):
+                rows.update(name, row)
+            rows.set_status(idle)
+            names = wait_for_changes(watcher, next_full - time.monotonic(), debounce)
+            if not names:
+                names = set(repos)
+                next_full = time.monotonic() + full_refresh
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rows.finish()
+        watcher.close()
@@ -1,6 +1,8 @@
 from pathlib import Path
 from unittest.mock import MagicMock
 
+import pytest
+
 TEST_DIR = Path(__file__).parents[0]
 
 
@@ -14,6 +16,15 @@ PATH_FNAME_CLASH = fullpath("clash_path_file")
 GROUP_FNAME = fullpath("mock_group_file")
 
 
+@pytest.fixture(autouse=True)
+def config_home(tmp_path, monkeypatch):
+    """
+    Keep the files that gita writes, e.g., the caches and the registry
+    snapshot, out of the user's config directory
+    """
+    monkeypatch.setenv("GITA_PROJECT_HOME", str(tmp_path))
+
+
 def async_mock():
     """
     Mock an async function. The calling arguments are saved in a MagicMock.
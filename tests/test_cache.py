@@ -0,0 +1,101 @@
+import json
+import subprocess
+
+import pytest
+
+from gita import cache, info
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    subprocess.run(["git", "init", "-q", str(path)], check=True)
+    return str(path)
+
+
+def test_fingerprint(repo, tmp_path):
+    fp = cache.fingerprint(repo)
+    assert fp[0].startswith("refs/heads/")
+    assert fp == cache.fingerprint(repo)
+    subprocess.run(["git", "checkout", "-q", "-b", "other"], cwd=repo, check=True)
+    assert fp != cache.fingerprint(repo)
+    assert cache.fingerprint(str(tmp_path)) is None
+
+
+def test_get_put_save(repo, tmp_path):
+    fname = str(tmp_path / "cache.json")
+    c = cache.StatusCache(fname)
+    assert c.get(repo, "commit_msg") is None
+    c.put(repo, commit_msg="msg")
+    assert c.get(repo, "commit_msg") == "msg"
+    c.save(keep=[repo])
+
+    c = cache.StatusCache(fname)
+    assert c.get(repo, "commit_msg") == "msg"
+    # stale after the repo changes
+    subprocess.run(["git", "checkout", "-q", "-b", "other"], cwd=repo, check=True)
+    c = cache.StatusCache(fname)
+    assert c.get(repo, "commit_msg") is None
+
+
+def test_save_merges_and_evicts(repo, tmp_path):
+    fname = str(tmp_path / "cache.json")
+    other = tmp_path / "other"
+    subprocess.run(["git", "init", "-q", str(other)], check=True)
+    c1 = cache.StatusCache(fname)
+    c2 = cache.StatusCache(fname)
+    c1.put(repo, commit_msg="a")
+    c2.put(str(other), commit_msg="b")
+    c1.save(keep=[repo, str(other)])
+    c2.save(keep=[repo, str(other)])
+    with open(fname) as f:
+        assert set(json.load(f)["repos"]) == {repo, str(other)}
+
+    c1.put(repo, commit_msg="c")
+    c1.save(keep=[repo])  # `other` is no longer registered
+    with open(fname) as f:
+        assert set(json.load(f)["repos"]) == {repo}
+
+
+def test_status_with_cache(repo, tmp_path, monkeypatch):
+    prop = {"path": repo, "flags": []}
+    c = cache.StatusCache(str(tmp_path / "cache.json"))
+    first = info.get_status(prop, c)
+    assert c.get(repo, "refs_status") == [first.head, "", "no_remote", 0, 0]
+
+    # a hit still reports worktree changes
+    (tmp_path / "repo" / "new").write_text("")
+    monkeypatch.setattr(info, "get_head", lambda _: pytest.fail("not cached"))
+    got = info.get_status(prop, c)
+    assert got == first._replace(untracked="untracked")
+
+
+def test_validation_cache(repo, tmp_path):
+    fname = str(tmp_path / "validation.json")
+    c = cache.ValidationCache(fname)
+    assert c.get(repo) is None
+    c.put(repo, True)
+    c.put(str(tmp_path / "missing"), True)  # not cached
+    c.save()
+    c = cache.ValidationCache(fname)
+    assert c.get(repo) is True
+    assert c.get(str(tmp_path / "missing")) is None
+    # stale after the directory changes
+    (tmp_path / "repo" / "new").write_text("")
+    assert c.get(repo) is None
+
+
+def test_write_atomic(tmp_path, monkeypatch):
+    fname = tmp_path / "new" / "file"
+    cache.write_atomic(str(fname), b"old")
+    assert fname.read_bytes() == b"old"
+
+    def fail(*_):
+        raise OSError
+
+    monkeypatch.setattr(cache.os, "replace", fail)
+    with pytest.raises(OSError):
+        cache.write_atomic(str(fname), b"new")
+    assert fname.read_bytes() == b"old"
+    assert [p.name for p in fname.parent.iterdir()] == ["file"]  # no temp file
@@ -0,0 +1,66 @@
+import argparse
+import json
+
+import pytest
+
+from gita import completion, utils
+
+NAMES = {"repos": ["r1", "r2"], "groups": ["g1"], "repos+groups": ["r1", "r2", "g1"]}
+
+
+def make_parser():
+    p = argparse.ArgumentParser(prog="gita")
+    subparsers = p.add_subparsers()
+    p.add_argument("-v", action="store_true")
+    ll = subparsers.add_parser("ll", help="display summary")
+    ll.add_argument("group", nargs="?", choices={"g1": {}})
+    ll.add_argument("-f", "--format", choices=["text", "json"])
+    pull = subparsers.add_parser("pull", help="git pull")
+    pull.add_argument("repo", nargs="+", choices={"r1", "r2", "g1"})
+    return p
+
+
+def test_describe():
+    spec = completion.describe(make_parser(), NAMES)
+    assert [a.get("flags") for a in spec["arguments"]] == [None, ["-v"]]
+    commands = spec["arguments"][0]["commands"]
+    assert list(commands) == ["ll", "pull"]
+    assert commands["ll"]["help"] == "display summary"
+    group, fmt = commands["ll"]["arguments"]
+    assert group["choices"] == "groups"
+    assert fmt["choices"] == ["text", "json"]
+    assert commands["pull"]["arguments"][0]["choices"] == "repos+groups"
+
+
+def test_build():
+    spec = json.loads(json.dumps(completion.describe(make_parser(), NAMES)))
+    p = completion.build(spec, {**NAMES, "repos+groups": ["r1", "g1"]})
+    assert p.parse_args(["pull", "r1", "g1"]).repo == ["r1", "g1"]
+    assert p.parse_args(["ll", "-f", "json", "g1"]).format == "json"
+    assert p.parse_args(["-v"]).v
+    with pytest.raises(SystemExit):
+        p.parse_args(["pull", "r2"])
+
+
+def test_autocomplete(monkeypatch, tmp_path):
+    monkeypatch.setenv("GITA_PROJECT_HOME", str(tmp_path))
+    monkeypatch.setenv("_ARGCOMPLETE", "1")
+    monkeypatch.setattr(utils, "get_repos", lambda: {"r1": {}, "r2": {}})
+    monkeypatch.setattr(utils, "get_groups", lambda: {"g1": {}})
+    answered = []
+    monkeypatch.setattr(completion.argcomplete, "autocomplete", answered.append)
+    built = []
+
+    def get_parser():
+        built.append(1)
+        return make_parser()
+
+    completion.autocomplete(get_parser)
+    assert (built, answered[-1].prog) == ([1], "gita")
+    completion.autocomplete(get_parser)
+    assert built == [1]
+    assert answered[-1].parse_args(["pull", "r2"]).repo == ["r2"]
+    # a change of the repos rebuilds the index
+    (tmp_path / "gita" / "repos.csv").write_text("/a,r3,,\n")
+    completion.autocomplete(get_parser)
+    assert built == [1, 1]
@@ -0,0 +1,124 @@
+import select
+import socket
+import subprocess
+import threading
+
+import pytest
+
+from gita import __main__, common, daemon, info, utils
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="no Unix domain sockets"
+)
+
+
+@pytest.fixture
+def config_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITA_PROJECT_HOME", str(tmp_path))
+    path = tmp_path / "gita"
+    path.mkdir()
+    yield path
+    for f in (utils.get_repos, utils.get_groups, utils.get_context):
+        f.cache_clear()
+
+
+@pytest.fixture
+def server(config_dir):
+    server = daemon.make_server(daemon.get_socket_fname())
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_no_daemon(config_dir):
+    assert daemon.request("ping") is None
+
+
+def test_unsupported(server, monkeypatch, capfd):
+    monkeypatch.delattr(socket, "AF_UNIX")
+    assert daemon.request("ping") is None
+    with pytest.raises(SystemExit):
+        __main__.main(["daemon", "status"])
+    assert "needs Unix domain sockets" in capfd.readouterr().out
+
+
+def test_requests(server, config_dir, tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    subprocess.run(["git", "init", "-q", str(repo)], check=True)
+    (config_dir / "repos.csv").write_text(f"{repo},r,,\n")
+    assert daemon.request("ping") == []
+    assert daemon.request("ls") == ["r"]
+    assert daemon.request("ls", repo="r") == [str(repo)]
+    assert daemon.request("ls", repo="x") is None
+    assert daemon.request("context", cwd=str(tmp_path)) == ["Context is not set"]
+
+    monkeypatch.setattr(info, "get_info_items", lambda: ["branch"])
+    lines = daemon.request("ll", no_colors=True, cwd=str(tmp_path))
+    assert len(lines) == 1 and lines[0].startswith("r ")
+
+    # the registry is reloaded after the config changes
+    (config_dir / "repos.csv").write_text(f"{repo},r,,\n{repo},r2,,\n")
+    (config_dir / "groups.csv").write_text("g:r2:\n")
+    assert daemon.request("ls") == ["r r2"]
+    lines = daemon.request("ll", by_group=True, no_colors=True, cwd=str(tmp_path))
+    assert lines[0] == "g:" and lines[1].startswith("   r2 ")
+
+    assert daemon.request("stop", version=0) is None
+
+
+def test_refresh(config_dir, tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    subprocess.run(["git", "init", "-q", str(repo)], check=True)
+    (config_dir / "repos.csv").write_text(f"{repo},r,,\n")
+    monkeypatch.setattr(info, "get_info_items", lambda: ["branch"])
+    state = daemon.State()
+    repos = state.reload()
+    before = state.get_snapshots(repos)["r"]
+    assert state.get_snapshots(repos)["r"] is before
+    state.refresh(repos)
+    assert state.get_snapshots(repos)["r"] is not before
+
+
+def test_ll_worktree_status(config_dir, tmp_path, monkeypatch):
+    """
+    The edits that the watcher misses still show up
+    """
+    repo = tmp_path / "repo"
+    subprocess.run(["git", "init", "-q", str(repo)], check=True)
+    (repo / "sub").mkdir()
+    (repo / "sub" / "f").write_text("a")
+    subprocess.run(["git", "add", "."], cwd=repo, check=True)
+    (config_dir / "repos.csv").write_text(f"{repo},r,,\n")
+    monkeypatch.setattr(info, "get_info_items", lambda: ["branch"])
+    state = daemon.State()
+    message = {"cmd": "ll", "no_colors": True, "cwd": str(tmp_path)}
+    assert "[+" in state.answer(message)["lines"][0]
+    before = state.get_snapshots(state.reload())["r"]
+    (repo / "sub" / "f").write_text("b")
+    assert "[*+" in state.answer(message)["lines"][0]
+    assert state.get_snapshots(state.reload())["r"] is before
+
+
+def test_stop(server, monkeypatch):
+    """
+    The reply is out before the server stops, since `daemon.run` exits then
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    replied = threading.Event()
+    shutdown = server.shutdown
+
+    def check_and_shutdown():
+        # the reply is waiting to be read, unless called by the fixture
+        if client.fileno() != -1 and select.select([client], [], [], 0)[0]:
+            replied.set()
+        shutdown()
+
+    monkeypatch.setattr(server, "shutdown", check_and_shutdown)
+    with client:
+        client.connect(daemon.get_socket_fname())
+        client.sendall(b'{"version": %d, "cmd": "stop"}\n' % daemon.PROTOCOL_VERSION)
+        assert replied.wait(5)
+        assert client.makefile().readline() == '{"lines": []}\n'
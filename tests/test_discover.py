@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from gita import discover
+
+
+def make_repo(path, git_file=False):
+    path.mkdir(parents=True)
+    if git_file:  # worktrees and submodules
+        (path / ".git").write_text("gitdir: ../.git/modules/sub\n")
+    else:
+        (path / ".git" / "objects").mkdir(parents=True)
+
+
+def walk(*roots, **kwargs):
+    return sorted(discover.walk_repos([str(r) for r in roots], **kwargs))
+
+
+def test_walk_repos(tmp_path):
+    make_repo(tmp_path / "a")
+    make_repo(tmp_path / "a" / "sub", git_file=True)
+    make_repo(tmp_path / "b" / "c")
+    make_repo(tmp_path / "b" / "node_modules" / "d")
+    make_repo(tmp_path / "e" / "f" / "g")
+    for name in ("HEAD", "objects", "refs"):
+        (tmp_path / "bare" / name / "x").mkdir(parents=True)
+    make_repo(tmp_path / "bare" / "refs" / "h")
+
+    a, c, d, g = (str(tmp_path / p) for p in ("a", "b/c", "b/node_modules/d", "e/f/g"))
+    assert walk(tmp_path) == [a, c, d, g]
+    assert walk(tmp_path / "a") == [a]
+    assert walk(tmp_path, nested=True) == [a, os.path.join(a, "sub"), c, d, g]
+    assert walk(tmp_path, max_depth=2) == [a, c]
+    assert walk(tmp_path, exclude=["node_modules", "e/f"]) == [a, c]
+    assert walk(tmp_path / "a", tmp_path / "b", tmp_path / "x") == [a, c, d]
+
+
+def test_walk_symlink_loop(tmp_path):
+    make_repo(tmp_path / "a")
+    make_repo(tmp_path / "b" / "c")
+    try:
+        os.symlink(tmp_path, tmp_path / "b" / "loop")
+    except (OSError, NotImplementedError):  # e.g., no privilege on Windows
+        pytest.skip("cannot create symbolic links")
+    assert walk(tmp_path) == [str(tmp_path / "a"), str(tmp_path / "b" / "c")]
+
+
+def test_walk_repos_options(tmp_path):
+    make_repo(tmp_path / "a")
+    make_repo(tmp_path / "a" / "sub", git_file=True)
+    make_repo(tmp_path / ".hidden" / "b")
+    make_repo(tmp_path / "c" / ".d")
+
+    a = str(tmp_path / "a")
+    assert walk(tmp_path) == [a]
+    assert walk(tmp_path / ".hidden") == [str(tmp_path / ".hidden" / "b")]
+    assert walk(tmp_path, hidden=True) == [
+        str(tmp_path / p) for p in (".hidden/b", "a", "c/.d")
+    ]
+    assert walk(tmp_path, nested=True) == [a, os.path.join(a, "sub")]
+    assert walk(tmp_path, nested=True, exclude_submodule=True) == [a]
@@ -0,0 +1,47 @@
+import io
+import os
+
+from gita import display
+
+
+class FakeTerminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_placeholder_rows():
+    assert display.placeholder_rows(["a", "bcd"]) == {"a": "a   ...", "bcd": "bcd ..."}
+    assert display.placeholder_rows([]) == {}
+
+
+def test_not_a_terminal():
+    out = io.StringIO()
+    results = iter([("b", "b row"), ("a", "a row")])
+    display.show_progressively(results, {"a": "", "b": ""}, out=out, prefix="  ")
+    assert out.getvalue() == "  b row\n  a row\n\n  a row\n  b row\n"
+
+
+def test_live_table(monkeypatch):
+    monkeypatch.setattr(
+        display.shutil, "get_terminal_size", lambda: os.terminal_size((80, 24))
+    )
+    out = FakeTerminal()
+    results = iter([("b", "b row"), ("a", "a row")])
+    display.show_progressively(results, {"a": "a ...", "b": "b ..."}, out=out)
+    assert out.getvalue() == (
+        "\x1b[?7la ...\nb ...\n"
+        "\x1b[1A\r\x1b[2Kb row\x1b[1B\r\r\x1b[2K1 pending"
+        "\x1b[2A\r\x1b[2Ka row\x1b[2B\r1 pending"
+        "\r\x1b[2K\x1b[?7h"
+    )
+
+
+def test_too_many_rows(monkeypatch):
+    monkeypatch.setattr(
+        display.shutil, "get_terminal_size", lambda: os.terminal_size((80, 2))
+    )
+    out = FakeTerminal()
+    results = iter([("b", "b row"), ("a", "a row")])
+    display.show_progressively(results, {"a": "a ...", "b": "b ..."}, out=out)
+    # the line wrapping was never disabled, so it is not restored either
+    assert out.getvalue() == "\r\x1b[2K1 pending\r\x1b[2Ka row\nb row\n"
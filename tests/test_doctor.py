@@ -0,0 +1,92 @@
+import subprocess
+
+import pytest
+
+from gita import doctor
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    subprocess.run(["git", "init", "-q", str(path)], check=True)
+    (path / "tracked").write_text("")
+    subprocess.run(["git", "add", "tracked"], cwd=path, check=True)
+    (path / "untracked").write_text("")
+    return {"path": str(path), "flags": []}
+
+
+def test_diagnose(repo):
+    reports = doctor.diagnose({"r": repo})
+    r = reports[0]
+    assert list(r.timings) == list(doctor.CHECKS)
+    assert r.stats == {
+        "index_entries": 1,
+        "untracked": 1,
+        "packs": 0,
+        "loose": 1,
+        "commits": 0,
+    }
+    assert not r.is_bare
+    assert r.dominant in doctor.CHECKS
+    lines = list(doctor.format_reports(reports, 10))
+    assert lines[0] == "The 1 slowest of 1 repos:"
+    assert lines[2].startswith("r ")
+
+
+def test_suggest():
+    r = doctor.Report("r", {"path": "/r", "flags": []})
+    r.timings = {"get_repo_status": 2, "get_head": 1}
+    r.stats = {
+        "index_entries": 1000,
+        "untracked": 0,
+        "packs": 1,
+        "loose": 0,
+        "commits": 1000,
+    }
+    r.settings = {"core.untrackedCache": "", "core.fsmonitor": ""}
+    cmds = [cmd for s in r.suggest() for cmd in s.cmds]
+    assert ["git", "config", "core.untrackedCache", "true"] in cmds
+    assert ["git", "commit-graph", "write", "--reachable"] in cmds
+
+    r.settings["core.untrackedCache"] = "true"
+    r.has_commit_graph = True
+    assert r.suggest() == []
+
+
+def test_suggest_small_or_bare():
+    r = doctor.Report("r", {"path": "/r", "flags": []})
+    r.timings = {"get_repo_status": 2, "get_head": 1}
+    r.stats = {
+        "index_entries": 999,
+        "untracked": 0,
+        "packs": 1,
+        "loose": 0,
+        "commits": 999,
+    }
+    r.settings = {"core.untrackedCache": "", "core.fsmonitor": ""}
+    assert r.suggest() == []
+
+    r.stats.update(index_entries=20000, commits=0)
+    r.is_bare = True
+    assert r.suggest() == []
+
+
+def test_diagnose_bare(tmp_path):
+    path = tmp_path / "bare"
+    subprocess.run(["git", "init", "-q", "--bare", str(path)], check=True)
+    reports = doctor.diagnose({"b": {"path": str(path), "flags": []}})
+    assert reports[0].is_bare
+
+
+def test_apply(repo):
+    reports = doctor.diagnose({"r": repo})
+    reports[0].timings["get_repo_status"] = 100
+    reports[0].stats.update(index_entries=1000, commits=1000)
+    assert list(doctor.apply(reports)) == [
+        "r: git config core.untrackedCache true (done)",
+        "r: git commit-graph write --reachable (done)",
+        "r: git config fetch.writeCommitGraph true (done)",
+    ]
+    settings = doctor.get_git_settings(repo)
+    assert settings["core.untrackedCache"] == "true"
@@ -0,0 +1,116 @@
+import subprocess
+
+import pytest
+
+from gita import gitdir, info
+
+
+def git(*args, cwd):
+    subprocess.run(
+        ["git", "-c", "user.name=a", "-c", "user.email=a@b", *args],
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    git("init", "-b", "main", cwd=path)
+    (path / "a").write_text("a")
+    git("add", "a", cwd=path)
+    git("commit", "-m", "first", cwd=path)
+    return path
+
+
+def test_regular_repo(repo):
+    git_dir = gitdir.find(repo)
+    assert git_dir == repo / ".git"
+    ref, sha = gitdir.read_head(git_dir)
+    assert ref == "refs/heads/main"
+    assert len(sha) == 40
+    assert gitdir.get_branch(git_dir) == "main"
+    assert info.get_head(str(repo)) == "main"
+    assert not gitdir.has_stash(git_dir)
+
+
+def test_packed_refs_and_stash(repo):
+    git("pack-refs", "--all", cwd=repo)
+    git_dir = gitdir.find(repo)
+    assert not (git_dir / "refs" / "heads" / "main").exists()
+    _, sha = gitdir.read_head(git_dir)
+    assert sha == gitdir.get_packed_refs(git_dir)["refs/heads/main"]
+
+    (repo / "a").write_text("b")
+    git("stash", cwd=repo)
+    assert gitdir.has_stash(git_dir)
+    assert info.has_stashed([], str(repo))
+
+
+def test_worktree(repo, tmp_path):
+    wt = tmp_path / "wt"
+    git("worktree", "add", "-b", "feature", str(wt), cwd=repo)
+    git_dir = gitdir.find(wt)
+    assert git_dir.parent == repo / ".git" / "worktrees"
+    assert gitdir.get_common_dir(git_dir).resolve() == (repo / ".git").resolve()
+    assert gitdir.get_branch(git_dir) == "feature"
+    # the branch ref is in the common dir
+    assert gitdir.read_head(git_dir)[1] == gitdir.read_head(repo / ".git")[1]
+
+
+def test_bare_and_detached(repo, tmp_path):
+    bare = tmp_path / "bare.git"
+    git("clone", "--bare", str(repo), str(bare), cwd=tmp_path)
+    assert gitdir.find(bare) == bare
+    assert gitdir.get_branch(bare) == "main"
+
+    git("checkout", "--detach", cwd=repo)
+    assert gitdir.get_branch(gitdir.find(repo)) is None
+    assert gitdir.find(tmp_path) is None
+
+
+def test_upstream_and_url(repo, tmp_path):
+    clone = tmp_path / "clone"
+    git("clone", str(repo), str(clone), cwd=tmp_path)
+    git_dir = gitdir.find(clone)
+    assert gitdir.get_upstream(git_dir, "main") == ("origin", "refs/heads/main")
+    assert gitdir.get_upstream_ref(git_dir, "main") == "refs/remotes/origin/main"
+    assert gitdir.get_upstream(git_dir, "other") == ("", "")
+    assert gitdir.get_remote_url(git_dir) == str(repo)
+    assert gitdir.get_remote_url(gitdir.find(repo)) == ""
+
+
+def test_reftable(repo):
+    # the layout of `git init --ref-format=reftable`, which needs git 2.45
+    git("config", "extensions.refStorage", "reftable", cwd=repo)
+    assert gitdir.read_config(repo / ".git") is None
+    (repo / ".git" / "reftable").mkdir()
+    (repo / ".git" / "HEAD").write_text("ref: refs/heads/.invalid\n")
+    assert gitdir.find(repo) is None
+
+
+def test_parse_config():
+    text = """
+# comment
+[core]
+    bare = false
+    filemode
+[remote "My Origin"]
+    url = "git@x.com:a/b.git" ; comment
+    fetch = +refs/heads/*:refs/remotes/My Origin/*
+[Branch "dev"] merge = refs/heads/dev
+[alias]
+    lg = log \\
+--oneline
+"""
+    assert gitdir.parse_config(text) == [
+        ("core.bare", "false"),
+        ("core.filemode", "true"),
+        ("remote.My Origin.url", "git@x.com:a/b.git"),
+        ("remote.My Origin.fetch", "+refs/heads/*:refs/remotes/My Origin/*"),
+        ("branch.dev.merge", "refs/heads/dev"),
+        ("alias.lg", "log --oneline"),
+    ]
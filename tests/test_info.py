@@ -1,8 +1,17 @@
+import asyncio
+import os
 import subprocess
+import sys
+import time
+
+import pytest
 from unittest.mock import patch, MagicMock
 
 from gita import info
 
+# a command that outlives the timeouts of the tests
+SLEEP = [sys.executable, "-c", "import time; time.sleep(10)"]
+
 
 @patch("subprocess.run")
 def test_run_quiet_diff(mock_run):
@@ -13,5 +22,270 @@ def test_run_quiet_diff(mock_run):
         ["git", "--flags", "diff", "--quiet", "my", "args"],
         stderr=subprocess.DEVNULL,
         cwd="/a/b/c",
+        timeout=None,
     )
     assert got == mock_return.returncode
+
+
+@pytest.mark.parametrize(
+    "output, expected",
+    [
+        (
+            "# branch.oid abc\n# branch.head master\n",
+            ("master", "", "", "", "", "no_remote", 0, 0),
+        ),
+        (
+            "# branch.oid (initial)\n# branch.head main\n? new.txt\n",
+            ("main", "", "", "untracked", "", "no_remote", 0, 0),
+        ),
+        (
+            "# branch.oid abc\n# branch.head dev\n# branch.upstream origin/dev\n"
+            "# branch.ab +0 -0\n",
+            ("dev", "", "", "", "", "in_sync", 0, 0),
+        ),
+        (
+            "# branch.oid abc\n# branch.head dev\n# branch.upstream origin/dev\n"
+            "# branch.ab +2 -0\n# stash 3\n1 .M N... 100644 100644 100644 a b f\n",
+            ("dev", "dirty", "", "", "stashed", "local_ahead", 2, 0),
+        ),
+        (
+            "# branch.oid abc\n# branch.head dev\n# branch.upstream origin/dev\n"
+            "# branch.ab +0 -1\n1 A. N... 000000 100644 100644 a b f\n",
+            ("dev", "", "staged", "", "", "remote_ahead", 0, 1),
+        ),
+        (
+            "# branch.oid abc\n# branch.head (detached)\n"
+            "2 RM N... 100644 100644 100644 a b R100 new\\told\n",
+            (None, "dirty", "staged", "", "", "no_remote", 0, 0),
+        ),
+        (
+            "# branch.oid abc\n# branch.head x\n# branch.upstream origin/x\n"
+            "# branch.ab +1 -4\nu UU N... 100644 100644 100644 100644 a b c f\n",
+            ("x", "dirty", "staged", "", "", "diverged", 1, 4),
+        ),
+    ],
+)
+def test_parse_porcelain_status(output, expected):
+    assert info.parse_porcelain_status(output) == expected
+
+
+@patch("gita.info._get_repo_status", return_value=("", "", "", "", "in_sync", 0, 0))
+@patch("gita.info.get_head", return_value="old")
+@patch("subprocess.run")
+def test_get_status_fallback(mock_run, *_):
+    mock_run.return_value.returncode = 129  # unknown option
+    got = info.get_status({"path": "/a/b", "flags": []})
+    assert got == ("old", "", "", "", "", "in_sync", 0, 0)
+
+
+@pytest.mark.parametrize(
+    "returncode, stdout, expected",
+    [
+        (128, "", None),
+        (0, "3\t2\n", (2, 3)),
+    ],
+)
+@patch("subprocess.run")
+def test_get_ahead_behind_counts(mock_run, returncode, stdout, expected):
+    mock_run.return_value.returncode = returncode
+    mock_run.return_value.stdout = stdout
+    assert info.get_ahead_behind_counts(["--flags"], "/a/b") == expected
+    assert mock_run.call_args[0][0] == [
+        "git",
+        "--flags",
+        "rev-list",
+        "--left-right",
+        "--count",
+        "@{u}...HEAD",
+    ]
+
+
+@pytest.mark.parametrize(
+    "ahead, behind, expected",
+    [(0, 0, ""), (2, 0, "↑2"), (0, 3, "↓3"), (2, 3, "↑2 ↓3")],
+)
+def test_get_ahead_behind(ahead, behind, expected):
+    status = info.RepoStatus("dev", "", "", "", "", "", ahead, behind)
+    snap = info.RepoSnapshot({"path": "/a/b", "flags": []})
+    snap.__dict__["status"] = status
+    assert info.get_ahead_behind(snap, info.Truncate()) == expected
+
+
+@patch("gita.info.get_info_items", return_value=["branch_name", "branch", "branch"])
+@patch("gita.info.get_head")
+@patch("gita.info.get_status")
+def test_snapshot_shared_by_info_items(mock_status, mock_head, _):
+    mock_status.return_value = info.RepoStatus("dev", "", "", "", "", "in_sync")
+    snap = info.RepoSnapshot({"path": "/a/b", "flags": []})
+    truncator = info.Truncate()
+    for f in info.get_info_funcs(no_colors=True):
+        f(snap, truncator)
+    mock_status.assert_called_once()
+    mock_head.assert_called_once_with("/a/b")
+
+    # the head comes with the status if that is computed first
+    mock_head.reset_mock()
+    snap = info.RepoSnapshot({"path": "/a/b", "flags": []})
+    assert info.get_repo_status(snap, truncator, no_colors=True).startswith("dev")
+    assert info.get_repo_branch(snap, truncator) == "dev"
+    mock_head.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "seconds, expected",
+    [
+        (-5, "in the future"),
+        (1, "1 second ago"),
+        (89, "89 seconds ago"),
+        (90, "2 minutes ago"),
+        (3600, "60 minutes ago"),
+        (5400, "2 hours ago"),
+        (86400, "24 hours ago"),
+        (3 * 86400, "3 days ago"),
+        (20 * 86400, "3 weeks ago"),
+        (100 * 86400, "3 months ago"),
+        (365 * 86400, "1 year ago"),
+        (400 * 86400, "1 year, 1 month ago"),
+        (800 * 86400, "2 years, 2 months ago"),
+        (3000 * 86400, "8 years ago"),
+    ],
+)
+def test_get_relative_time(seconds, expected):
+    assert info.get_relative_time(1000000000 - seconds, now=1000000000) == expected
+
+
+def test_last_commit(tmp_path):
+    env = {**os.environ, "GIT_COMMITTER_DATE": "1600000000 +0000"}
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    snap = info.RepoSnapshot({"path": str(tmp_path), "flags": []})
+    assert snap.last_commit == ("", None, "") and snap.commit_time == ""
+    subprocess.run(
+        ["git", "-c", "user.name=x", "-c", "user.email=x@y", "commit"]
+        + ["-q", "--allow-empty", "-m", "subject"],
+        cwd=tmp_path,
+        env=env,
+        check=True,
+    )
+    snap = info.RepoSnapshot({"path": str(tmp_path), "flags": []})
+    assert snap.last_commit.time == 1600000000
+    assert snap.commit_msg == "subject"
+    assert snap.commit_time == info.get_relative_time(1600000000)
+
+
+def test_has_untracked(tmp_path):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    assert not info.has_untracked([], tmp_path)
+    for i in range(100):
+        (tmp_path / f"f{i}").write_text("")
+    assert info.has_untracked([], tmp_path)
+
+
+@pytest.mark.parametrize(
+    "policy, expected",
+    [(None, "untracked"), ("full", "untracked"), ("off", "untracked_unknown")],
+)
+def test_untracked_policy(tmp_path, policy, expected):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    (tmp_path / "new").write_text("")
+    prop = {"path": str(tmp_path), "flags": []}
+    if policy:
+        prop["untracked"] = policy
+    assert ("--untracked-files=no" in info._status_cmd(prop, None)[0]) == (
+        policy == "off"
+    )
+    assert info.get_status(prop).untracked == expected
+    assert info._get_repo_status(prop)[2] == expected
+    snap = info.RepoSnapshot(prop)
+    asyncio.run(snap.prefetch(["branch"]))
+    assert snap.__dict__["status"].untracked == expected
+
+
+def test_prefetch_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr(info, "_status_cmd", lambda *_: (SLEEP, None))
+    snap = info.RepoSnapshot({"path": str(tmp_path), "flags": []})
+    start = time.monotonic()
+    asyncio.run(snap.prefetch(["branch"], deadline=start + 0.2))
+    assert snap.timed_out
+    assert "status" not in snap.__dict__
+    assert time.monotonic() - start < 5
+
+
+def test_sync_timeout(tmp_path):
+    token = info._deadline.set(time.monotonic() + 0.2)
+    try:
+        with pytest.raises(subprocess.TimeoutExpired):
+            info.run_git(SLEEP, str(tmp_path))
+    finally:
+        info._deadline.reset(token)
+
+
+def test_is_in_states(tmp_path):
+    def git(*args, cwd=tmp_path):
+        subprocess.run(
+            ["git", "-c", "user.name=x", "-c", "user.email=x@y", *args],
+            cwd=cwd,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    git("init", "-q", "-b", "main", "origin")
+    git("commit", "-q", "--allow-empty", "-m", "first", cwd=tmp_path / "origin")
+    git("clone", "-q", "origin", "clone")
+    prop = {"path": str(tmp_path / "clone"), "flags": []}
+
+    def states():
+        return [
+            s for s in info.ONLY_STATES if asyncio.run(info.is_in_states(prop, [s]))
+        ]
+
+    assert info.read_situation(prop["path"]) == "in_sync"
+    assert states() == []
+    git("commit", "-q", "--allow-empty", "-m", "second", cwd=prop["path"])
+    assert info.read_situation(prop["path"]) is None
+    assert states() == ["ahead"]
+    (tmp_path / "clone" / "f").write_text("")
+    git("add", "f", cwd=prop["path"])
+    assert states() == ["dirty", "ahead"]
+    git("stash", "-q", cwd=prop["path"])
+    assert states() == ["ahead", "stashed"]
+    git("checkout", "-q", "--detach", cwd=prop["path"])
+    assert states() == ["no-remote", "stashed"]
+
+
+def test_stash_without_show_stash(tmp_path):
+    """
+    git before 2.35 accepts `--show-stash`, but leaves out the `# stash` line
+    """
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    (tmp_path / ".git" / "refs" / "stash").write_text("0" * 40 + "\n")
+    prop = {"path": str(tmp_path), "flags": []}
+    output = "# branch.oid abc\n# branch.head main\n"
+    with patch("gita.info.run_git", return_value=(0, output)):
+        assert info.get_status(prop).stashed == "stashed"
+
+    async def run_git_async(*_):
+        return 0, output
+
+    snap = info.RepoSnapshot(prop)
+    with patch("gita.info.run_git_async", new=run_git_async):
+        asyncio.run(snap.prefetch(["branch"]))
+    assert snap.__dict__["status"].stashed == "stashed"
+
+
+def test_prefetch_fallback_timeout(tmp_path, monkeypatch):
+    """
+    The synchronous fallback of a failed `git status` doesn't block the event
+    loop, so the deadline still applies
+    """
+    monkeypatch.setattr(info, "_status_cmd", lambda *_: (["false"], None))
+    monkeypatch.setattr(info, "_get_repo_status", lambda _: time.sleep(1))
+    snap = info.RepoSnapshot({"path": str(tmp_path), "flags": []})
+
+    async def prefetch():
+        start = time.monotonic()
+        await snap.prefetch(["branch"], deadline=start + 0.2)
+        return time.monotonic() - start
+
+    assert asyncio.run(prefetch()) < 0.8
+    assert snap.timed_out
@@ -4,6 +4,7 @@ from pathlib import Path
 import argparse
 import asyncio
 import shlex
+import subprocess
 
 from gita import __main__
 from gita import utils, info
@@ -13,7 +14,6 @@ from conftest import (
     PATH_FNAME_CLASH,
     GROUP_FNAME,
     async_mock,
-    TEST_DIR,
 )
 
 
@@ -25,6 +25,24 @@ def test_group_name(_):
         __main__._group_name("aa")
 
 
+@patch("gita.utils.get_groups")
+def test_only_chosen_parser_is_built(mock_groups, monkeypatch, capfd):
+    monkeypatch.setattr(utils, "get_repos", lambda: {"repo1": {"path": "/a/"}})
+    __main__.main(["ls"])
+    assert capfd.readouterr().out == "repo1\n"
+    mock_groups.assert_not_called()
+
+
+def test_here(monkeypatch, tmp_path, capfd):
+    index = utils.PathIndex({"r": {"path": str(tmp_path)}})
+    monkeypatch.setattr(utils, "get_repo_index", lambda: index)
+    monkeypatch.setattr(utils, "get_repos", lambda: {"r": {"path": str(tmp_path)}})
+    monkeypatch.chdir(tmp_path)
+    __main__.main(["here"])
+    __main__.main(["here", "ls"])
+    assert capfd.readouterr().out == f"r\n{tmp_path}\n"
+
+
 class TestAdd:
     @pytest.mark.parametrize(
         "input, expected",
@@ -140,16 +158,18 @@ class TestLsLl:
         ],
     )
     @patch("gita.utils.is_git", return_value=True)
-    @patch("gita.info.get_head", return_value="master")
     @patch(
-        "gita.info._get_repo_status",
-        return_value=("dirty", "staged", "untracked", "", "diverged"),
+        "gita.info.get_status",
+        return_value=info.RepoStatus(
+            "master", "dirty", "staged", "untracked", "", "diverged"
+        ),
     )
     @patch("gita.info.get_commit_msg", return_value="msg")
     @patch("gita.info.get_commit_time", return_value="")
+    @patch("gita.info.RepoSnapshot.prefetch", new=async_mock())
     @patch("gita.common.get_config_fname")
     def test_with_path_files(
-        self, mock_path_fname, _0, _1, _2, _3, _4, path_fname, expected, capfd
+        self, mock_path_fname, _0, _1, _2, _3, path_fname, expected, capfd
     ):
         def side_effect(input, _=None):
             if input == "repos.csv":
@@ -182,6 +202,27 @@ def test_freeze(mock_repos, mock_run, input, expected, capfd):
     assert out == expected
 
 
+def test_freeze_global_url_rewrite(tmp_path, monkeypatch, capfd):
+    repo = tmp_path / "repo"
+    subprocess.run(["git", "init", "-q", str(repo)], check=True)
+    subprocess.run(
+        ["git", "remote", "add", "origin", "https://example.com/r.git"],
+        cwd=repo,
+        check=True,
+    )
+    (tmp_path / ".gitconfig").write_text(
+        '[url "https://mirror.local/"]\n\tinsteadOf = https://example.com/\n'
+    )
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(
+        utils, "get_repos", lambda: {"r": {"path": str(repo), "type": "", "flags": []}}
+    )
+    monkeypatch.setattr(utils, "get_groups", lambda: {})
+    monkeypatch.setattr(utils, "get_context", lambda: None)
+    __main__.main(["freeze"])
+    assert capfd.readouterr().out.startswith("https://mirror.local/r.git,r,")
+
+
 @patch("subprocess.run")
 def test_clone_with_url(mock_run):
     args = argparse.Namespace()
@@ -310,6 +351,28 @@ def test_superman(mock_run, _, input):
     mock_run.assert_called_once_with(expected_cmds, cwd="path7", shell=False)
 
 
+@patch(
+    "gita.utils.get_repos",
+    return_value={
+        "repo1": {"path": "/a/bc", "flags": []},
+        "repo2": {"path": "/d/efg", "flags": []},
+    },
+)
+@patch("gita.info.is_in_states")
+@patch("subprocess.run")
+def test_only(mock_run, mock_is_in_states, _):
+    async def is_in_states(prop, states, cache):
+        assert states == ["ahead", "diverged"]
+        return prop["path"] == "/d/efg"
+
+    mock_is_in_states.side_effect = is_in_states
+    __main__.main(["push", "--only", "ahead", "--only", "diverged"])
+    mock_run.assert_called_once_with(["git", "push"], cwd="/d/efg", shell=False)
+    mock_run.reset_mock()
+    __main__.main(["super", "--only", "ahead", "--only", "diverged", "log"])
+    mock_run.assert_called_once_with(["git", "log"], cwd="/d/efg", shell=False)
+
+
 @pytest.mark.parametrize(
     "input",
     [
@@ -351,19 +414,20 @@ class TestContext:
         mock_ctx.return_value.unlink.assert_called()
 
     @patch("gita.utils.get_context", return_value=None)
-    @patch("gita.common.get_config_dir", return_value=TEST_DIR)
+    @patch("gita.common.get_config_dir")
     @patch("gita.utils.get_groups", return_value={"lala": ["b"], "kaka": []})
-    def test_set_first_time(self, *_):
-        ctx = TEST_DIR / "lala.context"
+    def test_set_first_time(self, _, mock_dir, __, tmp_path):
+        mock_dir.return_value = tmp_path
+        ctx = tmp_path / "lala.context"
         assert not ctx.is_file()
         __main__.main(["context", "lala"])
         assert ctx.is_file()
-        ctx.unlink()
 
-    @patch("gita.common.get_config_dir", return_value=TEST_DIR)
+    @patch("gita.common.get_config_dir")
     @patch("gita.utils.get_groups", return_value={"lala": ["b"], "kaka": []})
     @patch("gita.utils.get_context")
-    def test_set_second_time(self, mock_ctx, *_):
+    def test_set_second_time(self, mock_ctx, _, mock_dir, tmp_path):
+        mock_dir.return_value = tmp_path
         __main__.main(["context", "kaka"])
         mock_ctx.return_value.rename.assert_called()
 
@@ -541,7 +605,8 @@ class TestInfo:
         __main__.f_info(args)
         out, err = capfd.readouterr()
         assert (
-            "In use: branch,commit_msg,commit_time\nUnused: branch_name,path\n" == out
+            "In use: branch,commit_msg,commit_time\nUnused: ahead_behind,branch_name,path\n"
+            == out
         )
         assert err == ""
 
@@ -0,0 +1,65 @@
+import pytest
+
+from gita.model import Group, Registry, Repo
+
+
+def test_repo_is_a_mapping():
+    repo = Repo("/a/r1", "", "--x --y".split())
+    assert repo == {"path": "/a/r1", "type": "", "flags": ["--x", "--y"]}
+    assert "untracked" not in repo
+    repo["untracked"] = "off"
+    repo["flags"] = "--z"
+    assert dict(repo) == {
+        "path": "/a/r1",
+        "type": "",
+        "flags": ["--z"],
+        "untracked": "off",
+    }
+    del repo["untracked"]
+    assert len(repo) == 3
+    # the flags are the stored list
+    repo["flags"].append("--w")
+    assert repo["flags"] == ["--z", "--w"]
+    with pytest.raises(KeyError):
+        repo["other"] = 1
+    assert not hasattr(repo, "__dict__")
+
+
+def test_group_members():
+    group = Group(["b", "a"], "/x")
+    assert group == {"repos": ["b", "a"], "path": "/x"}
+    members = group["repos"]
+    members.append("c")
+    members.remove("b")
+    assert "c" in members and "b" not in members
+    assert group["repos"] == ["a", "c"]
+    with pytest.raises(ValueError):
+        members.remove("b")
+    group["repos"] = sorted(["z", "y"])
+    assert group["repos"] == ["y", "z"] and group["repos"] != ["z", "y"]
+
+
+def test_registry():
+    repos = {
+        "r1": Repo("/a/r1"),
+        "r2": Repo("/a/r1/r2"),
+        "r3": Repo("/b/r3"),
+    }
+    groups = {"g1": Group(["r1", "r2"], "/a"), "g2": Group(["r2"])}
+    registry = Registry(repos, groups)
+    assert registry.by_path.find("/a/r1/r2/src") == "r2"
+    assert registry.groups_of("r2") == ["g1", "g2"]
+    assert list(registry.expand(["g1", "r3"])) == ["r1", "r2", "r3"]
+
+    registry.rename_repo("r2", "a2")
+    assert groups["g1"]["repos"] == ["r1", "a2"]
+    assert registry.groups_of("a2") == ["g1", "g2"]
+    assert registry.by_path.find("/a/r1/r2") == "a2"
+
+    assert registry.remove_repo("a2")
+    assert not registry.remove_repo("r3")
+    assert list(repos) == ["r1"]
+    assert groups == {
+        "g1": {"repos": ["r1"], "path": "/a"},
+        "g2": {"repos": [], "path": ""},
+    }
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from gita import profiling
+
+
+@pytest.mark.parametrize(
+    "argv, expected",
+    [
+        (["git", "status"], "git status"),
+        (["git", "--no-optional-locks", "-C", "x", "status", "-s"], "git status"),
+        ("git symbolic-ref -q --short HEAD || git describe", "git symbolic-ref"),
+        (["ls", "-l"], "ls"),
+        (["git"], "git"),
+    ],
+)
+def test_get_command_type(argv, expected):
+    assert profiling.get_command_type(argv) == expected
+
+
+def test_percentile():
+    values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert profiling.percentile(values, 0.5) == 5
+    assert profiling.percentile(values, 0.95) == 10
+    assert profiling.percentile([3], 0.5) == 3
+
+
+def test_record(tmp_path):
+    async def run_async():
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-c",
+            "print('abc', end='')",
+            stdout=asyncio.subprocess.PIPE,
+            cwd=tmp_path,
+        )
+        await process.communicate()
+
+    profiling.enable()
+    try:
+        subprocess.run(["git", "version"], stdout=subprocess.PIPE, cwd=tmp_path)
+        asyncio.run(run_async())
+    finally:
+        spawns = profiling.disable()
+    assert subprocess.Popen is not profiling._Popen
+    python = os.path.basename(sys.executable)
+    assert [s.command for s in spawns] == ["git version", python]
+    assert all(s.returncode == 0 and s.seconds > 0 for s in spawns)
+    assert spawns[1].nbytes == 3
+    lines = list(profiling.summarize(spawns, {str(tmp_path): "repo"}))
+    assert lines[0].startswith("2 processes spawned")
+    assert lines[-1].startswith("repo ")
+    assert lines[-1].endswith("in 2 processes")
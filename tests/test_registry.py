@@ -0,0 +1,50 @@
+import os
+import time
+
+import pytest
+
+from gita import registry
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITA_PROJECT_HOME", str(tmp_path))
+    config = tmp_path / "gita"
+    config.mkdir()
+    (config / "repos.csv").write_text("/a/r1,r1,,--x --y\n/b/r2,r2,,,ignore\n")
+    (config / "groups.csv").write_text("g1:r1 r2:/a\n")
+    return config
+
+
+def _age(*paths):
+    old = time.time() - 10
+    for p in paths:
+        os.utime(p, (old, old))
+
+
+def test_load(config, monkeypatch):
+    _age(config / "repos.csv", config / "groups.csv")
+    got = registry.load()
+    assert got["repos"] == [
+        ("/a/r1", "r1", "", ["--x", "--y"], ""),
+        ("/b/r2", "r2", "", [], "ignore"),
+    ]
+    assert got["groups"] == [("g1", ["r1", "r2"], "/a")]
+    assert "fetch" in got["cmds"]
+    assert (config / registry.SNAPSHOT_FNAME).is_file()
+
+    def fail(*_):
+        pytest.fail("not cached")
+
+    with monkeypatch.context() as m:
+        m.setattr(registry, "compile_registry", fail)
+        assert registry.load() == got
+
+    # the snapshot is stale after the source changes
+    (config / "repos.csv").write_text("/a/r1,r1,,\n")
+    assert registry.load()["repos"] == [("/a/r1", "r1", "", [], "")]
+
+
+def test_racy_source_is_not_saved(config):
+    registry.load()
+    assert not (config / registry.SNAPSHOT_FNAME).exists()
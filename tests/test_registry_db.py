@@ -0,0 +1,61 @@
+from contextlib import closing
+
+import pytest
+
+from gita import __main__, registry_db, utils
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITA_PROJECT_HOME", str(tmp_path))
+    registry_db.import_rows(
+        [("/a/r1", "r1", "", ["--x"], ""), ("/b/r2", "r2", "", [], "off")],
+        [("g1", ["r1", "r2"], "/a")],
+    )
+    assert registry_db.is_enabled()
+
+
+def test_import(db):
+    assert registry_db.read_repos() == [
+        ("/a/r1", "r1", "", ["--x"], ""),
+        ("/b/r2", "r2", "", [], "off"),
+    ]
+    assert registry_db.read_groups() == [("g1", ["r1", "r2"], "/a")]
+
+
+def test_import_keeps_database(db, tmp_path, capfd):
+    (tmp_path / "gita" / "repos.csv").write_text("/c/r3,r3,,\n")
+    with pytest.raises(SystemExit):
+        __main__.main(["registry", "import"])
+    assert "--force" in capfd.readouterr().out
+    assert [row[1] for row in registry_db.read_repos()] == ["r1", "r2"]
+    __main__.main(["registry", "import", "--force"])
+    assert registry_db.read_repos() == [("/c/r3", "r3", "", [], "")]
+
+
+def test_write_keeps_concurrent_changes(db):
+    registry_db.read_repos()
+    registry_db.read_groups()
+    # another process adds a repo and a group meanwhile
+    with closing(registry_db.connect()) as conn, conn:
+        conn.execute("INSERT INTO repos (name, path) VALUES ('r3', '/c/r3')")
+        gid = conn.execute("INSERT INTO groups (name) VALUES ('g2')").lastrowid
+        conn.execute("INSERT INTO memberships VALUES (?, 'r3', 0)", (gid,))
+
+    repos = {"r1": {"path": "/a/r1", "type": "", "flags": ["--y"]}}
+    registry_db.write_repos(repos, "w")
+    registry_db.write_groups({"g1": {"repos": ["r1"], "path": "/a"}}, "w")
+    assert registry_db.read_repos() == [
+        ("/a/r1", "r1", "", ["--y"], ""),
+        ("/c/r3", "r3", "", [], ""),
+    ]
+    assert registry_db.read_groups() == [("g1", ["r1"], "/a"), ("g2", ["r3"], "")]
+
+
+def test_rename_repo(db, monkeypatch):
+    monkeypatch.setattr(utils, "get_groups", lambda: pytest.fail("not needed"))
+    repos = {"r1": {"path": "/a/r1"}, "r2": {"path": "/b/r2"}}
+    utils.rename_repo(repos, "r1", "one")
+    assert list(repos) == ["r2", "one"]
+    assert [r[1] for r in registry_db.read_repos()] == ["one", "r2"]
+    assert registry_db.read_groups() == [("g1", ["one", "r2"], "/a")]
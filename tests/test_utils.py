@@ -1,16 +1,21 @@
 import pytest
 import asyncio
+import json
+import multiprocessing
+import os
 import subprocess
+import sys
 from pathlib import Path
 from unittest.mock import patch, mock_open
 
-from gita import utils, info
+from gita import common, utils, info
 from conftest import (
     PATH_FNAME,
     PATH_FNAME_EMPTY,
     PATH_FNAME_CLASH,
     GROUP_FNAME,
     TEST_DIR,
+    async_mock,
 )
 
 
@@ -130,12 +135,14 @@ def test_auto_group(repos, paths, expected):
     ],
 )
 def test_describe(test_input, diff_return, expected, monkeypatch):
-    monkeypatch.setattr(info, "get_head", lambda x: "repo")
-    monkeypatch.setattr(info, "run_quiet_diff", lambda *_: diff_return)
+    if diff_return:
+        status = info.RepoStatus("repo", "dirty", "staged", "untracked", "", "diverged")
+    else:
+        status = info.RepoStatus("repo", "", "", "untracked", "", "in_sync")
+    monkeypatch.setattr(info, "get_status", lambda *_: status)
+    monkeypatch.setattr(info.RepoSnapshot, "prefetch", async_mock())
     monkeypatch.setattr(info, "get_commit_msg", lambda *_: "msg")
     monkeypatch.setattr(info, "get_commit_time", lambda *_: "xx")
-    monkeypatch.setattr(info, "has_untracked", lambda *_: True)
-    monkeypatch.setattr(info, "get_common_commit", lambda x: "")
 
     info.get_color_encoding.cache_clear()  # avoid side effect
     assert expected == next(utils.describe(*test_input))
@@ -185,6 +192,36 @@ def test_get_context(mock_config_dir):
     assert utils.get_context() == None
 
 
+def test_path_index():
+    index = utils.PathIndex(
+        {
+            "outer": {"path": "/a/b"},
+            "inner": {"path": "/a/b/c/"},
+            "same": {"path": "/a/b"},
+            "none": {"path": ""},
+        }
+    )
+    assert index.find("/a/b/c/d/e") == "inner"
+    assert index.find("/a/b/cd") == "outer"
+    assert index.find("/a/b") == "outer"
+    assert index.find("/a") is None
+
+
+def test_get_context_auto(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITA_PROJECT_HOME", str(tmp_path))
+    (tmp_path / "gita").mkdir()
+    (tmp_path / "gita" / "auto.context").write_text("")
+    groups = {"top": {"path": "/a", "repos": []}, "sub": {"path": "/a/b", "repos": []}}
+    monkeypatch.setattr(utils, "get_groups", lambda: groups)
+    utils.get_group_index.cache_clear()
+    utils.get_context.cache_clear()
+    assert utils.get_context(Path("/a/b/c")).name == "sub.context"
+    assert utils.get_context(Path("/a/x")).name == "top.context"
+    assert utils.get_context(Path("/x")) is None
+    utils.get_group_index.cache_clear()
+    utils.get_context.cache_clear()
+
+
 @pytest.mark.parametrize(
     "group_fname, expected",
     [
@@ -205,14 +242,13 @@ def test_get_groups(_, mock_group_fname, group_fname, expected):
     assert utils.get_groups() == expected
 
 
-@patch("os.path.isfile", return_value=True)
-@patch("os.path.getsize", return_value=True)
-def test_custom_push_cmd(*_):
-    with patch(
-        "builtins.open",
-        mock_open(read_data='{"push":{"cmd":"hand","help":"me","allow_all":true}}'),
-    ):
-        cmds = utils.get_cmds_from_files()
+def test_custom_push_cmd(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITA_PROJECT_HOME", str(tmp_path))
+    (tmp_path / "gita").mkdir()
+    (tmp_path / "gita" / "cmds.json").write_text(
+        '{"push":{"cmd":"hand","help":"me","allow_all":true}}'
+    )
+    cmds = utils.get_cmds_from_files()
     assert cmds["push"] == {"cmd": "hand", "help": "me", "allow_all": True}
 
 
@@ -233,6 +269,7 @@ def test_custom_push_cmd(*_):
 @patch("os.makedirs")
 @patch("gita.utils.is_git", return_value=True)
 def test_add_repos(_0, _1, path_input, expected, monkeypatch):
+    monkeypatch.delenv("GITA_PROJECT_HOME")
     monkeypatch.setenv("XDG_CONFIG_HOME", "/config")
     with patch("builtins.open", mock_open()) as mock_file:
         utils.add_repos({"repo": {"path": "/nos/repo"}}, path_input)
@@ -248,6 +285,20 @@ def test_add_repos(_0, _1, path_input, expected, monkeypatch):
         assert not kwargs
 
 
+def test_add_repos_lazily(capsys):
+    def walk():
+        yield "/a/r1"
+        # reported before the walk goes on
+        assert capsys.readouterr().out == "/a/r1\n"
+        yield "/a/r1"
+        yield "/b/r2"
+
+    with patch("gita.utils.is_git") as is_git:
+        utils.add_repos({}, walk(), dry_run=True, validated=True)
+    is_git.assert_not_called()
+    assert capsys.readouterr().out == "/b/r2\nFound 2 new repo(s).\n"
+
+
 @patch("gita.utils.write_to_groups_file")
 @patch("gita.utils.write_to_repo_file")
 def test_rename_repo(mock_write, _):
@@ -284,3 +335,162 @@ def test_is_git(tmpdir):
         subprocess.run("git init --bare .".split())
         assert utils.is_git(Path.cwd()) is False
         assert utils.is_git(Path.cwd(), include_bare=True) is True
+        subprocess.run("git config core.bare false".split())
+        assert utils.is_git(Path.cwd(), include_bare=True) is False
+
+
+@patch("gita.common.get_config_fname")
+def test_get_repos_caches_validation(mock_fname, tmp_path, monkeypatch):
+    mock_fname.side_effect = lambda fname: str(tmp_path / fname)
+    bare = tmp_path / "bare"
+    subprocess.run(["git", "init", "-q", "--bare", str(bare)], check=True)
+    (tmp_path / "repos.csv").write_text(f"{bare},bare,,\n")
+    utils.get_repos.cache_clear()
+    assert list(utils.get_repos()) == ["bare"]
+
+    monkeypatch.setattr(utils, "is_git", lambda *_, **__: pytest.fail("not cached"))
+    utils.get_repos.cache_clear()
+    assert list(utils.get_repos()) == ["bare"]
+    utils.get_repos.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "jobs, settings, expected",
+    [
+        (3, {"jobs": "64"}, 3),
+        (None, {"jobs": "64"}, 64),
+        (None, {}, min(32, 4 * multiprocessing.cpu_count())),
+        (0, {}, min(32, 4 * multiprocessing.cpu_count())),
+    ],
+)
+def test_get_jobs(jobs, settings, expected, monkeypatch):
+    monkeypatch.setattr(common, "get_settings", lambda: settings)
+    assert utils.get_jobs(jobs) == expected
+
+
+@patch("gita.info.get_info_items", return_value=["branch", "commit_msg"])
+def test_describe_async(_, tmp_path):
+    repos = {}
+    for name in ["b", "a", "c"]:
+        path = tmp_path / name
+        subprocess.run(["git", "init", "-q", "-b", name, str(path)], check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=x", "-c", "user.email=x@y", "commit"]
+            + ["-q", "--allow-empty", "-m", f"msg {name}"],
+            cwd=path,
+            check=True,
+        )
+        repos[name] = {"path": str(path), "type": "", "flags": []}
+    got = list(utils.describe(repos, no_colors=True, jobs=1))
+    assert got == [f"{name} {name:<10} [∅]     msg {name}" for name in ["a", "b", "c"]]
+    completed = utils.describe_as_completed(repos, no_colors=True)
+    assert sorted(completed) == list(zip(["a", "b", "c"], got))
+
+
+@patch("gita.info.get_info_items", return_value=["commit_msg"])
+def test_describe_by_commit_time(_, tmp_path):
+    repos = {}
+    for name, date in [("a", "1500000000"), ("b", "1600000000"), ("c", None)]:
+        path = tmp_path / name
+        subprocess.run(["git", "init", "-q", str(path)], check=True)
+        if date:
+            subprocess.run(
+                ["git", "-c", "user.name=x", "-c", "user.email=x@y", "commit"]
+                + ["-q", "--allow-empty", "-m", f"msg {name}"],
+                cwd=path,
+                env={**os.environ, "GIT_COMMITTER_DATE": f"{date} +0000"},
+                check=True,
+            )
+        repos[name] = {"path": str(path), "type": "", "flags": []}
+    got = list(utils.describe(repos, no_colors=True, sort="commit_time"))
+    assert got == ["b msg b", "a msg a", "c "]
+
+
+@patch("gita.utils.is_git", return_value=True)
+def test_untracked_policy_in_repo_file(_, tmp_path, monkeypatch):
+    monkeypatch.setenv("GITA_PROJECT_HOME", str(tmp_path))
+    repos = {
+        "a": {"path": "/a", "type": "", "flags": []},
+        "b": {"path": "/b", "type": "", "flags": ["-c", "x=y"], "untracked": "off"},
+    }
+    utils.write_to_repo_file(repos, "w")
+    assert (tmp_path / "gita" / "repos.csv").read_text() == (
+        "/a,a,,\n/b,b,,-c x=y,off\n"
+    )
+    utils.get_repos.cache_clear()
+    assert utils.get_repos() == repos
+    utils.get_repos.cache_clear()
+
+
+@patch("gita.info.get_info_items", return_value=["branch"])
+def test_describe_timeout(_, tmp_path, monkeypatch):
+    def status_cmd(prop, cache):
+        if prop["path"].endswith("slow"):
+            return [sys.executable, "-c", "import time; time.sleep(10)"], None
+        return [sys.executable, "-c", "print('# branch.head x')"], None
+
+    monkeypatch.setattr(info, "_status_cmd", status_cmd)
+    repos = {
+        name: {"path": str(tmp_path / name), "type": "", "flags": []}
+        for name in ["fast", "slow"]
+    }
+    for prop in repos.values():
+        Path(prop["path"]).mkdir()
+    timed_out = []
+    got = list(utils.describe(repos, no_colors=True, timeout=0.5, timed_out=timed_out))
+    assert got[0].startswith("fast x")
+    assert got[1] == "slow (timed out)"
+    assert timed_out == ["slow"]
+
+
+def test_describe_records(tmp_path):
+    path = tmp_path / "a"
+    subprocess.run(["git", "init", "-q", "-b", "main", str(path)], check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=x", "-c", "user.email=x@y", "commit"]
+        + ["-q", "--allow-empty", "-m", "msg a"],
+        cwd=path,
+        env={**os.environ, "GIT_COMMITTER_DATE": "1500000000 +0000"},
+        check=True,
+    )
+    (path / "new").write_text("")
+    repos = {"a": {"path": str(path), "type": "", "flags": []}}
+    record = next(utils.describe_records(repos))
+    assert record.pop("commit_sha")
+    assert record == {
+        "name": "a",
+        "path": str(path),
+        "timed_out": False,
+        "branch": "main",
+        "dirty": False,
+        "staged": False,
+        "untracked": True,
+        "stashed": False,
+        "situation": "no_remote",
+        "ahead": 0,
+        "behind": 0,
+        "commit_subject": "msg a",
+        "commit_time": 1500000000,
+    }
+
+
+@pytest.mark.parametrize(
+    "fmt, expected",
+    [
+        ("ndjson", ['{"a": 1}', '{"a": 2}']),
+        ("json", ["[", '  {"a": 1},', '  {"a": 2}', "]"]),
+    ],
+)
+def test_format_records(fmt, expected):
+    lines = list(utils.format_records([{"a": 1}, {"a": 2}], fmt))
+    assert lines == expected
+    assert json.loads("\n".join(list(utils.format_records([], "json")))) == []
+
+
+@patch("gita.utils.get_groups", return_value={"g": {}})
+@patch("gita.utils.get_repos", return_value={"a": {}, "b": {}})
+def test_get_choices(*_):
+    choices = utils.get_choices()
+    assert list(choices) == ["a", "b", "g"]
+    assert "g" in choices and [] in choices
+    assert "c" not in choices and ["a"] not in choices
@@ -0,0 +1,84 @@
+import io
+import subprocess
+import sys
+
+import pytest
+
+from gita import utils, watch
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    subprocess.run(["git", "init", "-q", str(path)], check=True)
+    return path
+
+
+def test_get_watch_dirs(repo):
+    dirs = watch.get_watch_dirs(str(repo))
+    assert dirs[repo](".git") is False
+    assert dirs[repo]("README.md")
+    assert dirs[repo / ".git"]("index")
+    assert not dirs[repo / ".git"]("index.lock")
+    assert not dirs[repo / ".git" / "refs" / "heads"]("main.lock")
+    assert dirs[repo / ".git" / "refs"]("stash")
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_inotify_watcher(repo):
+    watcher = watch.InotifyWatcher({"r": str(repo)})
+    try:
+        watcher.arm({"r"})
+        assert watcher.wait(0.05) == set()
+        (repo / "new").write_text("")
+        assert watcher.wait(1) == {"r"}
+        subprocess.run(["git", "add", "new"], cwd=repo, check=True)
+        assert watcher.wait(1) == {"r"}
+        # changes in the objects don't matter
+        (repo / ".git" / "objects" / "x").write_text("")
+        assert watcher.wait(0.05) == set()
+    finally:
+        watcher.close()
+
+
+def test_polling_watcher(repo):
+    watcher = watch.PollingWatcher({"r": str(repo)}, interval=0.01)
+    watcher.arm({"r"})
+    assert watcher.wait(0.05) == set()
+    subprocess.run(["git", "checkout", "-q", "-b", "other"], cwd=repo, check=True)
+    assert watcher.wait(1) == {"r"}
+
+
+class FakeWatcher:
+    def __init__(self, changes):
+        self.changes = changes
+        self.armed = []
+
+    def arm(self, names):
+        self.armed.append(sorted(names))
+
+    def wait(self, timeout):
+        if not self.changes:
+            raise KeyboardInterrupt
+        return self.changes.pop(0)
+
+    def close(self):
+        pass
+
+
+def test_watch(monkeypatch):
+    repos = {"a": {"path": "/a"}, "b": {"path": "/b"}}
+    fake = FakeWatcher([{"b"}, set(), set()])
+    monkeypatch.setattr(watch, "get_watcher", lambda paths: fake)
+    rows = iter(["a 1", "b 1", "b 2", "a 1", "b 2"])
+
+    def describe(repos, *args, **kwargs):
+        return [(name, next(rows)) for name in sorted(repos)]
+
+    monkeypatch.setattr(utils, "describe_as_completed", describe)
+    out = io.StringIO()
+    watch.watch(repos, out=out, debounce=0)
+    # only the changed rows are printed again
+    assert out.getvalue() == "a 1\nb 1\nb 2\n"
+    assert fake.armed == [["a", "b"], ["b"], ["a", "b"]]